@@ -1,13 +1,23 @@
 from django.contrib import admin
-from .models import Clip
+from .models import Clip, ClipRendition
+
+
+class ClipRenditionInline(admin.TabularInline):
+    model = ClipRendition
+    extra = 0
+    fields = ['name', 'width', 'height', 'status', 'progress_percentage', 'file_path', 'file_size']
+    readonly_fields = fields
 
 
 @admin.register(Clip)
 class ClipAdmin(admin.ModelAdmin):
     list_display = ['title', 'video', 'viral_score', 'status', 'progress_percentage', 'created_at']
-    list_filter = ['status', 'created_at']
+    list_filter = ['status', 'encoding_profile', 'created_at']
     search_fields = ['title', 'description', 'video__title']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = [
+        'queued_at', 'downloading_at', 'processing_at', 'completed_at', 'failed_at', 'created_at', 'updated_at'
+    ]
+    inlines = [ClipRenditionInline]
     fieldsets = (
         ('Clip Info', {
             'fields': ('video', 'title', 'description', 'start_time', 'end_time', 'duration')
@@ -16,13 +26,16 @@ class ClipAdmin(admin.ModelAdmin):
             'fields': ('viral_score', 'viral_reason')
         }),
         ('Files', {
-            'fields': ('original_clip_path', 'processed_clip_path')
+            'fields': ('original_clip_path', 'original_start_time', 'original_end_time', 'processed_clip_path')
         }),
         ('Processing', {
-            'fields': ('status', 'progress_percentage', 'error_message')
+            'fields': ('status', 'encoding_profile', 'progress_percentage', 'error_message')
         }),
         ('Timestamps', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': (
+                'queued_at', 'downloading_at', 'processing_at', 'completed_at', 'failed_at',
+                'created_at', 'updated_at'
+            ),
             'classes': ('collapse',)
         }),
     )
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ClipsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clips'
+
+    def ready(self):
+        from snapcast_backend import events  # noqa: F401  (registers the event bus check)
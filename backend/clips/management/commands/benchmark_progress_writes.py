@@ -0,0 +1,139 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from clips.models import Clip
+from snapcast_backend.db import scratch_database
+from videos.models import Video
+
+
+class Command(BaseCommand):
+    help = (
+        'N worker threads write clip progress concurrently (as renders do) while readers poll '
+        'the clip list; on SQLite, runs once with the default journal and once WAL-tuned'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent writers, one clip each')
+        parser.add_argument('--writes', type=int, default=200, help='Progress updates per writer')
+        parser.add_argument('--readers', type=int, default=2, help='Threads polling clip status meanwhile')
+        parser.add_argument('--interval', type=float, default=0.0, help='Seconds between a writer\'s updates')
+
+    def handle(self, *args, **options):
+        with scratch_database() as db:
+            video = Video.objects.create(youtube_url='https://www.youtube.com/watch?v=bench', youtube_id='bench')
+            clips = Clip.objects.bulk_create([
+                Clip(video=video, title=f'Clip {i}', start_time=i * 60, end_time=i * 60 + 30, duration=30)
+                for i in range(options['workers'])
+            ])
+            clip_ids = [clip.id for clip in clips]
+
+            if db.vendor == 'sqlite':
+                modes = [('default journal', False), ('WAL tuned', True)]
+            else:
+                modes = [(db.vendor, None)]
+
+            results = []
+            for label, wal in modes:
+                with override_settings(SQLITE_WAL=bool(wal)):
+                    if wal is not None:
+                        self.set_journal_mode(db, 'WAL' if wal else 'DELETE')
+                    results.append((label, self.run(clip_ids, options)))
+
+        self.report(results, options)
+
+    def set_journal_mode(self, db, mode):
+        """journal_mode is stored in the database file, so switch it explicitly"""
+        db.close()
+        with db.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={mode}')
+        db.close()
+
+    def run(self, clip_ids, options):
+        writes = options['writes']
+        interval = options['interval']
+        barrier = threading.Barrier(len(clip_ids) + options['readers'] + 1)
+        done = threading.Event()
+        lock = threading.Lock()
+        result = {'latencies': [], 'locked': 0, 'reads': 0}
+
+        def writer(clip_id):
+            latencies = []
+            locked = 0
+            try:
+                barrier.wait()
+                for i in range(writes):
+                    began = time.perf_counter()
+                    try:
+                        # What stage_progress writes
+                        Clip.objects.filter(pk=clip_id).update(
+                            progress_percentage=i % 100,
+                            updated_at=timezone.now()
+                        )
+                    except OperationalError:
+                        locked += 1
+                    else:
+                        latencies.append((time.perf_counter() - began) * 1000)
+                    if interval:
+                        time.sleep(interval)
+            finally:
+                connection.close()
+            with lock:
+                result['latencies'].extend(latencies)
+                result['locked'] += locked
+
+        def reader():
+            reads = 0
+            try:
+                barrier.wait()
+                while not done.is_set():
+                    # A client polling the clip list
+                    list(Clip.objects.values_list('id', 'status', 'progress_percentage'))
+                    reads += 1
+            except OperationalError:
+                pass
+            finally:
+                connection.close()
+            with lock:
+                result['reads'] += reads
+
+        writers = [threading.Thread(target=writer, args=(clip_id,)) for clip_id in clip_ids]
+        readers = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in writers + readers:
+            thread.start()
+
+        barrier.wait()
+        began = time.perf_counter()
+        for thread in writers:
+            thread.join()
+        result['seconds'] = time.perf_counter() - began
+        done.set()
+        for thread in readers:
+            thread.join()
+        return result
+
+    def report(self, results, options):
+        self.stdout.write(
+            f"{options['workers']} writers x {options['writes']} updates, {options['readers']} readers"
+        )
+        self.stdout.write(
+            f"{'mode':<18}{'writes/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'locked':>8}{'reads/s':>9}"
+        )
+        for label, result in results:
+            latencies = sorted(result['latencies'])
+            seconds = result['seconds'] or 1
+            if latencies:
+                p50 = statistics.median(latencies)
+                p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+                worst = latencies[-1]
+            else:
+                p50 = p95 = worst = 0.0
+            self.stdout.write(
+                f"{label:<18}{len(latencies) / seconds:>10.0f}{p50:>9.2f}{p95:>9.2f}{worst:>9.1f}"
+                f"{result['locked']:>8}{result['reads'] / seconds:>9.0f}"
+            )
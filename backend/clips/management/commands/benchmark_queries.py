@@ -0,0 +1,215 @@
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from clips.models import Clip
+from clips.views import ClipViewSet
+from snapcast_backend.db import scratch_database
+from videos.models import Video
+
+# Columns the clip list leaves out
+CLIP_LIST_DEFERRED = ClipViewSet.LIST_HEAVY_FIELDS
+
+BATCH_SIZE = 10000
+
+
+@contextmanager
+def explicit_timestamps(*models_to_seed):
+    """Let bulk_create keep the created_at values we assign"""
+    fields = [model._meta.get_field('created_at') for model in models_to_seed]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+@contextmanager
+def bare_meta(*models_to_strip):
+    """Models without Meta.indexes and Meta.constraints"""
+    saved = [(model._meta.indexes, model._meta.constraints) for model in models_to_strip]
+    for model in models_to_strip:
+        model._meta.indexes = []
+        model._meta.constraints = []
+    try:
+        yield
+    finally:
+        for model, (indexes, constraints) in zip(models_to_strip, saved):
+            model._meta.indexes = indexes
+            model._meta.constraints = constraints
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a scratch database with videos and clips, then time the list and lookup '
+        'queries with the indexes/constraints and again without them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, default=100_000)
+        parser.add_argument('--clips-per-video', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=200, help='Timed runs per query')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--explain', action='store_true', help='Print each query plan')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+
+        # Never touch the real database
+        with scratch_database():
+            began = time.monotonic()
+            self.seed(options['videos'], options['clips_per_video'])
+            self.stdout.write(
+                f"Seeded {options['videos']:,} videos and {options['videos'] * options['clips_per_video']:,} "
+                f"clips in {time.monotonic() - began:.0f}s ({connection.vendor})"
+            )
+
+            after = self.measure(options['repeat'], options['explain'])
+            self.drop_indexes()
+            before = self.measure(options['repeat'], options['explain'])
+            self.report(before, after)
+
+    def seed(self, video_count, clips_per_video):
+        now = timezone.now()
+        self.video_count = video_count
+        self.clips_per_video = clips_per_video
+
+        with transaction.atomic(), explicit_timestamps(Video, Clip):
+            for batch_start in range(0, video_count, BATCH_SIZE):
+                batch = range(batch_start, min(batch_start + BATCH_SIZE, video_count))
+                Video.objects.bulk_create([
+                    Video(
+                        youtube_url=f'https://www.youtube.com/watch?v=bench{i:07d}',
+                        youtube_id=f'bench{i:07d}',
+                        title=f'Video {i}',
+                        status='completed',
+                        created_at=now - timedelta(minutes=video_count - i),
+                    )
+                    for i in batch
+                ])
+
+            video_ids = list(Video.objects.order_by('id').values_list('id', flat=True))
+            clips = []
+            for video_id in video_ids:
+                for moment_index in range(clips_per_video):
+                    start_time = moment_index * 120 + self.rng.randint(0, 60)
+                    clips.append(Clip(
+                        video_id=video_id,
+                        moment_index=moment_index,
+                        title=f'Clip {moment_index}',
+                        start_time=start_time,
+                        end_time=start_time + 45,
+                        duration=45,
+                        viral_score=round(self.rng.uniform(0, 10), 1),
+                        status='completed',
+                        created_at=now - timedelta(seconds=self.rng.randint(0, 90 * 24 * 3600)),
+                    ))
+                if len(clips) >= BATCH_SIZE:
+                    Clip.objects.bulk_create(clips)
+                    clips = []
+            Clip.objects.bulk_create(clips)
+
+        self.video_ids = video_ids
+        self.analyze()
+
+    def analyze(self):
+        """Refresh planner statistics"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def drop_indexes(self):
+        """Back to the old schema: primary keys and the ForeignKey index only"""
+        indexes = {model: model._meta.indexes for model in (Video, Clip)}
+        constraints = {model: model._meta.constraints for model in (Video, Clip)}
+
+        # SQLite applies these by rebuilding the table from _meta, so hide them from it
+        with connection.schema_editor() as editor, bare_meta(Video, Clip):
+            for model in (Video, Clip):
+                for index in indexes[model]:
+                    editor.remove_index(model, index)
+                for constraint in constraints[model]:
+                    editor.remove_constraint(model, constraint)
+
+            unique_field = Video._meta.get_field('youtube_id')
+            plain_field = models.CharField(max_length=100)
+            plain_field.set_attributes_from_name('youtube_id')
+            plain_field.model = Video
+            editor.alter_field(Video, unique_field, plain_field)
+        self.analyze()
+
+    def sample_clip(self):
+        """(video_id, moment_index, start_time, end_time) of a random clip"""
+        return Clip.objects.filter(
+            video_id=self.rng.choice(self.video_ids),
+            moment_index=self.rng.randrange(self.clips_per_video)
+        ).values_list('video_id', 'moment_index', 'start_time', 'end_time').first()
+
+    def measure(self, repeat, explain=False):
+        """Median and p95 milliseconds per query"""
+        # The same keys for both runs
+        rng_state = self.rng.getstate()
+        youtube_ids = [f'bench{self.rng.randrange(self.video_count):07d}' for _ in range(repeat)]
+        clip_keys = [self.sample_clip() for _ in range(repeat)]
+        pivots = list(
+            Video.objects.filter(id__in=[self.rng.choice(self.video_ids) for _ in range(repeat)])
+            .values_list('created_at', flat=True)
+        )
+        self.rng.setstate(rng_state)
+
+        queries = {
+            'video list, first page': lambda i: (
+                Video.objects.order_by('-created_at')[:50]
+            ),
+            'video list, deep cursor page': lambda i: (
+                Video.objects.filter(created_at__lt=pivots[i % len(pivots)]).order_by('-created_at')[:50]
+            ),
+            'video by youtube_id': lambda i: Video.objects.filter(youtube_id=youtube_ids[i])[:1],
+            'clip list, first page': lambda i: (
+                Clip.objects.defer(*CLIP_LIST_DEFERRED).order_by('-viral_score', '-created_at')[:50]
+            ),
+            'clips of a video': lambda i: (
+                Clip.objects.defer(*CLIP_LIST_DEFERRED)
+                .filter(video_id=clip_keys[i][0]).order_by('-viral_score', '-created_at')[:50]
+            ),
+            'clip by (video, moment_index)': lambda i: Clip.objects.filter(
+                video_id=clip_keys[i][0], moment_index=clip_keys[i][1]
+            )[:1],
+            'clip by (video, start, end)': lambda i: Clip.objects.filter(
+                video_id=clip_keys[i][0], start_time=clip_keys[i][2], end_time=clip_keys[i][3]
+            )[:1],
+        }
+
+        results = {}
+        for name, query in queries.items():
+            if explain:
+                self.stdout.write(f"{name}: {query(0).explain()}")
+
+            timings = []
+            for i in range(repeat):
+                queryset = query(i)
+                began = time.perf_counter()
+                list(queryset)
+                timings.append((time.perf_counter() - began) * 1000)
+            timings.sort()
+            results[name] = (statistics.median(timings), timings[int(len(timings) * 0.95) - 1])
+        return results
+
+    def report(self, before, after):
+        self.stdout.write('')
+        self.stdout.write(f"{'query':<32}{'before median/p95 ms':>24}{'after median/p95 ms':>24}{'speedup':>10}")
+        for name in after:
+            before_median, before_p95 = before[name]
+            after_median, after_p95 = after[name]
+            speedup = before_median / after_median if after_median else float('inf')
+            self.stdout.write(
+                f"{name:<32}{before_median:>12.2f} / {before_p95:<9.2f}"
+                f"{after_median:>12.2f} / {after_p95:<9.2f}{speedup:>9.1f}x"
+            )
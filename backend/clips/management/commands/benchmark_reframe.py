@@ -0,0 +1,88 @@
+import os
+import subprocess
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from clips.reframe import analyze_subject
+from clips.services import VideoProcessingService
+
+
+class Command(BaseCommand):
+    help = 'Time the smart reframing analysis against centre-crop and smart-crop encodes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Sample clip (default: a generated 1920x1080 test clip)')
+        parser.add_argument('--start', type=float, default=0.0)
+        parser.add_argument('--duration', type=float, default=30.0)
+        parser.add_argument('--profile', default='final', help='Encoding profile for both encodes')
+        parser.add_argument('--keep', action='store_true', help='Keep the encoded outputs')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = options['path'] or self.make_sample(work_dir, options['start'] + options['duration'])
+            self.benchmark(path, options)
+
+    def make_sample(self, work_dir, duration):
+        """Landscape test pattern with tone, standing in for a podcast shot"""
+        path = os.path.join(work_dir, 'sample.mp4')
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-f', 'lavfi', '-i', f'testsrc2=size=1920x1080:rate=30:duration={duration}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac',
+            '-y', path
+        ]
+        try:
+            subprocess.run(cmd, check=True, timeout=600)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise CommandError(f"Could not generate sample clip: {e}")
+        self.stdout.write(f"Generated sample clip: {path}")
+        return path
+
+    def benchmark(self, path, options):
+        service = VideoProcessingService()
+        start = options['start']
+        duration = options['duration']
+
+        dimensions = service.probe_dimensions(path)
+        if not dimensions:
+            raise CommandError(f"Could not read video dimensions of {path}")
+        self.stdout.write(f"Source: {path} ({dimensions[0]}x{dimensions[1]}), {duration}s from {start}s")
+
+        input_args = (['-ss', str(start)] if start else []) + ['-i', path]
+
+        began = time.monotonic()
+        track = analyze_subject(input_args, duration, dimensions)
+        analysis_seconds = time.monotonic() - began
+        samples = len(track.times) if track else 0
+
+        timings = {}
+        outputs = []
+        for mode in ('center', 'smart'):
+            filename = f"benchmark_reframe_{mode}.mp4"
+            with override_settings(CLIP_REFRAME=mode):
+                began = time.monotonic()
+                outputs.append(service.create_vertical_clip(
+                    path,
+                    filename,
+                    start_offset=start,
+                    duration=duration,
+                    profile=options['profile']
+                ))
+                timings[mode] = time.monotonic() - began
+
+        self.stdout.write(f"{'Analysis':<20}{analysis_seconds:8.2f}s ({samples} samples)")
+        self.stdout.write(f"{'Centre-crop encode':<20}{timings['center']:8.2f}s")
+        self.stdout.write(f"{'Smart-crop encode':<20}{timings['smart']:8.2f}s (analysis included)")
+        if timings['center']:
+            share = analysis_seconds / timings['center'] * 100
+            self.stdout.write(f"{'Analysis cost':<20}{share:8.1f}% of the centre-crop encode")
+
+        if options['keep']:
+            self.stdout.write(f"Outputs: {', '.join(outputs)}")
+        else:
+            for output in outputs:
+                os.remove(output)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from clips.storage import ClipStorageManager
+
+
+class Command(BaseCommand):
+    help = 'Remove orphaned clip files and evict old ones until MEDIA_ROOT/clips fits its budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+        parser.add_argument('--max-gb', type=float, help='Budget to enforce (default: CLIP_STORAGE_MAX_GB)')
+
+    def handle(self, *args, **options):
+        max_bytes = None
+        if options['max_gb'] is not None:
+            max_bytes = int(options['max_gb'] * 1024 ** 3)
+
+        report = ClipStorageManager(max_bytes=max_bytes).collect(dry_run=options['dry_run'])
+
+        mb = 1024 * 1024
+        self.stdout.write(
+            f"Orphans: {report['orphans']}, originals: {report['originals']}, "
+            f"finals: {report['finals']}, renditions: {report['renditions']}"
+        )
+        self.stdout.write(
+            f"{'Would free' if options['dry_run'] else 'Freed'} {report['freed_bytes'] // mb} MB; "
+            f"{report['total_bytes'] // mb} MB of {report['max_bytes'] // mb} MB used"
+        )
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0007_clip_moment_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clip',
+            name='original_end_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clip',
+            name='original_start_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
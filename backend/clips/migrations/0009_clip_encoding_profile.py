@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0008_clip_original_window'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clip',
+            name='encoding_profile',
+            field=models.CharField(choices=[('preview', 'Preview'), ('final', 'Final'), ('stream-copy', 'Stream copy')], default='final', max_length=20),
+        ),
+    ]
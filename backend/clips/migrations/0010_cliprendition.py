@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0009_clip_encoding_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClipRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('vertical', 'Vertical 9:16'), ('square', 'Square 1:1'), ('preview', 'Preview')], max_length=20)),
+                ('width', models.IntegerField()),
+                ('height', models.IntegerField()),
+                ('file_path', models.CharField(blank=True, max_length=500)),
+                ('file_size', models.BigIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error_message', models.TextField(blank=True)),
+                ('progress_percentage', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('clip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='clips.clip')),
+            ],
+            options={
+                'ordering': ['clip', 'name'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cliprendition',
+            constraint=models.UniqueConstraint(fields=('clip', 'name'), name='unique_clip_rendition'),
+        ),
+    ]
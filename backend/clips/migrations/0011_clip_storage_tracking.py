@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0010_cliprendition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clip',
+            name='last_accessed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='clip',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('downloading', 'Downloading'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('evicted', 'Evicted')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+def remove_duplicate_renders(apps, schema_editor):
+    """Keep one clip per (video, start, end, profile): published, then completed, then newest"""
+    Clip = apps.get_model('clips', 'Clip')
+
+    duplicated = (
+        Clip.objects.values('video_id', 'start_time', 'end_time', 'encoding_profile')
+        .annotate(rows=models.Count('id'))
+        .filter(rows__gt=1)
+    )
+    for key in list(duplicated):
+        key.pop('rows')
+        clips = sorted(
+            Clip.objects.filter(**key),
+            key=lambda clip: (not clip.is_published_youtube, clip.status != 'completed', -clip.updated_at.timestamp())
+        )
+        Clip.objects.filter(id__in=[clip.id for clip in clips[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0011_clip_storage_tracking'),
+        ('videos', '0003_video_unique_youtube_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_renders, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='clip',
+            constraint=models.UniqueConstraint(
+                fields=('video', 'start_time', 'end_time', 'encoding_profile'),
+                name='unique_clip_render'
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0012_clip_unique_render'),
+        ('videos', '0004_video_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clip',
+            index=models.Index(fields=['video', 'moment_index'], name='clip_video_moment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clip',
+            index=models.Index(fields=['-viral_score', '-created_at'], name='clip_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clip',
+            index=models.Index(fields=['video', '-viral_score', '-created_at'], name='clip_video_score_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0013_clip_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clip',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clip',
+            name='downloading_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clip',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clip',
+            name='processing_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clip',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
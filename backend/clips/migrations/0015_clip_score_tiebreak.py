@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0014_clip_stage_timestamps'),
+        ('videos', '0007_transcriptcacheentry'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='clip',
+            options={'ordering': ['-viral_score', '-created_at', '-id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='clip',
+            name='clip_score_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='clip',
+            name='clip_video_score_idx',
+        ),
+        migrations.AddIndex(
+            model_name='clip',
+            index=models.Index(fields=['-viral_score', '-created_at', '-id'], name='clip_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clip',
+            index=models.Index(fields=['video', '-viral_score', '-created_at', '-id'], name='clip_video_score_idx'),
+        ),
+    ]
@@ -1,8 +1,13 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from snapcast_backend.models import StatusTransitionMixin
 from videos.models import Video
 
 
-class Clip(models.Model):
+class Clip(StatusTransitionMixin, models.Model):
     """Model to store processed video clips"""
 
     STATUS_CHOICES = [
@@ -11,6 +16,13 @@ class Clip(models.Model):
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('evicted', 'Evicted'),  # Rendered file removed to free disk space
+    ]
+
+    ENCODING_PROFILE_CHOICES = [
+        ('preview', 'Preview'),
+        ('final', 'Final'),
+        ('stream-copy', 'Stream copy'),
     ]
 
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='clips')
@@ -32,13 +44,27 @@ class Clip(models.Model):
 
     # File paths
     original_clip_path = models.CharField(max_length=500, blank=True)  # Downloaded segment
+    original_start_time = models.FloatField(null=True, blank=True)  # Window covered by original_clip_path
+    original_end_time = models.FloatField(null=True, blank=True)
     processed_clip_path = models.CharField(max_length=500, blank=True)  # Final vertical clip
+    encoding_profile = models.CharField(
+        max_length=20,
+        choices=ENCODING_PROFILE_CHOICES,
+        default='final'
+    )  # See clips.services.ENCODING_PROFILES
 
     # Status tracking
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     error_message = models.TextField(blank=True)
     progress_percentage = models.IntegerField(default=0)
 
+    # When the current render entered each stage (see STAGE_TIMESTAMPS)
+    queued_at = models.DateTimeField(blank=True, null=True)
+    downloading_at = models.DateTimeField(blank=True, null=True)
+    processing_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    failed_at = models.DateTimeField(blank=True, null=True)
+
     # YouTube Integration
     youtube_video_id = models.CharField(max_length=100, blank=True, null=True)
     youtube_url = models.URLField(blank=True, null=True)
@@ -48,14 +74,173 @@ class Clip(models.Model):
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    last_accessed_at = models.DateTimeField(blank=True, null=True)  # Last stream/download, for storage LRU
 
     class Meta:
-        ordering = ['-viral_score', '-created_at']
+        ordering = ['-viral_score', '-created_at', '-id']
+        constraints = [
+            # One render per range and quality; see render_key(). Also serves
+            # the (video, start_time, end_time) lookup in ClipViewSet.create
+            models.UniqueConstraint(
+                fields=['video', 'start_time', 'end_time', 'encoding_profile'],
+                name='unique_clip_render'
+            ),
+        ]
+        indexes = [
+            # Existing clip for a moment (ClipViewSet.create, render_clips)
+            models.Index(fields=['video', 'moment_index'], name='clip_video_moment_idx'),
+            # Default ordering / cursor pagination, overall and per video (?video=)
+            models.Index(fields=['-viral_score', '-created_at', '-id'], name='clip_score_idx'),
+            models.Index(fields=['video', '-viral_score', '-created_at', '-id'], name='clip_video_score_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.start_time}s - {self.end_time}s) - Score: {self.viral_score}"
 
+    FINAL_STATUSES = ('completed', 'failed', 'evicted')
+    # A worker may be writing this clip's files
+    ACTIVE_STATUSES = ('pending', 'downloading', 'processing')
+
+    STAGE_TIMESTAMPS = {
+        'pending': 'queued_at',
+        'downloading': 'downloading_at',
+        'processing': 'processing_at',
+        'completed': 'completed_at',
+        'failed': 'failed_at',
+    }
+
+    # Don't write last_accessed_at more often than this per clip
+    ACCESS_TOUCH_INTERVAL = timedelta(minutes=5)
+
+    @property
+    def progress_channel(self):
+        """Event channel for this clip's progress (see snapcast_backend.events)"""
+        return f"clip:{self.pk}"
+
+    def progress_snapshot(self, stage=None):
+        """Compact progress payload pushed to clients"""
+        return {
+            'id': self.pk,
+            'status': self.status,
+            'stage': stage or self.status,
+            'progress_percentage': self.progress_percentage,
+            'error_message': self.error_message,
+        }
+
+    @classmethod
+    def from_moment(cls, video, moment_index, moment, encoding_profile=None):
+        """Unsaved pending clip for video.get_viral_moments_sorted()[moment_index]"""
+        return cls(
+            video=video,
+            moment_index=moment_index,
+            title=moment.get('title', moment.get('transcript', f'Clip {moment_index + 1}')),
+            description=moment.get('description', moment.get('reason', '')),
+            start_time=moment['start_time'],
+            end_time=moment['end_time'],
+            duration=moment.get('duration', moment['end_time'] - moment['start_time']),
+            viral_score=moment.get('viral_score', 0),
+            viral_reason=moment.get('viral_reason', moment.get('reason', '')),
+            encoding_profile=encoding_profile or 'final',
+            status='pending',
+            queued_at=timezone.now()
+        )
+
+    def render_key(self):
+        """Lookup for the clip rendering the same range at the same quality"""
+        return {
+            'video_id': self.video_id,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'encoding_profile': self.encoding_profile,
+        }
+
+    def needs_render(self, encoding_profile=None):
+        """Whether a request for this clip (at ``encoding_profile``) should render it again"""
+        if self.status in ('failed', 'evicted') or self.is_stale():
+            return True
+        return bool(encoding_profile) and encoding_profile != self.encoding_profile
+
+    def requeue(self, **changes):
+        """Move a finished clip back to 'pending' with ``changes``; True if this call did
+
+        Conditional on a final status (or an expired claim, see stale()), so of
+        several concurrent callers only one queues the render. Raises
+        IntegrityError if the changes would collide with another clip's render key.
+        """
+        with transaction.atomic():
+            queued = Clip.objects.filter(Q(status__in=self.FINAL_STATUSES) | Clip.stale(), pk=self.pk).update(
+                progress_percentage=0,
+                error_message='',
+                **self.stage_fields('pending'),
+                **changes
+            )
+        self.refresh_from_db()
+        return bool(queued)
+
+    def mark_accessed(self):
+        """Record a stream/download for storage LRU, without touching updated_at"""
+        now = timezone.now()
+        if self.last_accessed_at and now - self.last_accessed_at < self.ACCESS_TOUCH_INTERVAL:
+            return
+        self.last_accessed_at = now
+        Clip.objects.filter(pk=self.pk).update(last_accessed_at=now)
+
+    def original_covers(self, start_time, end_time):
+        """Whether the downloaded segment already contains [start_time, end_time]"""
+        if not self.original_clip_path or self.original_start_time is None:
+            return False
+        return (
+            self.original_start_time <= start_time
+            and end_time <= self.original_end_time
+        )
+
     @property
     def output_file_path(self):
         """Retorna o caminho do arquivo final processado"""
         return self.processed_clip_path if self.processed_clip_path else self.original_clip_path
+
+
+class ClipRendition(models.Model):
+    """One output shape of a Clip (see clips.services.RENDITIONS), rendered in a shared pass"""
+
+    NAME_CHOICES = [
+        ('vertical', 'Vertical 9:16'),
+        ('square', 'Square 1:1'),
+        ('preview', 'Preview'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    # Statuses a rendition can be queued again from
+    FINAL_STATUSES = ('completed', 'failed')
+
+    clip = models.ForeignKey(Clip, on_delete=models.CASCADE, related_name='renditions')
+    name = models.CharField(max_length=20, choices=NAME_CHOICES)
+    width = models.IntegerField()
+    height = models.IntegerField()
+
+    file_path = models.CharField(max_length=500, blank=True)
+    file_size = models.BigIntegerField(null=True, blank=True)  # in bytes
+
+    # Status tracking
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error_message = models.TextField(blank=True)
+    progress_percentage = models.IntegerField(default=0)
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['clip', 'name']
+        constraints = [
+            models.UniqueConstraint(fields=['clip', 'name'], name='unique_clip_rendition'),
+        ]
+
+    def __str__(self):
+        return f"{self.clip_id} {self.name} ({self.width}x{self.height}) - {self.status}"
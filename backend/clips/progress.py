@@ -0,0 +1,161 @@
+"""
+Streaming subprocess runner for ffmpeg / yt-dlp with incremental progress.
+
+ffmpeg is run with ``-progress pipe:1 -nostats`` and yt-dlp with a
+``--progress-template`` line, so progress arrives as stdout lines while the
+process runs. stderr is kept only as a bounded ring buffer for error reports.
+"""
+
+import subprocess
+import threading
+import time
+from collections import deque
+
+# Lines of stderr kept for error messages
+STDERR_TAIL_LINES = 50
+
+# yt-dlp prints this line (with --newline) for each progress update
+YTDLP_PROGRESS_PREFIX = 'snapcast-progress'
+YTDLP_PROGRESS_ARGS = [
+    '--newline',
+    '--progress-template',
+    f'download:{YTDLP_PROGRESS_PREFIX} %(progress.downloaded_bytes)s '
+    '%(progress.total_bytes)s %(progress.total_bytes_estimate)s',
+]
+
+FFMPEG_PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+
+
+class ProcessResult:
+    """Outcome of run_process"""
+
+    def __init__(self, returncode, stderr_tail, timed_out):
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.timed_out = timed_out
+
+    @property
+    def stderr(self):
+        return '\n'.join(self.stderr_tail)
+
+
+def run_process(cmd, timeout, on_stdout_line=None):
+    """Run cmd, feeding each stdout line to on_stdout_line as it arrives
+
+    Unlike subprocess.run(capture_output=True), nothing but the last
+    STDERR_TAIL_LINES lines of stderr is held in memory.
+    """
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        text=True,
+        bufsize=1,
+        errors='replace'
+    )
+
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    def drain_stderr():
+        for line in process.stderr:
+            stderr_tail.append(line.rstrip())
+
+    stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+    stderr_thread.start()
+
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        process.kill()
+
+    watchdog = threading.Timer(timeout, kill)
+    watchdog.start()
+
+    try:
+        for line in process.stdout:
+            if on_stdout_line is not None:
+                on_stdout_line(line.strip())
+        process.wait()
+    finally:
+        watchdog.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr_thread.join(timeout=5)
+
+    return ProcessResult(process.returncode, list(stderr_tail), timed_out.is_set())
+
+
+class FFmpegProgressParser:
+    """Turn ``-progress pipe:1`` key=value lines into a 0..1 fraction"""
+
+    def __init__(self, duration, callback):
+        self.duration = duration
+        self.callback = callback
+
+    def __call__(self, line):
+        key, _, value = line.partition('=')
+
+        if key == 'progress' and value == 'end':
+            self.callback(1.0)
+        elif key == 'out_time_us' and self.duration:
+            # Despite its sibling's name, out_time_ms is also in microseconds
+            try:
+                seconds = int(value) / 1_000_000
+            except ValueError:
+                return
+            self.callback(min(max(seconds / self.duration, 0.0), 1.0))
+
+
+class YtDlpProgressParser:
+    """Turn YTDLP_PROGRESS_ARGS lines into a 0..1 fraction
+
+    With ``bestvideo+bestaudio`` yt-dlp reports each file from zero, so the
+    fraction never goes below the highest one already reported.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.reported = 0.0
+
+    def __call__(self, line):
+        if not line.startswith(YTDLP_PROGRESS_PREFIX):
+            return
+
+        _, downloaded, total, estimate = (line.split() + ['NA'] * 4)[:4]
+        try:
+            downloaded = float(downloaded)
+        except ValueError:
+            return
+
+        for candidate in (total, estimate):
+            try:
+                total_bytes = float(candidate)
+            except ValueError:
+                continue
+            if total_bytes > 0:
+                self.reported = max(self.reported, min(downloaded / total_bytes, 1.0))
+                self.callback(self.reported)
+                return
+
+
+class ProgressThrottle:
+    """Forward progress at most once per interval (and always the final 100%)"""
+
+    def __init__(self, callback, interval=1.0):
+        self.callback = callback
+        self.interval = interval
+        self.last_sent = 0.0
+        self.last_value = None
+
+    def __call__(self, fraction):
+        now = time.monotonic()
+        if fraction < 1.0 and now - self.last_sent < self.interval:
+            return
+        if fraction == self.last_value:
+            return
+        self.last_sent = now
+        self.last_value = fraction
+        self.callback(fraction)
@@ -0,0 +1,259 @@
+"""
+Subject-aware reframing for the vertical crop.
+
+A cheap analysis pass decodes the clip at REFRAME_SAMPLE_FPS, downscaled to
+ANALYSIS_WIDTH pixels wide and in grayscale. It finds the subject in each
+sample: the largest frontal face (OpenCV Haar cascade), or failing that the
+centre of motion since the previous sample. The horizontal path is then
+smoothed, and the encode moves its crop window along it through a
+``sendcmd`` script.
+"""
+
+import subprocess
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+ANALYSIS_WIDTH = 320
+
+# Crop position updates per second sent to ffmpeg (interpolated between samples)
+COMMAND_RATE = 10
+
+# Samples in the median filter that drops one-off detector misses
+MEDIAN_WINDOW = 5
+# Exponential smoothing factor, run forwards and backwards so the crop doesn't lag
+SMOOTHING_ALPHA = 0.3
+
+# Mean absolute difference per pixel below which a sample counts as static
+MOTION_THRESHOLD = 2.0
+
+_face_detector = None
+_face_detector_lock = threading.Lock()
+
+
+class SubjectTrack:
+    """Smoothed horizontal subject centre (0..1 of the frame width) over clip time"""
+
+    def __init__(self, times, centers, source_size):
+        self.times = times
+        self.centers = centers
+        self.source_size = source_size
+
+    def center_at(self, t):
+        """Linear interpolation between samples, clamped at both ends"""
+        if t <= self.times[0]:
+            return self.centers[0]
+        if t >= self.times[-1]:
+            return self.centers[-1]
+
+        # Samples are evenly spaced
+        step = self.times[1] - self.times[0]
+        index = min(int((t - self.times[0]) / step), len(self.times) - 2)
+        fraction = (t - self.times[index]) / step
+        return self.centers[index] + (self.centers[index + 1] - self.centers[index]) * fraction
+
+    def crop_x_at(self, t, crop_width):
+        """Left edge of a crop_width wide window centred on the subject"""
+        source_width = self.source_size[0]
+        x = round(self.center_at(t) * source_width - crop_width / 2)
+        return min(max(x, 0), source_width - crop_width)
+
+    def sendcmd_script(self, target, crop_width):
+        """sendcmd lines moving the ``target`` crop filter along the track"""
+        lines = []
+        end = self.times[-1]
+        last_x = None
+        tick = 0
+        while tick / COMMAND_RATE <= end:
+            t = tick / COMMAND_RATE
+            x = self.crop_x_at(t, crop_width)
+            if x != last_x:
+                lines.append(f"{t:.3f} {target} x {x};")
+                last_x = x
+            tick += 1
+        return '\n'.join(lines) + '\n'
+
+
+def crop_filter(width, height, track=None, script_dir=None, name='r0'):
+    """Video filter producing a width x height output
+
+    With a track, a full-height window of the output aspect follows the
+    subject; otherwise (or when the source is no wider than the output)
+    it is the plain centre crop.
+    """
+    center = (
+        f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+        f"crop={width}:{height}"
+    )
+    if track is None or script_dir is None:
+        return center
+
+    source_width, source_height = track.source_size
+    crop_width = int(source_height * width / height) // 2 * 2
+    if crop_width >= source_width:
+        return center
+
+    target = f"crop@{name}"
+    script_path = Path(script_dir) / f"{name}.cmd"
+    script_path.write_text(track.sendcmd_script(target, crop_width))
+
+    return (
+        f"sendcmd=f={script_path},"
+        f"{target}=w={crop_width}:h={source_height}:x={track.crop_x_at(0, crop_width)}:y=0,"
+        f"scale={width}:{height}"
+    )
+
+
+def get_face_detector():
+    """Process-wide Haar cascade (loading it costs more than a detection)"""
+    global _face_detector
+    with _face_detector_lock:
+        if _face_detector is None:
+            import cv2
+            _face_detector = cv2.CascadeClassifier(
+                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+            )
+        return _face_detector
+
+
+def detect_face_center(frame):
+    """Horizontal centre (0..1) of the largest face in a grayscale frame, or None"""
+    height, width = frame.shape
+    faces = get_face_detector().detectMultiScale(
+        frame,
+        # Coarse pyramid and no tiny faces: a speaker fills a good part of the frame
+        scaleFactor=1.2,
+        minNeighbors=5,
+        minSize=(width // 12, width // 12)
+    )
+    if len(faces) == 0:
+        return None
+
+    x, _, w, _ = max(faces, key=lambda face: face[2] * face[3])
+    return (x + w / 2) / width
+
+
+def detect_motion_center(frame, previous):
+    """Horizontal centroid (0..1) of the change since the previous sample, or None"""
+    import numpy as np
+
+    if previous is None:
+        return None
+
+    difference = np.abs(frame.astype(np.int16) - previous.astype(np.int16))
+    if difference.mean() < MOTION_THRESHOLD:
+        return None
+
+    columns = difference.sum(axis=0, dtype=np.float64)
+    return float((columns * np.arange(len(columns))).sum() / columns.sum() / len(columns))
+
+
+def detect_centers(frames):
+    """Subject centre per sample (None where nothing was found)"""
+    centers = []
+    previous = None
+    for frame in frames:
+        center = detect_face_center(frame)
+        if center is None:
+            center = detect_motion_center(frame, previous)
+        centers.append(center)
+        previous = frame
+    return centers
+
+
+def smooth_centers(centers):
+    """Fill gaps, drop outliers and smooth; None if no sample had a subject"""
+    known = [center for center in centers if center is not None]
+    if not known:
+        return None
+
+    # Hold the last known position through gaps (the first one backwards)
+    filled = []
+    last = known[0]
+    for center in centers:
+        if center is not None:
+            last = center
+        filled.append(last)
+
+    half = MEDIAN_WINDOW // 2
+    medians = []
+    for i in range(len(filled)):
+        window = sorted(filled[max(0, i - half):i + half + 1])
+        medians.append(window[len(window) // 2])
+
+    forward = []
+    value = medians[0]
+    for center in medians:
+        value += SMOOTHING_ALPHA * (center - value)
+        forward.append(value)
+
+    smoothed = [0.0] * len(forward)
+    value = forward[-1]
+    for i in range(len(forward) - 1, -1, -1):
+        value += SMOOTHING_ALPHA * (forward[i] - value)
+        smoothed[i] = value
+
+    return smoothed
+
+
+def read_frames(input_args, duration, source_size, sample_fps, timeout=300):
+    """Decode sample_fps grayscale frames ANALYSIS_WIDTH wide; yields numpy arrays"""
+    import numpy as np
+
+    source_width, source_height = source_size
+    width = ANALYSIS_WIDTH
+    height = max(2, round(width * source_height / source_width / 2) * 2)
+    frame_size = width * height
+
+    cmd = [
+        'ffmpeg',
+        '-v', 'error',
+        *input_args,
+        *(['-t', str(duration)] if duration is not None else []),
+        '-map', '0:v:0',
+        '-vf', f'fps={sample_fps},scale={width}:{height},format=gray',
+        '-f', 'rawvideo',
+        'pipe:1'
+    ]
+
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        stdin=subprocess.DEVNULL
+    )
+    watchdog = threading.Timer(timeout, process.kill)
+    watchdog.start()
+
+    try:
+        while True:
+            data = process.stdout.read(frame_size)
+            if len(data) < frame_size:
+                break
+            yield np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+        process.wait()
+    finally:
+        watchdog.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    if process.returncode != 0:
+        raise Exception(f"Reframe analysis failed: ffmpeg exited with {process.returncode}")
+
+
+def analyze_subject(input_args, duration, source_size, sample_fps=None):
+    """Return a SubjectTrack for the clip, or None if no subject was found"""
+    sample_fps = sample_fps or settings.REFRAME_SAMPLE_FPS
+
+    centers = detect_centers(read_frames(input_args, duration, source_size, sample_fps))
+    if len(centers) < 2:
+        return None
+
+    smoothed = smooth_centers(centers)
+    if smoothed is None:
+        return None
+
+    times = [i / sample_fps for i in range(len(smoothed))]
+    return SubjectTrack(times, smoothed, source_size)
@@ -1,13 +1,45 @@
 from rest_framework import serializers
-from .models import Clip
-from videos.serializers import VideoSerializer
+from .models import Clip, ClipRendition
+from videos.serializers import VideoSummarySerializer
+from snapcast_backend.serializers import SparseFieldsetsMixin
 
 
-class ClipSerializer(serializers.ModelSerializer):
+class ClipListSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    """Serializer for Clip lists; ``?expand=video`` embeds a video summary"""
+
+    video_id = serializers.IntegerField(read_only=True)
+
+    expandable_fields = {
+        'video': lambda: VideoSummarySerializer(read_only=True),
+    }
+
+    class Meta:
+        model = Clip
+        fields = [
+            'id',
+            'video_id',
+            'moment_index',
+            'title',
+            'start_time',
+            'end_time',
+            'duration',
+            'viral_score',
+            'encoding_profile',
+            'status',
+            'error_message',
+            'progress_percentage',
+            'is_published_youtube',
+            'created_at',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class ClipSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """Serializer for Clip model"""
 
-    video = VideoSerializer(read_only=True)
-    video_id = serializers.IntegerField(source='video.id', read_only=True)
+    video = VideoSummarySerializer(read_only=True)
+    video_id = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Clip
@@ -26,6 +58,7 @@ class ClipSerializer(serializers.ModelSerializer):
             'viral_reason',
             'original_clip_path',
             'processed_clip_path',
+            'encoding_profile',
             'status',
             'error_message',
             'progress_percentage',
@@ -39,6 +72,7 @@ class ClipCreateSerializer(serializers.Serializer):
     """Serializer for creating a new clip"""
     video_id = serializers.IntegerField(required=True)
     moment_index = serializers.IntegerField(required=True)
+    profile = serializers.ChoiceField(choices=Clip.ENCODING_PROFILE_CHOICES, required=False)
 
     def validate_moment_index(self, value):
         """Validate that moment_index is non-negative"""
@@ -51,6 +85,7 @@ class ClipUpdateTimesSerializer(serializers.Serializer):
     """Serializer for updating clip start/end times and reprocessing"""
     start_time = serializers.FloatField(required=True)
     end_time = serializers.FloatField(required=True)
+    profile = serializers.ChoiceField(choices=Clip.ENCODING_PROFILE_CHOICES, required=False)
 
     def validate(self, data):
         """Validate that end_time is after start_time"""
@@ -61,3 +96,31 @@ class ClipUpdateTimesSerializer(serializers.Serializer):
         if data['end_time'] - data['start_time'] > 120:  # Max 2 minutes
             raise serializers.ValidationError("Clip duration cannot exceed 120 seconds")
         return data
+
+
+class ClipRenditionSerializer(serializers.ModelSerializer):
+    """Serializer for ClipRendition model"""
+
+    class Meta:
+        model = ClipRendition
+        fields = [
+            'id',
+            'name',
+            'width',
+            'height',
+            'file_size',
+            'status',
+            'error_message',
+            'progress_percentage',
+            'created_at',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class ClipRenditionsCreateSerializer(serializers.Serializer):
+    """Serializer for requesting renditions of a clip"""
+    renditions = serializers.ListField(
+        child=serializers.ChoiceField(choices=ClipRendition.NAME_CHOICES),
+        allow_empty=False
+    )
@@ -1,7 +1,214 @@
+import fcntl
 import os
-import subprocess
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from django.conf import settings
+from videos.transcript_index import TranscriptIndex
+from .reframe import analyze_subject, crop_filter
+from .progress import (
+    FFMPEG_PROGRESS_ARGS,
+    YTDLP_PROGRESS_ARGS,
+    FFmpegProgressParser,
+    YtDlpProgressParser,
+    run_process,
+)
+
+
+# Output settings per Clip.encoding_profile
+ENCODING_PROFILES = {
+    # Throwaway renders for the trim editor: quarter the pixels, fastest preset
+    'preview': {
+        'width': 540,
+        'height': 960,
+        'preset': 'veryfast',
+        'crf': 30,
+        'audio_bitrate': '96k',
+    },
+    # Publishing quality
+    'final': {
+        'width': 1080,
+        'height': 1920,
+        'preset': 'medium',
+        'crf': 23,
+        'audio_bitrate': '128k',
+    },
+    # No re-encode when the source is already 9:16; otherwise falls back to 'final'
+    'stream-copy': {
+        'copy': True,
+        'fallback': 'final',
+    },
+}
+
+DEFAULT_ENCODING_PROFILE = 'final'
+
+# Output shapes for ClipRendition; quality comes from the named encoding profile
+RENDITIONS = {
+    # Shorts / Reels / TikTok
+    'vertical': {'width': 1080, 'height': 1920, 'profile': 'final'},
+    # Feed posts
+    'square': {'width': 1080, 'height': 1080, 'profile': 'final'},
+    # Low-res player in the UI
+    'preview': {'width': 540, 'height': 960, 'profile': 'preview'},
+}
+
+# How far from 9:16 a source may be and still count as vertical
+VERTICAL_ASPECT_TOLERANCE = 0.01
+
+
+class SourceMediaCache:
+    """Full source downloads under MEDIA_ROOT/sources, shared by every clip of a Video
+
+    Files are evicted least-recently-used first once the directory grows past
+    SOURCE_CACHE_MAX_BYTES. The file mtime doubles as the last-access time.
+    """
+
+    # Don't evict a source that was used this recently; a worker may be cutting from it
+    EVICTION_GRACE_SECONDS = 600
+
+    _thread_locks = {}
+    _thread_locks_guard = threading.Lock()
+
+    def __init__(self):
+        self.sources_dir = Path(settings.MEDIA_ROOT) / 'sources'
+        self.sources_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = settings.SOURCE_CACHE_MAX_BYTES
+
+    def path_for(self, youtube_id):
+        """Return the cache path for a YouTube video"""
+        return self.sources_dir / f"{youtube_id}.mp4"
+
+    def get(self, youtube_id):
+        """Return the cached source path if present, marking it as used"""
+        path = self.path_for(youtube_id)
+        if not path.exists():
+            return None
+        os.utime(path)
+        return str(path)
+
+    def fetch(self, youtube_url, youtube_id, progress_callback=None):
+        """Return the cached source, downloading it first if needed
+
+        ``progress_callback`` receives the download progress as a 0..1 fraction.
+        """
+        with self._lock(youtube_id):
+            cached = self.get(youtube_id)
+            if cached:
+                print(f"✓ Source cache hit: {youtube_id}")
+                return cached
+
+            print(f"Source cache miss, downloading full video: {youtube_id}")
+            path = self.path_for(youtube_id)
+            partial_path = path.with_suffix('.part.mp4')
+
+            cmd = [
+                'yt-dlp',
+                '-f', settings.SOURCE_CACHE_FORMAT,
+                '--merge-output-format', 'mp4',
+                '--no-part',
+                *YTDLP_PROGRESS_ARGS,
+                '-o', str(partial_path),
+                youtube_url
+            ]
+
+            result = run_process(
+                cmd,
+                timeout=3600,  # 1 hour timeout for full episodes
+                on_stdout_line=YtDlpProgressParser(progress_callback) if progress_callback else None
+            )
+
+            if result.timed_out:
+                partial_path.unlink(missing_ok=True)
+                raise Exception("Source download timeout")
+
+            if result.returncode != 0:
+                partial_path.unlink(missing_ok=True)
+                raise Exception(f"yt-dlp error: {result.stderr}")
+
+            os.replace(partial_path, path)
+
+        self.evict(keep=path)
+        return str(path)
+
+    def evict(self, keep=None):
+        """Delete least recently used sources until the cache fits its budget"""
+        entries = []
+        for path in self.sources_dir.glob('*.mp4'):
+            if path.name.endswith('.part.mp4'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+
+        for mtime, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == Path(keep):
+                continue
+            if now - mtime < self.EVICTION_GRACE_SECONDS:
+                continue
+            if not self._remove(path.stem, path):
+                continue
+            total -= size
+            print(f"Evicted cached source {path.name} ({size // (1024 * 1024)} MB)")
+
+        # Lock files left behind by downloads that failed
+        for lock_path in self.sources_dir.glob('*.lock'):
+            if not self.path_for(lock_path.stem).exists():
+                self._remove(lock_path.stem)
+
+    def _remove(self, youtube_id, path=None):
+        """Delete a source (if given) and its lock file, unless a download holds the lock"""
+        lock_path = self.sources_dir / f"{youtube_id}.lock"
+        try:
+            lock_file = open(lock_path, 'a')
+        except OSError:
+            return False
+        with lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            if path is not None:
+                path.unlink(missing_ok=True)
+            # _lock() notices the file is gone and locks a fresh one
+            lock_path.unlink(missing_ok=True)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return True
+
+    @contextmanager
+    def _lock(self, youtube_id):
+        """Serialize downloads of the same video across threads and processes"""
+        with self._thread_locks_guard:
+            thread_lock = self._thread_locks.setdefault(youtube_id, threading.Lock())
+
+        lock_path = self.sources_dir / f"{youtube_id}.lock"
+        with thread_lock:
+            while True:
+                lock_file = open(lock_path, 'a')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # evict() may have deleted the file while we waited for it
+                try:
+                    current = os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino
+                except FileNotFoundError:
+                    current = False
+                if current:
+                    break
+                lock_file.close()
+
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
 
 
 class VideoProcessingService:
@@ -12,8 +219,11 @@ class VideoProcessingService:
         self.clips_dir = Path(self.media_root) / 'clips'
         self.clips_dir.mkdir(parents=True, exist_ok=True)
 
-    def download_clip_segment(self, youtube_url, start_time, end_time, output_filename):
-        """Download specific segment of video using yt-dlp"""
+    def download_clip_segment(self, youtube_url, start_time, end_time, output_filename, progress_callback=None):
+        """Download specific segment of video using yt-dlp
+
+        ``progress_callback`` receives the download progress as a 0..1 fraction.
+        """
 
         output_path = self.clips_dir / output_filename
 
@@ -32,6 +242,7 @@ class VideoProcessingService:
             f'*{start_time}-{end_time}',
             '-f', 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
             '--merge-output-format', 'mp4',
+            *YTDLP_PROGRESS_ARGS,
             '-o', str(output_path),
             youtube_url
         ]
@@ -39,90 +250,379 @@ class VideoProcessingService:
         print(f"Command: {' '.join(cmd)}")
 
         try:
-            result = subprocess.run(
+            result = run_process(
                 cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minutes timeout
+                timeout=300,  # 5 minutes timeout
+                on_stdout_line=YtDlpProgressParser(progress_callback) if progress_callback else None
             )
-
-            if result.returncode == 0:
-                return str(output_path)
-            else:
-                raise Exception(f"yt-dlp error: {result.stderr}")
-
-        except subprocess.TimeoutExpired:
-            raise Exception("Download timeout")
-        except Exception as e:
+        except OSError as e:
             raise Exception(f"Download failed: {str(e)}")
 
-    def create_vertical_clip(self, input_path, output_filename):
-        """Create vertical (9:16) clip"""
+        if result.timed_out:
+            raise Exception("Download failed: Download timeout")
+        if result.returncode != 0:
+            raise Exception(f"Download failed: yt-dlp error: {result.stderr}")
+        return str(output_path)
+
+    def cut_clip_segment(self, source_path, start_time, end_time, output_filename):
+        """Cut a segment out of a local source file without re-encoding"""
 
         output_path = self.clips_dir / output_filename
 
-        # Just crop to vertical - no subtitles
-        video_filter = (
-            "scale=1080:1920:force_original_aspect_ratio=increase,"
-            "crop=1080:1920"
+        # Input seeking jumps straight to the nearest keyframe instead of decoding from 0.
+        # The mp4 edit list keeps start_time at t=0, so offsets into the cut stay exact.
+        cmd = [
+            'ffmpeg',
+            '-ss', str(start_time),
+            '-i', str(source_path),
+            '-t', str(end_time - start_time),
+            '-map', '0',
+            '-c', 'copy',
+            '-y',
+            str(output_path)
+        ]
+
+        try:
+            result = run_process(cmd, timeout=300)
+        except OSError as e:
+            raise Exception(f"Cut failed: {str(e)}")
+
+        if result.timed_out:
+            raise Exception("Cut failed: Cut timeout")
+        if result.returncode != 0:
+            raise Exception(f"Cut failed: FFmpeg error: {result.stderr}")
+        return str(output_path)
+
+    def resolve_stream_urls(self, youtube_url):
+        """Resolve the direct media URLs (video, then audio if separate) with yt-dlp -g"""
+        cmd = [
+            'yt-dlp',
+            '-g',
+            '-f', 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+            youtube_url
+        ]
+
+        urls = []
+
+        def collect(line):
+            if line:
+                urls.append(line)
+
+        try:
+            result = run_process(cmd, timeout=60, on_stdout_line=collect)
+        except OSError as e:
+            raise Exception(f"Resolve failed: {str(e)}")
+
+        if result.timed_out:
+            raise Exception("Resolve failed: Resolve timeout")
+        if result.returncode != 0 or not urls:
+            raise Exception(f"Resolve failed: yt-dlp error: {result.stderr}")
+        return urls
+
+    def create_vertical_clip(self, input_path, output_filename, start_offset=None, duration=None,
+                             progress_callback=None, profile=DEFAULT_ENCODING_PROFILE):
+        """Create vertical (9:16) clip, optionally from a sub-range of the input
+
+        ``progress_callback`` receives the encode progress as a 0..1 fraction;
+        it needs ``duration`` to know how far along the output is.
+        ``profile`` is a key of ENCODING_PROFILES.
+        """
+        # Seeking before -i while re-encoding is frame accurate
+        input_args = []
+        if start_offset:
+            input_args += ['-ss', str(start_offset)]
+        input_args += ['-i', str(input_path)]
+
+        return self._encode_vertical(
+            input_args,
+            [],
+            output_filename,
+            duration,
+            progress_callback,
+            profile=profile,
+            probe_source=input_path
+        )
+
+    def create_vertical_clip_from_stream(self, youtube_url, start_time, end_time, output_filename,
+                                         progress_callback=None, profile=DEFAULT_ENCODING_PROFILE):
+        """Download and reframe in one pass: ffmpeg reads only [start, end] of the remote media
+
+        No intermediate file is written; ffmpeg seeks in the remote streams via
+        HTTP range requests and encodes straight to the final clip.
+        """
+        urls, input_args, audio_input = self._stream_inputs(youtube_url, start_time)
+        map_args = ['-map', '0:v:0', '-map', f'{audio_input}:a:0?']
+
+        return self._encode_vertical(
+            input_args,
+            map_args,
+            output_filename,
+            end_time - start_time,
+            progress_callback,
+            profile=profile,
+            probe_source=urls[0]
+        )
+
+    def _stream_inputs(self, youtube_url, start_time):
+        """Return (urls, ffmpeg input args, index of the audio input) for remote reading"""
+        urls = self.resolve_stream_urls(youtube_url)
+
+        input_args = []
+        for url in urls:
+            input_args += [
+                '-reconnect', '1',
+                '-reconnect_streamed', '1',
+                '-ss', str(start_time),
+                '-i', url,
+            ]
+
+        # Separate video/audio formats arrive as two inputs
+        audio_input = 1 if len(urls) > 1 else 0
+        return urls, input_args, audio_input
+
+    def create_renditions(self, input_path, outputs, start_offset=None, duration=None,
+                          progress_callback=None):
+        """Render several RENDITIONS of the same range with a single decode
+
+        ``outputs`` maps rendition name to output filename; returns name -> path.
+        """
+        input_args = []
+        if start_offset:
+            input_args += ['-ss', str(start_offset)]
+        input_args += ['-i', str(input_path)]
+
+        return self._encode_renditions(
+            input_args,
+            0,
+            outputs,
+            duration,
+            progress_callback,
+            probe_source=input_path
+        )
+
+    def create_renditions_from_stream(self, youtube_url, start_time, end_time, outputs,
+                                      progress_callback=None):
+        """create_renditions reading straight from YouTube (see create_vertical_clip_from_stream)"""
+        urls, input_args, audio_input = self._stream_inputs(youtube_url, start_time)
+
+        return self._encode_renditions(
+            input_args,
+            audio_input,
+            outputs,
+            end_time - start_time,
+            progress_callback,
+            probe_source=urls[0]
         )
 
+    def _encode_renditions(self, input_args, audio_input, outputs, duration, progress_callback,
+                           probe_source=None):
+        """One ffmpeg process: split the decoded video and encode one output per rendition"""
+        unknown = set(outputs) - set(RENDITIONS)
+        if unknown:
+            raise Exception(f"Processing failed: Unknown renditions: {', '.join(sorted(unknown))}")
+
+        names = list(outputs)
+        script_dir = tempfile.mkdtemp(prefix='reframe_')
+        try:
+            # One analysis pass serves every rendition's crop
+            track = self.track_subject(input_args, duration, probe_source)
+
+            # [0:v]split=N[s0][s1]...;[s0]<crop to rendition>[v0];...
+            split_labels = ''.join(f'[s{i}]' for i in range(len(names)))
+            filter_parts = [f'[0:v]split={len(names)}{split_labels}']
+            for i, name in enumerate(names):
+                video_filter = crop_filter(
+                    RENDITIONS[name]['width'],
+                    RENDITIONS[name]['height'],
+                    track,
+                    script_dir,
+                    name=f'r{i}'
+                )
+                filter_parts.append(f'[s{i}]{video_filter}[v{i}]')
+
+            return self._run_renditions(input_args, audio_input, outputs, names, filter_parts,
+                                        duration, progress_callback)
+        finally:
+            shutil.rmtree(script_dir, ignore_errors=True)
+
+    def _run_renditions(self, input_args, audio_input, outputs, names, filter_parts, duration,
+                        progress_callback):
+        """Build the per-rendition outputs and run ffmpeg"""
+        output_paths = {}
+        output_args = []
+        for i, name in enumerate(names):
+            profile = ENCODING_PROFILES[RENDITIONS[name]['profile']]
+            output_path = self.clips_dir / outputs[name]
+            output_paths[name] = str(output_path)
+            output_args += [
+                '-map', f'[v{i}]',
+                '-map', f'{audio_input}:a:0?',
+                *(['-t', str(duration)] if duration is not None else []),
+                '-c:v', 'libx264',
+                '-preset', profile['preset'],
+                '-crf', str(profile['crf']),
+                '-threads', str(settings.FFMPEG_THREADS),
+                '-c:a', 'aac',
+                '-b:a', profile['audio_bitrate'],
+                '-ar', '44100',
+                str(output_path),
+            ]
+
         cmd = [
             'ffmpeg',
-            '-i', str(input_path),
-            '-vf', video_filter,
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-crf', '23',
-            '-c:a', 'aac',
-            '-b:a', '128k',
-            '-ar', '44100',
-            '-y',  # Overwrite output file
-            str(output_path)
+            *input_args,
+            '-filter_complex', ';'.join(filter_parts),
+            *FFMPEG_PROGRESS_ARGS,
+            '-y',  # Overwrite output files
+            *output_args
         ]
 
         try:
-            result = subprocess.run(
+            result = run_process(
                 cmd,
-                capture_output=True,
-                text=True,
-                timeout=600  # 10 minutes timeout
+                timeout=600 * len(names),  # 10 minutes per rendition
+                on_stdout_line=FFmpegProgressParser(duration, progress_callback) if progress_callback else None
             )
+        except OSError as e:
+            raise Exception(f"Processing failed: {str(e)}")
 
-            if result.returncode == 0:
-                return str(output_path)
-            else:
-                raise Exception(f"FFmpeg error: {result.stderr}")
+        if result.timed_out:
+            raise Exception("Processing failed: Processing timeout")
+        if result.returncode != 0:
+            raise Exception(f"Processing failed: FFmpeg error: {result.stderr}")
+        return output_paths
 
-        except subprocess.TimeoutExpired:
-            raise Exception("Processing timeout")
+    def track_subject(self, input_args, duration, probe_source):
+        """SubjectTrack for smart reframing, or None to keep the centre crop"""
+        if settings.CLIP_REFRAME != 'smart' or probe_source is None:
+            return None
+
+        dimensions = self.probe_dimensions(probe_source)
+        if not dimensions:
+            return None
+
+        try:
+            track = analyze_subject(input_args, duration, dimensions)
         except Exception as e:
+            # Reframing is an improvement, not a requirement
+            print(f"⚠️ Smart reframing unavailable, using centre crop: {str(e)}")
+            return None
+
+        if track is None:
+            print("No subject found, using centre crop")
+        return track
+
+    def probe_dimensions(self, source):
+        """Return (width, height) of the first video stream, or None if unknown"""
+        cmd = [
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height',
+            '-of', 'csv=s=x:p=0',
+            str(source)
+        ]
+
+        lines = []
+        try:
+            result = run_process(cmd, timeout=60, on_stdout_line=lines.append)
+        except OSError:
+            return None
+        if result.returncode != 0 or not lines:
+            return None
+
+        try:
+            width, height = (int(value) for value in lines[0].split('x')[:2])
+        except ValueError:
+            return None
+        return width, height
+
+    def is_vertical(self, source):
+        """Whether the source is already 9:16"""
+        dimensions = self.probe_dimensions(source)
+        if not dimensions or not dimensions[1]:
+            return False
+        width, height = dimensions
+        return abs(width / height - 9 / 16) <= VERTICAL_ASPECT_TOLERANCE
+
+    def _encode_vertical(self, input_args, map_args, output_filename, duration, progress_callback,
+                         profile=DEFAULT_ENCODING_PROFILE, probe_source=None):
+        """Run the 9:16 crop/scale/encode for the given ffmpeg inputs"""
+        if profile not in ENCODING_PROFILES:
+            raise Exception(f"Processing failed: Unknown encoding profile: {profile}")
+
+        script_dir = tempfile.mkdtemp(prefix='reframe_')
+        try:
+            return self._run_vertical(input_args, map_args, output_filename, duration,
+                                      progress_callback, profile, probe_source, script_dir)
+        finally:
+            shutil.rmtree(script_dir, ignore_errors=True)
+
+    def _run_vertical(self, input_args, map_args, output_filename, duration, progress_callback,
+                      profile, probe_source, script_dir):
+        """Pick codec/filter arguments for the profile and run ffmpeg"""
+        settings_for_profile = ENCODING_PROFILES[profile]
+        if settings_for_profile.get('copy'):
+            if probe_source is not None and self.is_vertical(probe_source):
+                print(f"Source is already vertical, copying streams ({profile})")
+                codec_args = ['-c', 'copy']
+            else:
+                fallback = settings_for_profile['fallback']
+                print(f"⚠️ Source is not vertical, encoding with '{fallback}' instead of '{profile}'")
+                settings_for_profile = ENCODING_PROFILES[fallback]
+
+        if not settings_for_profile.get('copy'):
+            width = settings_for_profile['width']
+            height = settings_for_profile['height']
+
+            # Just crop to vertical - no subtitles
+            track = self.track_subject(input_args, duration, probe_source)
+            video_filter = crop_filter(width, height, track, script_dir)
+            codec_args = [
+                '-vf', video_filter,
+                '-c:v', 'libx264',
+                '-preset', settings_for_profile['preset'],
+                '-crf', str(settings_for_profile['crf']),
+                '-threads', str(settings.FFMPEG_THREADS),
+                '-c:a', 'aac',
+                '-b:a', settings_for_profile['audio_bitrate'],
+                '-ar', '44100',
+            ]
+
+        output_path = self.clips_dir / output_filename
+
+        cmd = [
+            'ffmpeg',
+            *input_args,
+            *(['-t', str(duration)] if duration is not None else []),
+            *map_args,
+            *codec_args,
+            *FFMPEG_PROGRESS_ARGS,
+            '-y',  # Overwrite output file
+            str(output_path)
+        ]
+
+        try:
+            result = run_process(
+                cmd,
+                timeout=600,  # 10 minutes timeout
+                on_stdout_line=FFmpegProgressParser(duration, progress_callback) if progress_callback else None
+            )
+        except OSError as e:
             raise Exception(f"Processing failed: {str(e)}")
 
-    def get_clip_subtitle_text(self, transcript_with_timestamps, start_time, end_time):
-        """Extract subtitle text for the clip duration from transcript"""
-        subtitle_text = []
-
-        print(f"=== Extracting subtitle text ===")
-        print(f"Looking for text between {start_time}s and {end_time}s")
-        print(f"Total transcript entries: {len(transcript_with_timestamps)}")
-
-        matched_count = 0
-        for entry in transcript_with_timestamps:
-            entry_start = entry['start']
-            entry_end = entry_start + entry['duration']
-
-            # Check if entry overlaps with clip duration
-            if entry_start < end_time and entry_end > start_time:
-                subtitle_text.append(entry['text'])
-                matched_count += 1
-                if matched_count <= 3:  # Show first 3 matches
-                    print(f"  Match: [{entry_start:.1f}s - {entry_end:.1f}s] {entry['text'][:50]}...")
-
-        print(f"Total matched entries: {matched_count}")
-        result = ' '.join(subtitle_text)
-        print(f"Final subtitle text length: {len(result)} chars")
-        if len(result) > 0:
-            print(f"First 100 chars: {result[:100]}...")
-
-        return result
+        if result.timed_out:
+            raise Exception("Processing failed: Processing timeout")
+        if result.returncode != 0:
+            raise Exception(f"Processing failed: FFmpeg error: {result.stderr}")
+        return str(output_path)
+
+    def get_clip_subtitle_text(self, transcript, start_time, end_time):
+        """Extract subtitle text for the clip duration from transcript
+
+        ``transcript`` is a TranscriptIndex (see Video.get_transcript_index)
+        or a raw transcript_with_timestamps list.
+        """
+        if not isinstance(transcript, TranscriptIndex):
+            transcript = TranscriptIndex(transcript)
+        return transcript.text_between(start_time, end_time)
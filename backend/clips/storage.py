@@ -0,0 +1,209 @@
+"""
+Disk budget for MEDIA_ROOT/clips.
+
+Renders write ``clip_{id}_original.mp4``, ``clip_{id}_final.mp4`` and
+rendition files and never delete them. ClipStorageManager.collect() frees
+space in this order:
+
+    1. orphans      - files no Clip or ClipRendition points at
+    2. originals    - downloaded windows, least recently used first
+    3. finals       - unpublished rendered clips and their renditions, LRU;
+                      the clip is marked 'evicted' and can be rendered again
+
+Only steps 2 and 3 depend on CLIP_STORAGE_MAX_BYTES. Published clips and
+clips with a render in flight are never touched. Last use is the later of
+Clip.last_accessed_at (stream/download) and the file mtime.
+"""
+
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import Clip, ClipRendition
+
+
+class StorageEntry:
+    """A file under MEDIA_ROOT/clips and what references it"""
+
+    def __init__(self, path, size, mtime):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.kind = None  # 'original', 'final', 'rendition' or None for orphans
+        self.clip_id = None
+        self.rendition_id = None
+        self.reference = None  # the path exactly as the row stores it
+        self.last_used = mtime
+        self.evictable = False
+
+
+class ClipStorageManager:
+    """Enforce CLIP_STORAGE_MAX_BYTES on MEDIA_ROOT/clips"""
+
+    # Unreferenced files younger than this may belong to a render that hasn't saved its path yet
+    ORPHAN_GRACE_SECONDS = 3600
+
+    def __init__(self, max_bytes=None):
+        self.clips_dir = Path(settings.MEDIA_ROOT) / 'clips'
+        self.max_bytes = settings.CLIP_STORAGE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def scan(self):
+        """Return {normalized path: StorageEntry} for every file in the clips directory"""
+        entries = {}
+        if not self.clips_dir.exists():
+            return entries
+
+        with os.scandir(self.clips_dir) as iterator:
+            for dir_entry in iterator:
+                if not dir_entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except FileNotFoundError:
+                    continue
+                path = os.path.normpath(dir_entry.path)
+                entries[path] = StorageEntry(path, stat.st_size, stat.st_mtime)
+        return entries
+
+    def attach_references(self, entries):
+        """Mark which entries belong to which clip and whether they may be evicted"""
+        clips = (
+            Clip.objects
+            .exclude(original_clip_path='', processed_clip_path='')
+            .values_list(
+                'id', 'status', 'is_published_youtube', 'last_accessed_at',
+                'original_clip_path', 'processed_clip_path'
+            )
+        )
+        clip_info = {}
+        for clip_id, status, published, accessed, original, processed in clips.iterator(chunk_size=2000):
+            last_accessed = accessed.timestamp() if accessed else 0
+            active = status in Clip.ACTIVE_STATUSES
+            clip_info[clip_id] = (status, published, last_accessed, active)
+
+            for kind, path in (('original', original), ('final', processed)):
+                entry = entries.get(os.path.normpath(path)) if path else None
+                if entry is None:
+                    continue
+                entry.kind = kind
+                entry.clip_id = clip_id
+                entry.reference = path
+                entry.last_used = max(entry.mtime, last_accessed)
+                if kind == 'original':
+                    entry.evictable = not active
+                else:
+                    entry.evictable = status == 'completed' and not published
+
+        renditions = (
+            ClipRendition.objects
+            .exclude(file_path='')
+            .values_list('id', 'clip_id', 'status', 'file_path')
+        )
+        for rendition_id, clip_id, rendition_status, path in renditions.iterator(chunk_size=2000):
+            entry = entries.get(os.path.normpath(path))
+            if entry is None:
+                continue
+            entry.kind = 'rendition'
+            entry.clip_id = clip_id
+            entry.rendition_id = rendition_id
+            entry.reference = path
+
+            status, published, last_accessed, active = clip_info.get(clip_id, (None, False, 0, False))
+            entry.last_used = max(entry.mtime, last_accessed)
+            # A pending/processing rendition keeps its old path while ffmpeg rewrites it
+            entry.evictable = rendition_status == 'completed' and not published and not active
+
+    def collect(self, dry_run=False):
+        """Remove orphans, then evict until the directory fits its budget; returns a report"""
+        entries = self.scan()
+        self.attach_references(entries)
+
+        report = {
+            'orphans': 0,
+            'originals': 0,
+            'finals': 0,
+            'renditions': 0,
+            'freed_bytes': 0,
+            'total_bytes': sum(entry.size for entry in entries.values()),
+            'max_bytes': self.max_bytes,
+        }
+        now = time.time()
+
+        for entry in list(entries.values()):
+            if entry.kind is None and now - entry.mtime > self.ORPHAN_GRACE_SECONDS:
+                self._remove(entry, 'orphans', report, dry_run)
+
+        remaining = [entry for entry in entries.values() if entry.kind is not None and entry.evictable]
+        originals = sorted((e for e in remaining if e.kind == 'original'), key=lambda e: e.last_used)
+        finals = sorted((e for e in remaining if e.kind != 'original'), key=lambda e: e.last_used)
+
+        for entry in originals + finals:
+            if report['total_bytes'] <= self.max_bytes:
+                break
+            if entry.kind == 'original':
+                self._remove(entry, 'originals', report, dry_run)
+            elif entry.kind == 'final':
+                self._remove(entry, 'finals', report, dry_run)
+            else:
+                self._remove(entry, 'renditions', report, dry_run)
+
+        return report
+
+    def _remove(self, entry, bucket, report, dry_run):
+        """Detach a file from its clip/rendition, then delete it"""
+        if not dry_run:
+            if not self._detach(entry):
+                # The row moved on since the scan (re-render in flight, or
+                # the same deterministic path saved again): keep the file
+                return
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+        report[bucket] += 1
+        report['freed_bytes'] += entry.size
+        report['total_bytes'] -= entry.size
+        print(f"{'Would remove' if dry_run else 'Removed'} {bucket[:-1]} {os.path.basename(entry.path)} "
+              f"({entry.size // (1024 * 1024)} MB)")
+
+    def _detach(self, entry):
+        """Clear the row's reference to the file; False if the row no longer allows it
+
+        Conditional on the path and status seen by the scan, so a concurrent
+        re-render keeps its file and its row.
+        """
+        if entry.kind is None:
+            return True
+        if entry.kind == 'original':
+            return bool(
+                Clip.objects
+                .filter(id=entry.clip_id, original_clip_path=entry.reference)
+                .exclude(status__in=Clip.ACTIVE_STATUSES)
+                .update(original_clip_path='', original_start_time=None, original_end_time=None)
+            )
+        if entry.kind == 'final':
+            return bool(
+                Clip.objects
+                .filter(
+                    id=entry.clip_id,
+                    status='completed',
+                    is_published_youtube=False,
+                    processed_clip_path=entry.reference
+                )
+                .update(status='evicted', processed_clip_path='', progress_percentage=0)
+            )
+        deleted, _ = (
+            ClipRendition.objects
+            .filter(
+                id=entry.rendition_id,
+                status='completed',
+                file_path=entry.reference,
+                clip__is_published_youtube=False
+            )
+            .exclude(clip__status__in=Clip.ACTIVE_STATUSES)
+            .delete()
+        )
+        return bool(deleted)
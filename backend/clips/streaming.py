@@ -0,0 +1,188 @@
+"""
+Byte-range aware file responses for clip playback and download.
+
+Supports single ``Range`` requests (206), ``If-Range``, ETag/Last-Modified
+validators with conditional GET (304), and optional offload of the body to
+the reverse proxy via X-Accel-Redirect (nginx) or X-Sendfile (Apache/lighttpd).
+Multi-range requests that don't collapse into one range fall back to the
+full 200 response, which RFC 9110 allows.
+"""
+
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def make_etag(stat):
+    """Validator from size and mtime; renders always rewrite the whole file"""
+    return quote_etag(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+
+
+def parse_range_header(header, size):
+    """Return a list of (start, end) inclusive byte ranges, [] if unsatisfiable,
+    or None if the header is absent or malformed (serve the whole file)"""
+    if not header or not header.startswith('bytes=') or size == 0:
+        return None
+
+    ranges = []
+    for spec in header[len('bytes='):].split(','):
+        match = RANGE_RE.match(spec)
+        if not match:
+            return None
+        first, last = match.groups()
+
+        if first == '' and last == '':
+            return None
+        if first == '':
+            # Suffix range: the final N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if end < start:
+                return None
+            if start >= size:
+                continue
+            end = min(end, size - 1)
+        ranges.append((start, end))
+
+    return ranges
+
+
+def coalesce_ranges(ranges):
+    """Merge overlapping or adjacent ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        # Weak comparison: W/"x" matches "x"
+        bare = etag.removeprefix('W/')
+        return '*' in candidates or any(tag.removeprefix('W/') == bare for tag in candidates)
+
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def _range_still_valid(request, etag, mtime):
+    """If-Range: only honour Range when the client's copy is current"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Strong comparison, so a weak tag never matches
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as file_handle:
+        file_handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file_handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offload_headers(path):
+    """Headers telling the proxy to send the file itself, or None"""
+    mode = settings.MEDIA_OFFLOAD
+    if not mode:
+        return None
+
+    if mode == 'x-sendfile':
+        return {'X-Sendfile': str(path)}
+
+    if mode == 'x-accel-redirect':
+        relative = Path(path).resolve().relative_to(Path(settings.MEDIA_ROOT).resolve())
+        prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')
+        return {'X-Accel-Redirect': f"{prefix}/{relative.as_posix()}"}
+
+    raise ValueError(f"Unknown MEDIA_OFFLOAD: {mode}")
+
+
+def ranged_file_response(request, path, content_type, filename=None, as_attachment=False):
+    """Serve a file with Range, conditional GET and optional proxy offload"""
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = make_etag(stat)
+
+    common_headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': 'private, max-age=0, must-revalidate',
+    }
+    if filename:
+        common_headers['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponse(status=304)
+        for name, value in common_headers.items():
+            if name != 'Content-Disposition':
+                response[name] = value
+        return response
+
+    offload = _offload_headers(path)
+    if offload is not None:
+        # The proxy handles Range itself once it has the file
+        response = HttpResponse(content_type=content_type)
+        for name, value in {**common_headers, **offload}.items():
+            response[name] = value
+        return response
+
+    ranges = None
+    if _range_still_valid(request, etag, stat.st_mtime):
+        ranges = parse_range_header(request.headers.get('Range'), size)
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if ranges:
+        ranges = coalesce_ranges(ranges)
+
+    if ranges and len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            _read_range(path, start, end),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = StreamingHttpResponse(
+            _read_range(path, 0, size - 1),
+            content_type=content_type
+        )
+        response['Content-Length'] = str(size)
+
+    for name, value in common_headers.items():
+        response[name] = value
+    return response
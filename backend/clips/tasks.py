@@ -0,0 +1,362 @@
+import os
+import threading
+import time
+from celery import shared_task
+from django.conf import settings
+from .models import Clip, ClipRendition
+from .services import SourceMediaCache, VideoProcessingService
+from .storage import ClipStorageManager
+from .progress import ProgressThrottle
+from snapcast_backend.events import publish
+from snapcast_backend.jobs import enqueue
+
+_last_storage_collection = 0.0
+_storage_collection_lock = threading.Lock()
+
+
+def report_progress(clip, stage=None):
+    """Push the clip's current progress to subscribed clients"""
+    publish(clip.progress_channel, clip.progress_snapshot(stage))
+
+
+def save_claimed(clip, status=None, **changes):
+    """Worker write that only lands while this job still owns the clip
+
+    If the clip was requeued after this job's lease expired, raise instead of
+    overwriting the newer run (and, from a progress callback, stop ffmpeg).
+    """
+    if not clip.transition_claimed(status, **changes):
+        raise Exception(f"Clip {clip.id} was queued again; a newer job owns it")
+
+
+def stage_progress(clip, stage, start, end):
+    """Progress callback mapping a stage's 0..1 fraction onto [start, end] percent
+
+    Saves only progress_percentage, at most once per PROGRESS_SAVE_INTERVAL_SECONDS.
+    """
+    def update(fraction):
+        save_claimed(clip, progress_percentage=int(start + (end - start) * fraction))
+        report_progress(clip, stage)
+
+    return ProgressThrottle(update, interval=settings.PROGRESS_SAVE_INTERVAL_SECONDS)
+
+
+CLIP_PIPELINES = ('auto', 'source', 'window', 'stream')
+
+
+def get_pipeline():
+    """Resolve settings.CLIP_PIPELINE ('auto' picks 'source' when the source cache is on)"""
+    pipeline = settings.CLIP_PIPELINE
+    if pipeline not in CLIP_PIPELINES:
+        raise ValueError(f"Unknown CLIP_PIPELINE: {pipeline!r} (expected one of {', '.join(CLIP_PIPELINES)})")
+    if pipeline == 'auto':
+        return 'source' if settings.SOURCE_CACHE_MAX_BYTES > 0 else 'window'
+    return pipeline
+
+
+def prepare_window(clip, video, processing_service):
+    """'window' pipeline: make sure original_clip_path covers the clip, downloading if needed"""
+    if clip.original_covers(clip.start_time, clip.end_time) and os.path.exists(clip.original_clip_path):
+        # Re-trim inside the window we already have: no network, no re-cut
+        print(f"Reusing downloaded window [{clip.original_start_time}s - {clip.original_end_time}s]")
+        report_progress(clip, 'reusing_download')
+        return
+
+    # Grab a padded window so small trims later on stay local
+    padding = settings.CLIP_WINDOW_PADDING_SECONDS
+    window_start = max(0, clip.start_time - padding)
+    if video.duration:
+        window_end = min(clip.end_time + padding, video.duration)
+    else:
+        # Unknown length: padding could run past the end of the video, and
+        # original_covers() would then vouch for seconds that were never downloaded
+        window_end = clip.end_time
+
+    original_filename = f"clip_{clip.id}_original.mp4"
+    if settings.SOURCE_CACHE_MAX_BYTES > 0:
+        # Download the whole video once and cut every clip from the local copy
+        source_path = SourceMediaCache().fetch(
+            video.youtube_url,
+            video.youtube_id,
+            progress_callback=stage_progress(clip, 'downloading', 10, 35)
+        )
+        report_progress(clip, 'cutting')
+        original_path = processing_service.cut_clip_segment(
+            source_path,
+            window_start,
+            window_end,
+            original_filename
+        )
+    else:
+        original_path = processing_service.download_clip_segment(
+            video.youtube_url,
+            window_start,
+            window_end,
+            original_filename,
+            progress_callback=stage_progress(clip, 'downloading', 10, 40)
+        )
+    print(f"Downloaded to: {original_path}")
+    clip.original_clip_path = original_path
+    clip.original_start_time = window_start
+    clip.original_end_time = window_end
+
+
+def process_clip(clip, video):
+    """Process clip: download and crop to vertical
+
+    settings.CLIP_PIPELINE picks how the source frames reach the encoder:
+
+        'source' - encode straight from the cached full video (no intermediate file)
+        'window' - download a padded window to clip_N_original.mp4, then encode
+                   from it; re-trims inside the window skip the download
+        'stream' - ffmpeg reads the resolved YouTube media URLs directly,
+                   downloading and reframing in one pass (no cache, no intermediate)
+    """
+    processing_service = VideoProcessingService()
+    pipeline = get_pipeline()
+
+    # render_clip's claim already moved the clip to 'downloading' at 10%
+    report_progress(clip)
+
+    print(f"=== Rendering clip {clip.id} ({pipeline} pipeline, {clip.encoding_profile} profile) ===")
+    print(f"Title: {clip.title}")
+    print(f"Start time: {clip.start_time} seconds")
+    print(f"End time: {clip.end_time} seconds")
+
+    source_path = None
+    if pipeline == 'source':
+        source_path = SourceMediaCache().fetch(
+            video.youtube_url,
+            video.youtube_id,
+            progress_callback=stage_progress(clip, 'downloading', 10, 40)
+        )
+    elif pipeline == 'window':
+        prepare_window(clip, video, processing_service)
+
+    # Get subtitle text from transcript (for display only, not burned into video)
+    subtitle_text = processing_service.get_clip_subtitle_text(
+        video.get_transcript_index(),
+        clip.start_time,
+        clip.end_time
+    )
+
+    # One write for the download, the subtitles and the move to 'processing'
+    changes = {'progress_percentage': 50, 'subtitle_text': subtitle_text}
+    if pipeline == 'window':
+        changes.update(
+            original_clip_path=clip.original_clip_path,
+            original_start_time=clip.original_start_time,
+            original_end_time=clip.original_end_time
+        )
+    save_claimed(clip, 'processing', **changes)
+    report_progress(clip, 'encoding')
+
+    # Create vertical clip (without burned subtitles)
+    processed_filename = f"clip_{clip.id}_final.mp4"
+    duration = clip.end_time - clip.start_time
+    encode_progress = stage_progress(clip, 'encoding', 50, 90)
+
+    if pipeline == 'source':
+        processed_path = processing_service.create_vertical_clip(
+            source_path,
+            processed_filename,
+            start_offset=clip.start_time,
+            duration=duration,
+            progress_callback=encode_progress,
+            profile=clip.encoding_profile
+        )
+    elif pipeline == 'stream':
+        processed_path = processing_service.create_vertical_clip_from_stream(
+            video.youtube_url,
+            clip.start_time,
+            clip.end_time,
+            processed_filename,
+            progress_callback=encode_progress,
+            profile=clip.encoding_profile
+        )
+    else:
+        processed_path = processing_service.create_vertical_clip(
+            clip.original_clip_path,
+            processed_filename,
+            start_offset=clip.start_time - clip.original_start_time,
+            duration=duration,
+            progress_callback=encode_progress,
+            profile=clip.encoding_profile
+        )
+
+    save_claimed(clip, 'completed', processed_clip_path=processed_path, progress_percentage=100)
+    report_progress(clip)
+
+
+def process_renditions(clip, video):
+    """Render every pending rendition of the clip with one ffmpeg process
+
+    Reads from the cached source when the source cache is on, else from the
+    clip's downloaded window when it still covers the clip, else from YouTube.
+    """
+    processing_service = VideoProcessingService()
+
+    # Claim each pending rendition so a duplicate job can't render it too
+    renditions = [
+        rendition for rendition in clip.renditions.filter(status='pending')
+        if ClipRendition.objects.filter(id=rendition.id, status='pending').update(
+            status='processing',
+            progress_percentage=0
+        )
+    ]
+    if not renditions:
+        return
+
+    ids = [rendition.id for rendition in renditions]
+
+    def update(fraction):
+        ClipRendition.objects.filter(id__in=ids).update(progress_percentage=int(100 * fraction))
+
+    progress = ProgressThrottle(update, interval=settings.PROGRESS_SAVE_INTERVAL_SECONDS)
+    outputs = {rendition.name: f"clip_{clip.id}_{rendition.name}.mp4" for rendition in renditions}
+    duration = clip.end_time - clip.start_time
+
+    print(f"=== Rendering {', '.join(outputs)} for clip {clip.id} ===")
+
+    if settings.SOURCE_CACHE_MAX_BYTES > 0:
+        source_path = SourceMediaCache().fetch(video.youtube_url, video.youtube_id)
+        paths = processing_service.create_renditions(
+            source_path, outputs, start_offset=clip.start_time, duration=duration, progress_callback=progress
+        )
+    elif clip.original_covers(clip.start_time, clip.end_time) and os.path.exists(clip.original_clip_path):
+        paths = processing_service.create_renditions(
+            clip.original_clip_path,
+            outputs,
+            start_offset=clip.start_time - clip.original_start_time,
+            duration=duration,
+            progress_callback=progress
+        )
+    else:
+        paths = processing_service.create_renditions_from_stream(
+            video.youtube_url, clip.start_time, clip.end_time, outputs, progress_callback=progress
+        )
+
+    for rendition in renditions:
+        rendition.file_path = paths[rendition.name]
+        rendition.file_size = os.path.getsize(rendition.file_path)
+        rendition.status = 'completed'
+        rendition.progress_percentage = 100
+        rendition.error_message = ''
+        rendition.save(update_fields=[
+            'file_path', 'file_size', 'status', 'progress_percentage', 'error_message', 'updated_at'
+        ])
+
+
+@shared_task(queue='render')
+def render_clip(clip_id):
+    """Render a pending clip in a worker"""
+    # Single-flight: only the job that moves the clip out of 'pending' renders it
+    claimed = Clip.objects.filter(id=clip_id, status='pending').update(
+        progress_percentage=10,
+        **Clip.stage_fields('downloading')
+    )
+    if not claimed:
+        # Deleted while waiting in the queue, or already taken by another job
+        print(f"Clip {clip_id} is not pending, skipping render job")
+        return
+
+    clip = Clip.objects.select_related('video').get(id=clip_id)
+
+    try:
+        process_clip(clip, clip.video)
+    except Exception as e:
+        # A late job whose clip was requeued leaves the newer run alone
+        if clip.transition_claimed('failed', error_message=str(e)):
+            report_progress(clip)
+        else:
+            print(f"Clip {clip_id} was queued again, dropping this job's result: {str(e)}")
+
+    schedule_storage_collection()
+
+
+@shared_task(queue='render')
+def render_renditions(clip_id):
+    """Render a clip's pending renditions in a worker"""
+    clip = Clip.objects.select_related('video').filter(id=clip_id).first()
+    if clip is None:
+        return
+
+    try:
+        process_renditions(clip, clip.video)
+    except Exception as e:
+        clip.renditions.filter(status='processing').update(status='failed', error_message=str(e))
+
+
+@shared_task(queue='render')
+def render_clip_batch(video_id, clip_ids):
+    """Render several clips of one video, downloading its source only once
+
+    With the 'source' pipeline the full video is fetched here first, with
+    progress reported on every clip; the render_clip jobs queued afterwards
+    then run in parallel against the cached file, and if that download fails
+    the pending clips fail with it. Other pipelines read their own segments,
+    so the clips are queued straight away.
+    """
+    clips = list(Clip.objects.select_related('video').filter(id__in=clip_ids, video_id=video_id))
+    if not clips:
+        return
+
+    if get_pipeline() == 'source':
+        video = clips[0].video
+        # Only progress changes; the clips stay 'pending' until render_clip claims them
+        pending = Clip.objects.filter(id__in=[clip.id for clip in clips], status='pending')
+
+        def update(fraction):
+            percentage = int(10 + 30 * fraction)
+            pending.update(progress_percentage=percentage)
+            for clip in clips:
+                clip.progress_percentage = percentage
+                report_progress(clip, 'downloading')
+
+        try:
+            SourceMediaCache().fetch(
+                video.youtube_url,
+                video.youtube_id,
+                progress_callback=ProgressThrottle(update, interval=settings.PROGRESS_SAVE_INTERVAL_SECONDS)
+            )
+        except Exception as e:
+            # Every clip needs this file: fail the batch instead of queueing
+            # renders that would each retry the same failing download
+            print(f"❌ Shared source download failed for video {video_id}: {str(e)}")
+            pending.update(error_message=f"Source download failed: {str(e)}", **Clip.stage_fields('failed'))
+            for clip in Clip.objects.filter(id__in=[clip.id for clip in clips]):
+                report_progress(clip)
+            return
+
+    for clip in clips:
+        enqueue(render_clip, clip.id)
+
+
+def schedule_storage_collection():
+    """Queue collect_clip_storage at most once per CLIP_STORAGE_GC_INTERVAL_SECONDS
+
+    Celery beat runs it on a schedule; the in-process thread backend has no
+    scheduler, so finished renders trigger it instead.
+    """
+    global _last_storage_collection
+    if settings.JOBS_BACKEND != 'thread':
+        return
+
+    with _storage_collection_lock:
+        now = time.monotonic()
+        if _last_storage_collection and now - _last_storage_collection < settings.CLIP_STORAGE_GC_INTERVAL_SECONDS:
+            return
+        _last_storage_collection = now
+
+    enqueue(collect_clip_storage)
+
+
+@shared_task(queue='render')
+def collect_clip_storage():
+    """Remove orphaned clip files and evict old ones past CLIP_STORAGE_MAX_BYTES"""
+    report = ClipStorageManager().collect()
+    print(
+        f"📊 Clip storage: {report['total_bytes'] // (1024 * 1024)} MB used, "
+        f"{report['freed_bytes'] // (1024 * 1024)} MB freed"
+    )
+    return report
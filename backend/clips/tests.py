@@ -1,3 +1,1074 @@
-from django.test import TestCase
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from snapcast_backend import events
+from videos.models import Video
+from .models import Clip, ClipRendition
+from .progress import (
+    STDERR_TAIL_LINES,
+    FFmpegProgressParser,
+    ProcessResult,
+    ProgressThrottle,
+    YtDlpProgressParser,
+    run_process,
+)
+from .reframe import SubjectTrack, crop_filter, detect_motion_center, smooth_centers
+from .services import SourceMediaCache, VideoProcessingService
+from .storage import ClipStorageManager
+from .tasks import get_pipeline, prepare_window, render_clip, render_clip_batch
+
+
+# Queries allowed per request, independent of the number of rows returned
+QUERY_BUDGET = {
+    'clip-list': 1,
+    'clip-list-expanded': 1,
+    'clip-detail': 1,
+}
+
+
+class ClipQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            video = Video.objects.create(
+                youtube_url=f'https://youtube.com/watch?v=v{i}',
+                youtube_id=f'v{i}',
+                status='completed',
+            )
+            video.set_transcript([{'text': 'word', 'start': s, 'duration': 1} for s in range(100)])
+            for j in range(5):
+                Clip.objects.create(
+                    video=video,
+                    moment_index=j,
+                    title=f'Clip {j}',
+                    start_time=j * 30,
+                    end_time=j * 30 + 20,
+                    duration=20,
+                    viral_score=j,
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_budget(self):
+        with self.assertNumQueries(QUERY_BUDGET['clip-list']):
+            response = self.client.get('/api/clips/')
+        self.assertEqual(len(response.data['results']), 15)
+        self.assertNotIn('video', response.data['results'][0])
+
+    def test_expanded_list_budget(self):
+        with self.assertNumQueries(QUERY_BUDGET['clip-list-expanded']):
+            response = self.client.get('/api/clips/?expand=video')
+        self.assertEqual(response.data['results'][0]['video']['status'], 'completed')
+
+    def test_detail_budget(self):
+        clip = Clip.objects.first()
+        with self.assertNumQueries(QUERY_BUDGET['clip-detail']):
+            response = self.client.get(f'/api/clips/{clip.id}/')
+        self.assertEqual(response.data['video']['id'], clip.video_id)
+
+    def test_list_filters_by_video_and_paginates(self):
+        video = Video.objects.first()
+        response = self.client.get(f'/api/clips/?video={video.id}&page_size=2')
+
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertTrue(all(c['video_id'] == video.id for c in response.data['results']))
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class ClipPaginationTests(TestCase):
+
+    def test_page_boundaries_inside_score_ties(self):
+        video = Video.objects.create(youtube_url='https://youtube.com/watch?v=tie', youtube_id='tie')
+        for i in range(9):
+            Clip.objects.create(
+                video=video, title=f'Clip {i}', start_time=i * 30, end_time=i * 30 + 20, duration=20,
+                viral_score=[90, 50, 50, 50, 50, 50, 50, 10, 10][i],
+            )
+        # Same timestamp too, so only the id tells the tied clips apart
+        Clip.objects.filter(viral_score=50).update(created_at=Clip.objects.first().created_at)
+
+        client = APIClient()
+        seen = []
+        url = '/api/clips/?page_size=2'
+        while url:
+            response = client.get(url)
+            seen += [clip['id'] for clip in response.data['results']]
+            url = response.data['next']
+
+        expected = list(Clip.objects.order_by('-viral_score', '-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+
+class ClipStreamTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.path = Path(self.media_root) / 'clips' / 'clip_final.mp4'
+        self.path.parent.mkdir()
+        self.path.write_bytes(bytes(range(256)) * 4)
+
+        video = Video.objects.create(youtube_url='https://youtube.com/watch?v=x', youtube_id='x')
+        self.clip = Clip.objects.create(
+            video=video, title='Clip', start_time=0, end_time=20, duration=20,
+            status='completed', processed_clip_path=str(self.path),
+        )
+        self.url = f'/api/clips/{self.clip.id}/stream/'
+        self.client = APIClient()
+
+    def test_full_response_advertises_ranges_and_validators(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(len(b''.join(response.streaming_content)), 1024)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_single_range_returns_206(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+
+    def test_open_ended_and_suffix_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(response['Content-Range'], 'bytes 1020-1023/1024')
+
+    def test_unsatisfiable_range_returns_416(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-6000')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_disjoint_ranges_fall_back_to_full_body(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9,100-109')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9,10-19')
+        self.assertEqual(response['Content-Range'], 'bytes 0-19/1024')
+
+    def test_conditional_get_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_stale_if_range_ignores_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_accel_redirect_offload(self):
+        with override_settings(
+            MEDIA_ROOT=self.media_root,
+            MEDIA_OFFLOAD='x-accel-redirect',
+            MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/',
+        ):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/clips/clip_final.mp4')
+        self.assertEqual(response.content, b'')
+
+
+class EncodingProfileTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def encode(self, profile, dimensions=None):
+        """Return the ffmpeg command create_vertical_clip would run"""
+        commands = []
+
+        def fake_run(cmd, timeout, on_stdout_line=None):
+            if cmd[0] == 'ffprobe':
+                if dimensions:
+                    on_stdout_line(dimensions)
+                return ProcessResult(0 if dimensions else 1, [], False)
+            commands.append(cmd)
+            return ProcessResult(0, [], False)
+
+        with override_settings(MEDIA_ROOT=self.media_root), \
+                mock.patch('clips.services.run_process', side_effect=fake_run):
+            VideoProcessingService().create_vertical_clip(
+                'in.mp4', 'out.mp4', start_offset=5, duration=10, profile=profile
+            )
+        return commands[0]
+
+    def test_preview_is_small_and_fast(self):
+        cmd = self.encode('preview')
+        self.assertIn('scale=540:960:force_original_aspect_ratio=increase,crop=540:960', cmd)
+        self.assertEqual(cmd[cmd.index('-preset') + 1], 'veryfast')
+
+    def test_final_keeps_publishing_quality(self):
+        cmd = self.encode('final')
+        self.assertIn('scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920', cmd)
+        self.assertEqual(cmd[cmd.index('-preset') + 1], 'medium')
+
+    @override_settings(FFMPEG_THREADS=3)
+    def test_encoder_threads_are_capped(self):
+        cmd = self.encode('final')
+        self.assertEqual(cmd[cmd.index('-threads') + 1], '3')
+
+    def test_stream_copy_only_for_vertical_sources(self):
+        cmd = self.encode('stream-copy', dimensions='1080x1920')
+        self.assertEqual(cmd[cmd.index('-c') + 1], 'copy')
+        self.assertNotIn('-vf', cmd)
+
+        cmd = self.encode('stream-copy', dimensions='1920x1080')
+        self.assertEqual(cmd[cmd.index('-preset') + 1], 'medium')
+
+    def test_profile_is_selectable_per_request(self):
+        video = Video.objects.create(
+            youtube_url='https://youtube.com/watch?v=p', youtube_id='p', status='completed',
+            viral_moments=[{'start_time': 10, 'end_time': 40, 'viral_score': 9, 'title': 'M'}],
+        )
+        client = APIClient()
+
+        with mock.patch('clips.views.enqueue') as enqueue:
+            response = client.post('/api/clips/', {'video_id': video.id, 'moment_index': 0, 'profile': 'preview'}, format='json')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data['encoding_profile'], 'preview')
+
+            # One render per clip at a time
+            response = client.post('/api/clips/', {'video_id': video.id, 'moment_index': 0, 'profile': 'final'}, format='json')
+            self.assertEqual(response.status_code, 409)
+
+            # Once it finished, asking for another profile re-renders the same clip
+            Clip.objects.update(status='completed')
+            response = client.post('/api/clips/', {'video_id': video.id, 'moment_index': 0, 'profile': 'final'}, format='json')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(Clip.objects.get().encoding_profile, 'final')
+            self.assertEqual(enqueue.call_count, 2)
+
+            response = client.post('/api/clips/', {'video_id': video.id, 'moment_index': 0}, format='json')
+            self.assertEqual(response.status_code, 200)
+
+
+class ClipRenditionTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def test_single_ffmpeg_process_splits_decoded_video(self):
+        commands = []
+
+        def fake_run(cmd, timeout, on_stdout_line=None):
+            if cmd[0] == 'ffprobe':
+                # Unknown size: centre crop
+                return ProcessResult(1, [], False)
+            commands.append(cmd)
+            return ProcessResult(0, [], False)
+
+        with override_settings(MEDIA_ROOT=self.media_root), \
+                mock.patch('clips.services.run_process', side_effect=fake_run):
+            paths = VideoProcessingService().create_renditions(
+                'in.mp4',
+                {'vertical': 'v.mp4', 'square': 's.mp4', 'preview': 'p.mp4'},
+                start_offset=5,
+                duration=10
+            )
+
+        self.assertEqual(len(commands), 1)
+        cmd = commands[0]
+        self.assertEqual(cmd.count('-i'), 1)
+        graph = cmd[cmd.index('-filter_complex') + 1]
+        self.assertTrue(graph.startswith('[0:v]split=3[s0][s1][s2];'))
+        self.assertIn('crop=1080:1080[v1]', graph)
+        self.assertIn('crop=540:960[v2]', graph)
+        self.assertEqual(set(paths), {'vertical', 'square', 'preview'})
+        self.assertEqual(cmd[-1], paths['preview'])
+
+    @override_settings(JOBS_BACKEND='eager', SOURCE_CACHE_MAX_BYTES=0)
+    def test_requested_renditions_are_tracked_per_clip(self):
+        video = Video.objects.create(youtube_url='https://youtube.com/watch?v=r', youtube_id='r')
+        clip = Clip.objects.create(video=video, title='Clip', start_time=0, end_time=20, duration=20)
+
+        def fake_renditions(url, start, end, outputs, progress_callback=None):
+            paths = {}
+            for name, filename in outputs.items():
+                path = Path(self.media_root) / filename
+                path.write_bytes(b'x' * 10)
+                paths[name] = str(path)
+            return paths
+
+        client = APIClient()
+        with mock.patch('clips.tasks.VideoProcessingService') as service, \
+                self.captureOnCommitCallbacks(execute=True):
+            service.return_value.create_renditions_from_stream.side_effect = fake_renditions
+            response = client.post(
+                f'/api/clips/{clip.id}/renditions/',
+                {'renditions': ['square', 'preview']},
+                format='json'
+            )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(service.return_value.create_renditions_from_stream.call_count, 1)
+        renditions = {r.name: r for r in ClipRendition.objects.filter(clip=clip)}
+        self.assertEqual(set(renditions), {'square', 'preview'})
+        self.assertEqual(renditions['square'].status, 'completed')
+        self.assertEqual((renditions['square'].width, renditions['square'].height), (1080, 1080))
+        self.assertEqual(renditions['preview'].file_size, 10)
+
+        response = client.get(f'/api/clips/{clip.id}/renditions/preview/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'x' * 10)
+
+    def test_in_flight_renditions_are_not_queued_again(self):
+        video = Video.objects.create(youtube_url='https://youtube.com/watch?v=q', youtube_id='q')
+        clip = Clip.objects.create(video=video, title='Clip', start_time=0, end_time=20, duration=20)
+        ClipRendition.objects.create(clip=clip, name='square', width=1080, height=1080,
+                                     status='processing', progress_percentage=40)
+        ClipRendition.objects.create(clip=clip, name='preview', width=540, height=960,
+                                     status='failed', error_message='boom')
+
+        client = APIClient()
+        with mock.patch('clips.views.enqueue') as enqueue:
+            response = client.post(f'/api/clips/{clip.id}/renditions/', {'renditions': ['square']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        enqueue.assert_not_called()
+        square = clip.renditions.get(name='square')
+        self.assertEqual((square.status, square.progress_percentage), ('processing', 40))
+
+        with mock.patch('clips.views.enqueue') as enqueue:
+            response = client.post(
+                f'/api/clips/{clip.id}/renditions/', {'renditions': ['square', 'preview']}, format='json'
+            )
+        self.assertEqual(response.status_code, 202)
+        enqueue.assert_called_once()
+        preview = clip.renditions.get(name='preview')
+        self.assertEqual((preview.status, preview.error_message), ('pending', ''))
+        self.assertEqual(clip.renditions.get(name='square').status, 'processing')
+
+
+class SmartReframeTests(TestCase):
+
+    def test_smoothing_fills_gaps_and_drops_outliers(self):
+        centers = [None, 0.3, 0.3, 0.9, 0.3, 0.3, None, 0.3]
+        smoothed = smooth_centers(centers)
+
+        self.assertEqual(len(smoothed), len(centers))
+        self.assertTrue(all(abs(center - 0.3) < 1e-9 for center in smoothed))
+        self.assertIsNone(smooth_centers([None, None]))
+
+    def test_motion_center_follows_the_moving_side(self):
+        import numpy as np
+
+        previous = np.zeros((90, 160), dtype=np.uint8)
+        frame = previous.copy()
+        frame[:, 120:140] = 255
+
+        self.assertAlmostEqual(detect_motion_center(frame, previous), 130 / 160, places=2)
+        self.assertIsNone(detect_motion_center(previous, previous))
+
+    def test_crop_window_follows_track_and_stays_in_frame(self):
+        track = SubjectTrack([0, 0.5, 1.0], [0.2, 0.5, 1.0], (1920, 1080))
+        # 1080 * 9 / 16 = 607.5, rounded down to even
+        self.assertEqual(track.crop_x_at(0, 606), 81)
+        self.assertEqual(track.crop_x_at(0.5, 606), 657)
+        self.assertEqual(track.crop_x_at(1.0, 606), 1920 - 606)
+
+        script_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, script_dir)
+        video_filter = crop_filter(1080, 1920, track, script_dir)
+
+        self.assertIn('crop@r0=w=606:h=1080:x=81:y=0,scale=1080:1920', video_filter)
+        script = (Path(script_dir) / 'r0.cmd').read_text().splitlines()
+        self.assertEqual(script[0], '0.000 crop@r0 x 81;')
+        # Unchanged positions are not repeated
+        self.assertTrue(script[-1].endswith(f'crop@r0 x {1920 - 606};'))
+        self.assertEqual(len(script), len(set(line.split()[-1] for line in script)))
+
+    def test_centre_crop_without_track_or_for_narrow_sources(self):
+        center = 'scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920'
+        self.assertEqual(crop_filter(1080, 1920), center)
+
+        narrow = SubjectTrack([0, 1], [0.5, 0.5], (1080, 1920))
+        self.assertEqual(crop_filter(1080, 1920, narrow, tempfile.gettempdir()), center)
+
+
+class ClipStorageTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.clips_dir = Path(self.media_root) / 'clips'
+        self.clips_dir.mkdir()
+        self.video = Video.objects.create(youtube_url='https://youtube.com/watch?v=s', youtube_id='s')
+
+    def make_file(self, name, size, age):
+        path = self.clips_dir / name
+        path.write_bytes(b'x' * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return str(path)
+
+    def make_clip(self, index, age, published=False, status='completed'):
+        return Clip.objects.create(
+            video=self.video, title=f'Clip {index}', start_time=index * 30, end_time=index * 30 + 20,
+            duration=20, status=status, is_published_youtube=published,
+            original_clip_path=self.make_file(f'clip_{index}_original.mp4', 100, age),
+            processed_clip_path=self.make_file(f'clip_{index}_final.mp4', 100, age),
+        )
+
+    def collect(self, max_bytes, **kwargs):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            return ClipStorageManager(max_bytes=max_bytes).collect(**kwargs)
+
+    def test_old_orphans_are_removed_regardless_of_budget(self):
+        old = self.make_file('clip_99_final.mp4', 100, age=2 * 3600)
+        fresh = self.make_file('clip_100_final.mp4', 100, age=10)
+
+        report = self.collect(max_bytes=10 ** 9)
+
+        self.assertEqual(report['orphans'], 1)
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(fresh))
+
+    def test_originals_go_before_finals_least_recently_used_first(self):
+        older = self.make_clip(1, age=300)
+        newer = self.make_clip(2, age=200)
+
+        # 400 bytes on disk; freeing two originals is enough
+        report = self.collect(max_bytes=250)
+
+        self.assertEqual((report['originals'], report['finals']), (2, 0))
+        older.refresh_from_db()
+        self.assertEqual(older.original_clip_path, '')
+        self.assertEqual(older.status, 'completed')
+
+        # Then the least recently used unpublished final
+        report = self.collect(max_bytes=150)
+        self.assertEqual(report['finals'], 1)
+        older.refresh_from_db()
+        newer.refresh_from_db()
+        self.assertEqual(older.status, 'evicted')
+        self.assertEqual(newer.status, 'completed')
+
+    def test_published_and_rendering_clips_are_kept(self):
+        published = self.make_clip(1, age=300, published=True)
+        rendering = self.make_clip(2, age=300, status='processing')
+
+        report = self.collect(max_bytes=0)
+
+        self.assertEqual(report['originals'], 1)
+        self.assertEqual(report['finals'], 0)
+        published.refresh_from_db()
+        rendering.refresh_from_db()
+        self.assertEqual(published.original_clip_path, '')
+        self.assertTrue(os.path.exists(published.processed_clip_path))
+        self.assertTrue(os.path.exists(rendering.original_clip_path))
+
+    def test_rendition_being_rendered_again_is_kept(self):
+        clip = self.make_clip(1, age=300, published=False)
+        rendering = ClipRendition.objects.create(
+            clip=clip, name='square', width=1080, height=1080, status='processing',
+            file_path=self.make_file('clip_1_square.mp4', 100, age=300)
+        )
+        done = ClipRendition.objects.create(
+            clip=clip, name='preview', width=540, height=960, status='completed',
+            file_path=self.make_file('clip_1_preview.mp4', 100, age=400)
+        )
+
+        report = self.collect(max_bytes=0)
+
+        self.assertEqual(report['renditions'], 1)
+        self.assertTrue(os.path.exists(rendering.file_path))
+        self.assertTrue(ClipRendition.objects.filter(id=rendering.id).exists())
+        self.assertFalse(os.path.exists(done.file_path))
+        self.assertFalse(ClipRendition.objects.filter(id=done.id).exists())
+
+    def test_file_is_kept_when_the_row_changed_after_the_scan(self):
+        clip = self.make_clip(1, age=300)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            manager = ClipStorageManager(max_bytes=0)
+            entries = manager.scan()
+            manager.attach_references(entries)
+        final = entries[os.path.normpath(clip.processed_clip_path)]
+        self.assertTrue(final.evictable)
+
+        # A re-render claims the clip and will write the same deterministic path
+        Clip.objects.filter(pk=clip.pk).update(**Clip.stage_fields('processing'))
+        report = {'finals': 0, 'freed_bytes': 0, 'total_bytes': 200}
+        manager._remove(final, 'finals', report, dry_run=False)
+
+        self.assertEqual(report['finals'], 0)
+        self.assertTrue(os.path.exists(clip.processed_clip_path))
+        clip.refresh_from_db()
+        self.assertEqual((clip.status, clip.processed_clip_path), ('processing', final.reference))
+
+    def test_dry_run_removes_nothing(self):
+        clip = self.make_clip(1, age=300)
+
+        report = self.collect(max_bytes=0, dry_run=True)
+
+        self.assertEqual(report['freed_bytes'], 200)
+        self.assertTrue(os.path.exists(clip.original_clip_path))
+        self.assertTrue(os.path.exists(clip.processed_clip_path))
+
+
+class SourceMediaCacheTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.sources_dir = Path(self.media_root) / 'sources'
+        patcher = override_settings(MEDIA_ROOT=self.media_root, SOURCE_CACHE_MAX_BYTES=250)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def make_source(self, youtube_id, size, age):
+        self.sources_dir.mkdir(exist_ok=True)
+        path = self.sources_dir / f'{youtube_id}.mp4'
+        path.write_bytes(b'x' * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        (self.sources_dir / f'{youtube_id}.lock').touch()
+        return path
+
+    def test_concurrent_fetches_download_once(self):
+        downloads = []
+
+        def fake_download(cmd, timeout, on_stdout_line=None):
+            downloads.append(cmd)
+            time.sleep(0.05)
+            Path(cmd[cmd.index('-o') + 1]).write_bytes(b'x' * 10)
+            return ProcessResult(0, [], False)
+
+        results = []
+        with mock.patch('clips.services.run_process', side_effect=fake_download):
+            threads = [
+                threading.Thread(target=lambda: results.append(SourceMediaCache().fetch('url', 'abc')))
+                for _ in range(3)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(downloads), 1)
+        self.assertEqual(set(results), {str(self.sources_dir / 'abc.mp4')})
+        self.assertFalse((self.sources_dir / 'abc.part.mp4').exists())
+
+    def test_least_recently_used_go_first_but_not_within_grace(self):
+        oldest = self.make_source('old', 100, age=3000)
+        older = self.make_source('older', 100, age=2000)
+        recent = self.make_source('recent', 100, age=10)
+
+        SourceMediaCache().evict()
+
+        # Removing the oldest fits the budget; the recent one is in use anyway
+        self.assertFalse(oldest.exists())
+        self.assertFalse((self.sources_dir / 'old.lock').exists())
+        self.assertTrue(older.exists())
+        self.assertTrue(recent.exists())
+
+        with override_settings(SOURCE_CACHE_MAX_BYTES=0):
+            SourceMediaCache().evict()
+        self.assertFalse(older.exists())
+        self.assertTrue(recent.exists())
+        self.assertTrue((self.sources_dir / 'recent.lock').exists())
+
+    def test_locked_source_is_not_evicted(self):
+        source = self.make_source('busy', 300, age=3000)
+        cache = SourceMediaCache()
+
+        with cache._lock('busy'):
+            cache.evict()
+            self.assertTrue(source.exists())
+
+        cache.evict()
+        self.assertFalse(source.exists())
+
+    def test_failed_download_leaves_no_files_behind(self):
+        with mock.patch('clips.services.run_process', return_value=ProcessResult(1, ['denied'], False)):
+            with self.assertRaises(Exception):
+                SourceMediaCache().fetch('url', 'gone')
+
+        SourceMediaCache().evict()
+        self.assertEqual(list(self.sources_dir.iterdir()), [])
+
+
+class ClipWindowTests(TestCase):
+
+    def setUp(self):
+        self.video = Video.objects.create(youtube_url='https://youtube.com/watch?v=w', youtube_id='w')
+        self.clip = Clip.objects.create(video=self.video, title='Clip', start_time=100, end_time=130, duration=30)
+
+    def test_original_covers(self):
+        self.assertFalse(self.clip.original_covers(100, 130))
+
+        self.clip.original_clip_path = '/tmp/clip_original.mp4'
+        self.clip.original_start_time = 85
+        self.clip.original_end_time = 145
+        self.assertTrue(self.clip.original_covers(100, 130))
+        self.assertTrue(self.clip.original_covers(85, 145))
+        self.assertFalse(self.clip.original_covers(80, 130))
+        self.assertFalse(self.clip.original_covers(100, 150))
+
+        self.clip.original_clip_path = ''
+        self.assertFalse(self.clip.original_covers(100, 130))
+
+    def prepare(self, duration):
+        self.video.duration = duration
+        service = mock.Mock()
+        service.download_clip_segment.return_value = '/tmp/clip_original.mp4'
+        with override_settings(SOURCE_CACHE_MAX_BYTES=0, CLIP_WINDOW_PADDING_SECONDS=15):
+            prepare_window(self.clip, self.video, service)
+        return service.download_clip_segment.call_args[0][1:3]
+
+    def test_window_is_padded_and_clamped_to_the_video(self):
+        self.assertEqual(self.prepare(3600), (85, 145))
+        self.assertEqual(self.prepare(135), (85, 135))
+        self.assertEqual((self.clip.original_start_time, self.clip.original_end_time), (85, 135))
+
+    def test_window_end_is_not_padded_when_duration_is_unknown(self):
+        self.assertEqual(self.prepare(None), (85, 130))
+        self.assertFalse(self.clip.original_covers(100, 140))
+
+
+class FakeProcess:
+    """Popen stand-in that yields canned lines, or blocks until killed"""
+
+    def __init__(self, stdout=(), stderr=(), block=False):
+        self.killed = threading.Event()
+        self.returncode = None
+        self.stdout = self.lines(stdout, block)
+        self.stderr = iter(f'{line}\n' for line in stderr)
+
+    def lines(self, stdout, block):
+        for line in stdout:
+            yield f'{line}\n'
+        if block:
+            self.killed.wait(timeout=5)
+
+    def kill(self):
+        self.killed.set()
+        self.returncode = -9
+
+    def wait(self):
+        if self.returncode is None:
+            self.returncode = 0
+        return self.returncode
+
+    def poll(self):
+        return self.returncode
+
+
+class ProgressParserTests(TestCase):
+
+    def test_ffmpeg_progress(self):
+        seen = []
+        parser = FFmpegProgressParser(10, seen.append)
+        for line in ['frame=10', 'out_time_us=2500000', 'out_time_us=N/A', 'out_time_us=12000000', 'progress=end']:
+            parser(line)
+        self.assertEqual(seen, [0.25, 1.0, 1.0])
+
+    def test_ffmpeg_progress_without_duration_only_reports_the_end(self):
+        seen = []
+        parser = FFmpegProgressParser(None, seen.append)
+        parser('out_time_us=2500000')
+        parser('progress=end')
+        self.assertEqual(seen, [1.0])
+
+    def test_ytdlp_progress_falls_back_to_the_estimate(self):
+        seen = []
+        parser = YtDlpProgressParser(seen.append)
+        for line in ['[download] Destination: x.mp4', 'snapcast-progress 50 200 NA',
+                     'snapcast-progress 100 NA 400', 'snapcast-progress NA NA NA']:
+            parser(line)
+        self.assertEqual(seen, [0.25, 0.25])
+
+    def test_ytdlp_progress_never_goes_backwards_between_files(self):
+        seen = []
+        parser = YtDlpProgressParser(seen.append)
+        # bestvideo+bestaudio: the audio file starts again from zero
+        for line in ['snapcast-progress 50 100 NA', 'snapcast-progress 90 100 NA',
+                     'snapcast-progress 5 10 NA', 'snapcast-progress 10 10 NA']:
+            parser(line)
+        self.assertEqual(seen, [0.5, 0.9, 0.9, 1.0])
+
+    def test_throttle_forwards_once_per_interval_and_always_the_end(self):
+        seen = []
+        throttle = ProgressThrottle(seen.append, interval=60)
+        for fraction in [0.1, 0.2, 0.3, 1.0, 1.0]:
+            throttle(fraction)
+        self.assertEqual(seen, [0.1, 1.0])
+
+
+class RunProcessTests(TestCase):
+
+    def run_fake(self, process, timeout=5):
+        lines = []
+        with mock.patch('clips.progress.subprocess.Popen', return_value=process):
+            result = run_process(['ffmpeg'], timeout=timeout, on_stdout_line=lines.append)
+        return result, lines
+
+    def test_stdout_lines_are_streamed(self):
+        result, lines = self.run_fake(FakeProcess(stdout=['progress=continue ', 'progress=end']))
+        self.assertEqual(lines, ['progress=continue', 'progress=end'])
+        self.assertEqual(result.returncode, 0)
+        self.assertFalse(result.timed_out)
+
+    def test_only_the_stderr_tail_is_kept(self):
+        stderr = [f'line {i}' for i in range(STDERR_TAIL_LINES + 20)]
+        result, _ = self.run_fake(FakeProcess(stderr=stderr))
+        self.assertEqual(result.stderr_tail, stderr[-STDERR_TAIL_LINES:])
+        self.assertEqual(result.stderr.splitlines()[-1], stderr[-1])
+
+    def test_watchdog_kills_a_stuck_process(self):
+        process = FakeProcess(stdout=['progress=continue'], block=True)
+        started = time.monotonic()
+        result, lines = self.run_fake(process, timeout=0.1)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(process.killed.is_set())
+        self.assertTrue(result.timed_out)
+        self.assertEqual(result.returncode, -9)
+        self.assertEqual(lines, ['progress=continue'])
+
+
+class ProgressEventStreamTests(TestCase):
+
+    def setUp(self):
+        self.channel = f'test:{self.id()}'
+        self.final = lambda data: data['status'] in Clip.FINAL_STATUSES
+
+    def test_snapshot_first_then_events_until_final(self):
+        stream = events.sse_stream(self.channel, lambda: {'status': 'pending'}, self.final)
+
+        self.assertEqual(next(stream), 'retry: 3000\n\n')
+        # Subscribed before the snapshot, so this event is not lost
+        events.publish(self.channel, {'status': 'processing', 'progress_percentage': 50})
+        self.assertEqual(next(stream), events.format_sse({'status': 'pending'}))
+        self.assertIn('"progress_percentage": 50', next(stream))
+
+        events.publish(self.channel, {'status': 'completed'})
+        self.assertEqual(next(stream), events.format_sse({'status': 'completed'}))
+        self.assertEqual(list(stream), [])
+
+    def test_final_snapshot_closes_immediately(self):
+        frames = list(events.sse_stream(self.channel, lambda: {'status': 'failed'}, self.final))
+        self.assertEqual(frames, ['retry: 3000\n\n', events.format_sse({'status': 'failed'})])
+
+    def test_quiet_stream_rereads_the_snapshot(self):
+        # Events published in another process never arrive here
+        snapshots = iter([{'status': 'processing'}, {'status': 'processing'}, {'status': 'completed'}])
+
+        with mock.patch.object(events, 'HEARTBEAT_SECONDS', 0.01):
+            frames = list(events.sse_stream(self.channel, lambda: next(snapshots), self.final))
+
+        self.assertEqual(frames[2:], [': heartbeat\n\n', events.format_sse({'status': 'completed'})])
+
+    def test_wsgi_stream_gives_the_worker_back(self):
+        with mock.patch.object(events, 'HEARTBEAT_SECONDS', 0.01):
+            frames = list(events.sse_stream(self.channel, lambda: {'status': 'pending'}, self.final, max_seconds=0.05))
+        self.assertTrue(frames[-1].startswith(': heartbeat'))
+
+    def test_async_stream(self):
+        async def collect():
+            stream = events.async_sse_stream(self.channel, lambda: {'status': 'pending'}, self.final)
+            frames = [await stream.__anext__(), await stream.__anext__()]
+            events.publish(self.channel, {'status': 'completed'})
+            frames += [frame async for frame in stream]
+            return frames
+
+        with mock.patch.object(events, 'ASYNC_POLL_SECONDS', 0.01):
+            frames = asyncio.run(collect())
+
+        self.assertEqual(frames[1:], [
+            events.format_sse({'status': 'pending'}),
+            events.format_sse({'status': 'completed'}),
+        ])
+
+    def test_response_is_async_under_asgi(self):
+        snapshot = lambda: {'status': 'completed'}
+        asgi_request = ASGIRequest({'type': 'http', 'method': 'GET', 'path': '/', 'headers': []}, BytesIO())
+
+        self.assertTrue(events.sse_response(asgi_request, self.channel, snapshot, self.final).is_async)
+        self.assertFalse(events.sse_response(RequestFactory().get('/'), self.channel, snapshot, self.final).is_async)
+
+    def test_clip_events_endpoint(self):
+        video = Video.objects.create(youtube_url='https://youtube.com/watch?v=e', youtube_id='e')
+        clip = Clip.objects.create(video=video, title='C', start_time=0, end_time=20, duration=20, status='completed')
+
+        response = APIClient().get(f'/api/clips/{clip.id}/events/', HTTP_ACCEPT='text/event-stream')
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('"status": "completed"', body)
+
+    @override_settings(JOBS_BACKEND='celery', PROGRESS_EVENTS_BACKEND='memory')
+    def test_memory_bus_is_refused_with_celery(self):
+        self.assertEqual([e.id for e in events.check_event_bus(None)], ['snapcast.E001'])
+
+    @override_settings(JOBS_BACKEND='thread', PROGRESS_EVENTS_BACKEND='memory')
+    def test_memory_bus_warns_with_several_web_processes(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            self.assertEqual([e.id for e in events.check_event_bus(None)], ['snapcast.W001'])
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '1'}):
+            self.assertEqual(events.check_event_bus(None), [])
+
+
+class ClipTransitionTests(TestCase):
+
+    def setUp(self):
+        self.video = Video.objects.create(youtube_url='https://youtube.com/watch?v=t', youtube_id='t')
+        self.clip = Clip.from_moment(self.video, 0, {
+            'start_time': 10, 'end_time': 40, 'title': 'T', 'reason': 'long text ' * 500,
+        })
+        self.clip.save()
+
+    def clip_updates(self, queries):
+        return [query['sql'] for query in queries if query['sql'].startswith('UPDATE "clips_clip"')]
+
+    def test_transition_writes_only_changed_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.clip.transition('failed', error_message='boom')
+
+        [sql] = self.clip_updates(queries.captured_queries)
+        self.assertIn('"failed_at"', sql)
+        self.assertNotIn('"viral_reason"', sql)
+
+        self.clip.refresh_from_db()
+        self.assertEqual(self.clip.status, 'failed')
+        self.assertIsNotNone(self.clip.failed_at)
+
+        # A new run starts with a clean set of stage timestamps
+        self.clip.transition('pending')
+        self.clip.refresh_from_db()
+        self.assertIsNone(self.clip.failed_at)
+        self.assertIsNotNone(self.clip.queued_at)
+
+    @override_settings(CLIP_PIPELINE='stream', PROGRESS_SAVE_INTERVAL_SECONDS=3600)
+    def test_render_writes_each_stage_once(self):
+        with mock.patch('clips.tasks.VideoProcessingService') as service, \
+                mock.patch('clips.tasks.schedule_storage_collection'), \
+                CaptureQueriesContext(connection) as queries:
+            service.return_value.get_clip_subtitle_text.return_value = 'hello'
+            service.return_value.create_vertical_clip_from_stream.return_value = '/tmp/clip_final.mp4'
+            render_clip(self.clip.id)
+
+        # Claim, download done + processing, completed
+        updates = self.clip_updates(queries.captured_queries)
+        self.assertEqual(len(updates), 3)
+        self.assertFalse(any('"viral_reason"' in sql for sql in updates))
+
+        self.clip.refresh_from_db()
+        self.assertEqual(self.clip.status, 'completed')
+        self.assertEqual(self.clip.subtitle_text, 'hello')
+        self.assertTrue(
+            self.clip.queued_at <= self.clip.downloading_at <= self.clip.processing_at <= self.clip.completed_at
+        )
+
+
+@override_settings(PROGRESS_SAVE_INTERVAL_SECONDS=3600)
+class ClipPipelineTests(TestCase):
+
+    def setUp(self):
+        self.video = Video.objects.create(youtube_url='https://youtube.com/watch?v=p', youtube_id='p', duration=600)
+        self.clip = Clip.objects.create(video=self.video, title='Clip', start_time=100, end_time=130, duration=30)
+
+    def render(self):
+        with mock.patch('clips.tasks.VideoProcessingService') as service, \
+                mock.patch('clips.tasks.SourceMediaCache') as cache, \
+                mock.patch('clips.tasks.schedule_storage_collection'):
+            service = service.return_value
+            service.get_clip_subtitle_text.return_value = ''
+            service.download_clip_segment.return_value = '/tmp/clip_original.mp4'
+            service.create_vertical_clip.return_value = '/tmp/clip_final.mp4'
+            service.create_vertical_clip_from_stream.return_value = '/tmp/clip_final.mp4'
+            cache.return_value.fetch.return_value = '/tmp/source.mp4'
+            render_clip(self.clip.id)
+        self.clip.refresh_from_db()
+        return service, cache.return_value
+
+    @override_settings(CLIP_PIPELINE='source')
+    def test_source_encodes_from_the_cached_video(self):
+        service, cache = self.render()
+        self.assertEqual(self.clip.status, 'completed')
+        cache.fetch.assert_called_once()
+        self.assertEqual(service.create_vertical_clip.call_args[0][0], '/tmp/source.mp4')
+        self.assertEqual(service.create_vertical_clip.call_args[1]['start_offset'], 100)
+        service.download_clip_segment.assert_not_called()
+
+    @override_settings(CLIP_PIPELINE='window', SOURCE_CACHE_MAX_BYTES=0, CLIP_WINDOW_PADDING_SECONDS=15)
+    def test_window_encodes_from_the_downloaded_window(self):
+        service, cache = self.render()
+        self.assertEqual(self.clip.status, 'completed')
+        cache.fetch.assert_not_called()
+        self.assertEqual(service.create_vertical_clip.call_args[0][0], '/tmp/clip_original.mp4')
+        self.assertEqual(service.create_vertical_clip.call_args[1]['start_offset'], 15)
+        self.assertEqual(self.clip.original_clip_path, '/tmp/clip_original.mp4')
+
+    @override_settings(CLIP_PIPELINE='stream')
+    def test_stream_reads_youtube_directly(self):
+        service, cache = self.render()
+        self.assertEqual(self.clip.status, 'completed')
+        cache.fetch.assert_not_called()
+        service.create_vertical_clip_from_stream.assert_called_once()
+        service.create_vertical_clip.assert_not_called()
+
+    @override_settings(CLIP_PIPELINE='stream')
+    def test_late_job_does_not_overwrite_a_requeued_clip(self):
+        def requeued_meanwhile(*args, **kwargs):
+            # The lease expired mid-encode and update_times queued new times
+            Clip.objects.filter(pk=self.clip.pk).update(start_time=95, **Clip.stage_fields('pending'))
+            return '/tmp/clip_final.mp4'
+
+        with mock.patch('clips.tasks.VideoProcessingService') as service, \
+                mock.patch('clips.tasks.schedule_storage_collection'):
+            service.return_value.get_clip_subtitle_text.return_value = ''
+            service.return_value.create_vertical_clip_from_stream.side_effect = requeued_meanwhile
+            render_clip(self.clip.id)
+
+        self.clip.refresh_from_db()
+        self.assertEqual((self.clip.status, self.clip.start_time), ('pending', 95))
+        self.assertEqual((self.clip.processed_clip_path, self.clip.error_message), ('', ''))
+        self.assertIsNone(self.clip.processing_at)
+
+    def test_auto_follows_the_source_cache(self):
+        with override_settings(CLIP_PIPELINE='auto', SOURCE_CACHE_MAX_BYTES=1024):
+            self.assertEqual(get_pipeline(), 'source')
+        with override_settings(CLIP_PIPELINE='auto', SOURCE_CACHE_MAX_BYTES=0):
+            self.assertEqual(get_pipeline(), 'window')
+
+    @override_settings(CLIP_PIPELINE='sorce')
+    def test_unknown_pipeline_fails_the_clip_with_a_clear_error(self):
+        with self.assertRaisesMessage(ValueError, "Unknown CLIP_PIPELINE: 'sorce'"):
+            get_pipeline()
+
+        service, _ = self.render()
+        self.assertEqual(self.clip.status, 'failed')
+        self.assertIn('Unknown CLIP_PIPELINE', self.clip.error_message)
+        service.create_vertical_clip.assert_not_called()
+
+    @override_settings(CLIP_PIPELINE='source')
+    def test_batch_fails_its_clips_when_the_shared_download_fails(self):
+        done = Clip.objects.create(video=self.video, title='Done', start_time=200, end_time=230, duration=30,
+                                   status='completed')
+        with mock.patch('clips.tasks.SourceMediaCache') as cache, \
+                mock.patch('clips.tasks.enqueue') as enqueue:
+            cache.return_value.fetch.side_effect = Exception('yt-dlp error: 403')
+            render_clip_batch(self.video.id, [self.clip.id, done.id])
+
+        enqueue.assert_not_called()
+        self.clip.refresh_from_db()
+        self.assertEqual(self.clip.status, 'failed')
+        self.assertIn('403', self.clip.error_message)
+        self.assertIsNotNone(self.clip.failed_at)
+        done.refresh_from_db()
+        self.assertEqual(done.status, 'completed')
+
+
+class ClipUpdateTimesTests(TestCase):
+
+    def setUp(self):
+        self.video = Video.objects.create(youtube_url='https://youtube.com/watch?v=u', youtube_id='u')
+        self.clip = Clip.objects.create(video=self.video, title='Clip', start_time=100, end_time=130, duration=30)
+        self.client = APIClient()
+        self.url = f'/api/clips/{self.clip.id}/update_times/'
+
+    def test_active_clip_is_not_rendered_twice(self):
+        Clip.objects.filter(pk=self.clip.pk).update(**Clip.stage_fields('processing'), progress_percentage=60)
+        rendition = ClipRendition.objects.create(clip=self.clip, name='square', width=1080, height=1080,
+                                                 status='processing')
+
+        with mock.patch('clips.views.enqueue') as enqueue:
+            response = self.client.post(self.url, {'start_time': 95, 'end_time': 125}, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        enqueue.assert_not_called()
+        self.clip.refresh_from_db()
+        self.assertEqual((self.clip.status, self.clip.start_time, self.clip.progress_percentage),
+                         ('processing', 100, 60))
+        rendition.refresh_from_db()
+        self.assertEqual(rendition.status, 'processing')
+
+    def test_finished_clip_and_renditions_are_queued_again(self):
+        self.clip.transition('completed', progress_percentage=100)
+        done = ClipRendition.objects.create(clip=self.clip, name='square', width=1080, height=1080,
+                                            status='completed')
+        busy = ClipRendition.objects.create(clip=self.clip, name='preview', width=540, height=960,
+                                            status='processing')
+
+        with mock.patch('clips.views.enqueue') as enqueue:
+            response = self.client.post(self.url, {'start_time': 95, 'end_time': 125}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual([c.args[0].__name__ for c in enqueue.call_args_list], ['render_clip', 'render_renditions'])
+        self.clip.refresh_from_db()
+        self.assertEqual((self.clip.status, self.clip.start_time, self.clip.duration), ('pending', 95, 30))
+        self.assertIsNone(self.clip.completed_at)
+        done.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual((done.status, busy.status), ('pending', 'processing'))
+
+    def test_unchanged_times_keep_the_finished_render(self):
+        self.clip.transition('completed', progress_percentage=100, processed_clip_path='/tmp/clip_final.mp4')
+        rendition = ClipRendition.objects.create(clip=self.clip, name='square', width=1080, height=1080,
+                                                 status='completed')
+
+        with mock.patch('clips.views.enqueue') as enqueue:
+            response = self.client.post(
+                self.url, {'start_time': 100, 'end_time': 130, 'profile': 'final'}, format='json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        enqueue.assert_not_called()
+        self.clip.refresh_from_db()
+        self.assertEqual((self.clip.status, self.clip.processed_clip_path), ('completed', '/tmp/clip_final.mp4'))
+        rendition.refresh_from_db()
+        self.assertEqual(rendition.status, 'completed')
+
+    @override_settings(JOB_LEASE_SECONDS=600, JOB_QUEUE_LEASE_SECONDS=86400)
+    def test_stuck_clip_is_reclaimed_after_the_lease(self):
+        # A worker died mid-download: the claim stays until the lease expires
+        Clip.objects.filter(pk=self.clip.pk).update(**Clip.stage_fields('downloading'))
+        with mock.patch('clips.views.enqueue') as enqueue:
+            response = self.client.post(self.url, {'start_time': 95, 'end_time': 125}, format='json')
+        self.assertEqual(response.status_code, 409)
+        enqueue.assert_not_called()
+
+        Clip.objects.filter(pk=self.clip.pk).update(updated_at=timezone.now() - timedelta(minutes=11))
+        with mock.patch('clips.views.enqueue') as enqueue:
+            response = self.client.post(self.url, {'start_time': 95, 'end_time': 125}, format='json')
+        self.assertEqual(response.status_code, 202)
+        enqueue.assert_called_once()
+        self.clip.refresh_from_db()
+        self.assertEqual((self.clip.status, self.clip.start_time), ('pending', 95))
+        self.assertIsNone(self.clip.downloading_at)
+
+        # The new job can claim it
+        self.assertTrue(Clip.objects.filter(pk=self.clip.pk, status='pending').exists())
+
+        # Still queued behind other renders: not stale until the queue lease runs out
+        Clip.objects.filter(pk=self.clip.pk).update(updated_at=timezone.now() - timedelta(minutes=11))
+        with mock.patch('clips.views.enqueue') as enqueue:
+            response = self.client.post(self.url, {'start_time': 90, 'end_time': 120}, format='json')
+        self.assertEqual(response.status_code, 409)
+        enqueue.assert_not_called()
 
-# Create your tests here.
@@ -1,10 +1,25 @@
+import os
+from django.db import IntegrityError, transaction
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from .models import Clip
-from .serializers import ClipSerializer, ClipCreateSerializer, ClipUpdateTimesSerializer
-from .services import VideoProcessingService
+from .models import Clip, ClipRendition
+from .serializers import (
+    ClipSerializer,
+    ClipListSerializer,
+    ClipCreateSerializer,
+    ClipUpdateTimesSerializer,
+    ClipRenditionSerializer,
+    ClipRenditionsCreateSerializer,
+)
+from .services import RENDITIONS
+from .tasks import render_clip, render_renditions
+from .streaming import ranged_file_response
 from videos.models import Video
+from snapcast_backend.jobs import enqueue
+from snapcast_backend.events import EventStreamRenderer, publish, sse_response
+from snapcast_backend.pagination import ViralScoreCursorPagination
 
 
 class ClipViewSet(viewsets.ModelViewSet):
@@ -12,10 +27,32 @@ class ClipViewSet(viewsets.ModelViewSet):
 
     queryset = Clip.objects.all()
     serializer_class = ClipSerializer
+    pagination_class = ViralScoreCursorPagination
+
+    # Large Video columns that no clip response includes
+    VIDEO_HEAVY_FIELDS = ('video__viral_moments',)
+    # Large Clip columns left out of ClipListSerializer
+    LIST_HEAVY_FIELDS = ('description', 'subtitle_text', 'viral_reason')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        video_id = self.request.query_params.get('video', '')
+        if video_id.isdigit():
+            queryset = queryset.filter(video_id=video_id)
+
+        if self.action == 'list':
+            queryset = queryset.defer(*self.LIST_HEAVY_FIELDS)
+            if 'video' not in self.request.query_params.get('expand', '').split(','):
+                return queryset
+
+        return queryset.select_related('video').defer(*self.VIDEO_HEAVY_FIELDS)
 
     def get_serializer_class(self):
         if self.action == 'create':
             return ClipCreateSerializer
+        if self.action == 'list':
+            return ClipListSerializer
         return ClipSerializer
 
     def create(self, request):
@@ -25,6 +62,7 @@ class ClipViewSet(viewsets.ModelViewSet):
 
         video_id = serializer.validated_data['video_id']
         moment_index = serializer.validated_data['moment_index']
+        profile = serializer.validated_data.get('profile')
 
         # Get video
         try:
@@ -66,111 +104,68 @@ class ClipViewSet(viewsets.ModelViewSet):
             ).first()
 
         if existing_clip:
+            if existing_clip.needs_render(profile):
+                # Same moment, different quality (or failed/evicted): re-render in place
+                return self._rerender(existing_clip, profile or existing_clip.encoding_profile)
+
             return Response(
                 ClipSerializer(existing_clip).data,
                 status=status.HTTP_200_OK
             )
 
-        # Create clip record
-        clip = Clip.objects.create(
-            video=video,
-            moment_index=moment_index,
-            title=moment.get('title', moment.get('transcript', f'Clip {moment_index + 1}')),
-            description=moment.get('description', moment.get('reason', '')),
-            start_time=moment['start_time'],
-            end_time=moment['end_time'],
-            duration=moment.get('duration', moment['end_time'] - moment['start_time']),
-            viral_score=moment.get('viral_score', 0),
-            viral_reason=moment.get('viral_reason', moment.get('reason', '')),
-            status='pending'
-        )
-
-        # Process clip asynchronously (in a real app, use Celery)
-        # For MVP, we'll do it synchronously
+        # Create clip record; the unique render key turns a concurrent duplicate into a lookup
+        clip = Clip.from_moment(video, moment_index, moment, profile)
         try:
-            self._process_clip(clip, video)
+            with transaction.atomic():
+                clip.save()
+        except IntegrityError:
             return Response(
-                ClipSerializer(clip).data,
-                status=status.HTTP_201_CREATED
+                ClipSerializer(Clip.objects.get(**clip.render_key())).data,
+                status=status.HTTP_200_OK
             )
-        except Exception as e:
-            clip.status = 'failed'
-            clip.error_message = str(e)
-            clip.save()
+
+        # Render in a worker; the client follows status/progress_percentage
+        enqueue(render_clip, clip.id)
+
+        return Response(
+            ClipSerializer(clip).data,
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    def _rerender(self, clip, profile):
+        """Queue a finished clip again with another profile; one render per clip at a time"""
+        if clip.status in Clip.ACTIVE_STATUSES and not clip.is_stale():
             return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Clip is being rendered; try again when it finishes'},
+                status=status.HTTP_409_CONFLICT
             )
 
-    def _process_clip(self, clip, video):
-        """Process clip: download and crop to vertical"""
-        processing_service = VideoProcessingService()
-
-        # Update status
-        clip.status = 'downloading'
-        clip.progress_percentage = 10
-        clip.save()
-
-        # Download segment
-        print(f"=== Downloading clip segment ===")
-        print(f"Clip ID: {clip.id}")
-        print(f"Title: {clip.title}")
-        print(f"Description: {clip.description}")
-        print(f"Start time: {clip.start_time} seconds")
-        print(f"End time: {clip.end_time} seconds")
-        print(f"Duration: {clip.duration} seconds")
-        print(f"Viral score: {clip.viral_score}")
-        print(f"Reason: {clip.viral_reason}")
-
-        original_filename = f"clip_{clip.id}_original.mp4"
-        original_path = processing_service.download_clip_segment(
-            video.youtube_url,
-            clip.start_time,
-            clip.end_time,
-            original_filename
-        )
-        print(f"Downloaded to: {original_path}")
-        clip.original_clip_path = original_path
-        clip.progress_percentage = 40
-        clip.save()
-
-        # Update status
-        clip.status = 'processing'
-        clip.progress_percentage = 50
-        clip.save()
-
-        # Get subtitle text from transcript (for display only, not burned into video)
-        subtitle_text = processing_service.get_clip_subtitle_text(
-            video.transcript_with_timestamps,
-            clip.start_time,
-            clip.end_time
-        )
-        clip.subtitle_text = subtitle_text
-        clip.save()
-
-        # Create vertical clip (without burned subtitles)
-        processed_filename = f"clip_{clip.id}_final.mp4"
-        processed_path = processing_service.create_vertical_clip(
-            original_path,
-            processed_filename
-        )
-        clip.processed_clip_path = processed_path
-        clip.progress_percentage = 90
-        clip.save()
+        try:
+            queued = clip.requeue(encoding_profile=profile)
+        except IntegrityError:
+            return Response(
+                {'error': 'Another clip already renders this range with this profile'},
+                status=status.HTTP_409_CONFLICT
+            )
 
-        # Complete
-        clip.status = 'completed'
-        clip.progress_percentage = 100
-        clip.save()
+        if not queued:
+            # Another request queued it a moment ago
+            return Response(ClipSerializer(clip).data, status=status.HTTP_200_OK)
 
-    @action(detail=True, methods=['get'])
-    def download(self, request, pk=None):
-        """Download processed clip file directly"""
-        import os
-        from django.http import FileResponse
-        from django.conf import settings
+        publish(clip.progress_channel, clip.progress_snapshot())
+        enqueue(render_clip, clip.id)
+        return Response(
+            ClipSerializer(clip).data,
+            status=status.HTTP_202_ACCEPTED
+        )
 
-        clip = self.get_object()
+    def _completed_clip_file(self, clip):
+        """Return an error Response if the clip has no playable file, else None"""
+        if clip.status == 'evicted':
+            return Response(
+                {'error': 'Clip file was removed to free disk space; render it again'},
+                status=status.HTTP_410_GONE
+            )
 
         if clip.status != 'completed':
             return Response(
@@ -191,58 +186,131 @@ class ClipViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        return None
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download processed clip file directly (resumable via Range)"""
+        clip = self.get_object()
+
+        error_response = self._completed_clip_file(clip)
+        if error_response:
+            return error_response
+
+        clip.mark_accessed()
+
         # Prepare filename for download
         filename = f"{clip.title.replace(' ', '_').replace('/', '_')}.mp4"
 
-        # Open and return file as download
-        file_handle = open(clip.processed_clip_path, 'rb')
-        response = FileResponse(
-            file_handle,
+        return ranged_file_response(
+            request,
+            clip.processed_clip_path,
             content_type='video/mp4',
-            as_attachment=True,
-            filename=filename
+            filename=filename,
+            as_attachment=True
         )
 
-        return response
-
     @action(detail=True, methods=['get'])
     def stream(self, request, pk=None):
-        """Stream processed clip for video player"""
-        import os
-        from django.http import FileResponse
+        """Stream processed clip for video player, with Range/206 for seeking"""
+        clip = self.get_object()
+
+        error_response = self._completed_clip_file(clip)
+        if error_response:
+            return error_response
+
+        clip.mark_accessed()
 
+        return ranged_file_response(request, clip.processed_clip_path, content_type='video/mp4')
+
+    @action(detail=True, methods=['get', 'post'])
+    def renditions(self, request, pk=None):
+        """List renditions, or queue new ones (all rendered in one ffmpeg pass)"""
         clip = self.get_object()
 
-        if clip.status != 'completed':
-            return Response(
-                {'error': 'Clip processing not completed yet'},
-                status=status.HTTP_400_BAD_REQUEST
+        if request.method == 'GET':
+            return Response(ClipRenditionSerializer(clip.renditions.all(), many=True).data)
+
+        serializer = ClipRenditionsCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        queued = False
+        for name in dict.fromkeys(serializer.validated_data['renditions']):
+            size = {'width': RENDITIONS[name]['width'], 'height': RENDITIONS[name]['height']}
+            rendition, created = ClipRendition.objects.get_or_create(clip=clip, name=name, defaults=size)
+            # Re-queue finished renditions only: a pending or processing one
+            # already has a job, and resetting it would render it twice
+            queued |= created or bool(
+                ClipRendition.objects.filter(id=rendition.id, status__in=ClipRendition.FINAL_STATUSES).update(
+                    status='pending',
+                    progress_percentage=0,
+                    error_message='',
+                    **size
+                )
             )
 
-        if not clip.processed_clip_path:
+        if queued:
+            enqueue(render_renditions, clip.id)
+
+        return Response(
+            ClipRenditionSerializer(clip.renditions.all(), many=True).data,
+            status=status.HTTP_202_ACCEPTED if queued else status.HTTP_200_OK
+        )
+
+    @action(detail=True, methods=['get'], url_path=r'renditions/(?P<name>[\w-]+)')
+    def rendition(self, request, pk=None, name=None):
+        """Stream one rendition file (Range supported; ?download=1 for an attachment)"""
+        clip = self.get_object()
+        rendition = clip.renditions.filter(name=name).first()
+
+        if rendition is None:
             return Response(
-                {'error': 'Processed clip not found'},
+                {'error': 'Rendition not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Check if file exists
-        if not os.path.exists(clip.processed_clip_path):
+        if rendition.status != 'completed':
             return Response(
-                {'error': 'Clip file not found on server'},
+                {'error': 'Rendition processing not completed yet'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not os.path.exists(rendition.file_path):
+            return Response(
+                {'error': 'Rendition file not found on server'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Open and return file for streaming
-        file_handle = open(clip.processed_clip_path, 'rb')
-        response = FileResponse(file_handle, content_type='video/mp4')
-        response['Content-Length'] = os.path.getsize(clip.processed_clip_path)
-        response['Accept-Ranges'] = 'bytes'
+        clip.mark_accessed()
+        filename = f"{clip.title.replace(' ', '_').replace('/', '_')}_{rendition.name}.mp4"
+
+        return ranged_file_response(
+            request,
+            rendition.file_path,
+            content_type='video/mp4',
+            filename=filename,
+            as_attachment=request.query_params.get('download') == '1'
+        )
+
+    @action(detail=True, methods=['get'], renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def events(self, request, pk=None):
+        """Server-Sent Events stream of render progress, closed once the clip completes or fails"""
+        clip = self.get_object()
+
+        def snapshot():
+            clip.refresh_from_db(fields=['status', 'progress_percentage', 'error_message'])
+            return clip.progress_snapshot()
 
-        return response
+        return sse_response(
+            request,
+            clip.progress_channel,
+            snapshot,
+            lambda data: data['status'] in Clip.FINAL_STATUSES
+        )
 
     @action(detail=True, methods=['post'])
     def update_times(self, request, pk=None):
-        """Update clip start/end times and reprocess"""
+        """Update clip start/end times and queue a re-render"""
         clip = self.get_object()
 
         serializer = ClipUpdateTimesSerializer(data=request.data)
@@ -251,26 +319,53 @@ class ClipViewSet(viewsets.ModelViewSet):
         new_start_time = serializer.validated_data['start_time']
         new_end_time = serializer.validated_data['end_time']
 
+        if clip.status in Clip.ACTIVE_STATUSES and not clip.is_stale():
+            return Response(
+                {'error': 'Clip is being rendered; try again when it finishes'},
+                status=status.HTTP_409_CONFLICT
+            )
+
         # Update clip times
-        clip.start_time = new_start_time
-        clip.end_time = new_end_time
-        clip.duration = new_end_time - new_start_time
-        clip.status = 'pending'
-        clip.progress_percentage = 0
-        clip.save()
-
-        # Reprocess clip with new times
+        changes = {
+            'start_time': new_start_time,
+            'end_time': new_end_time,
+            'duration': new_end_time - new_start_time,
+        }
+        if 'profile' in serializer.validated_data:
+            changes['encoding_profile'] = serializer.validated_data['profile']
+
+        if clip.status == 'completed' and all(getattr(clip, name) == value for name, value in changes.items()):
+            # Same range and profile: the finished render (and its renditions) still stands
+            return Response(ClipSerializer(clip).data, status=status.HTTP_200_OK)
+
         try:
-            self._process_clip(clip, clip.video)
+            queued = clip.requeue(**changes)
+        except IntegrityError:
             return Response(
-                ClipSerializer(clip).data,
-                status=status.HTTP_200_OK
+                {'error': 'Another clip already renders this range with this profile'},
+                status=status.HTTP_409_CONFLICT
             )
-        except Exception as e:
-            clip.status = 'failed'
-            clip.error_message = str(e)
-            clip.save()
+
+        if not queued:
+            # Another request queued it a moment ago
             return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Clip is being rendered; try again when it finishes'},
+                status=status.HTTP_409_CONFLICT
             )
+
+        # Reprocess clip with new times in a worker
+        publish(clip.progress_channel, clip.progress_snapshot())
+        enqueue(render_clip, clip.id)
+
+        # Finished renditions now show the old range; in-flight ones keep their job
+        if clip.renditions.filter(status__in=ClipRendition.FINAL_STATUSES).update(
+            status='pending',
+            progress_percentage=0,
+            error_message=''
+        ):
+            enqueue(render_renditions, clip.id)
+
+        return Response(
+            ClipSerializer(clip).data,
+            status=status.HTTP_202_ACCEPTED
+        )
@@ -0,0 +1,4 @@
+from .celery import app as celery_app
+from . import db  # noqa: F401  (connection setup, see db.py)
+
+__all__ = ('celery_app',)
@@ -0,0 +1,21 @@
+"""
+Celery application for snapcast_backend.
+
+Only used when JOBS_BACKEND is 'celery'. Start a worker with:
+
+    celery -A snapcast_backend worker -Q analysis,render -l info
+
+and the scheduler for periodic jobs (CELERY_BEAT_SCHEDULE) with:
+
+    celery -A snapcast_backend beat -l info
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'snapcast_backend.settings')
+
+app = Celery('snapcast_backend')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,64 @@
+"""
+Database connection setup.
+
+SQLite (DB_ENGINE=sqlite, the default) gets its pragmas on every new
+connection through the ``connection_created`` signal: WAL so readers never
+block the writer, ``synchronous=NORMAL`` (durable at checkpoints, no fsync
+per commit), a busy timeout so concurrent writers queue instead of failing
+with "database is locked", and memory-mapped reads. Postgres settings are
+plain DATABASES options (see settings.py).
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db.backends.signals import connection_created
+
+
+def sqlite_pragmas():
+    """PRAGMA statements run on each new SQLite connection"""
+    if not settings.SQLITE_WAL:
+        return []
+    return [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_SECONDS * 1000)}',
+        f'PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}',
+    ]
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in sqlite_pragmas():
+            cursor.execute(statement)
+
+
+connection_created.connect(configure_connection, dispatch_uid='snapcast_configure_connection')
+
+
+@contextmanager
+def scratch_database(connection=default_connection):
+    """Throwaway copy of the schema, like the test runner's, for benchmarks
+
+    SQLite uses a file in a temporary directory (not ``:memory:``) so that
+    several threads can share it.
+    """
+    original_name = connection.settings_dict['NAME']
+    scratch_dir = None
+    if connection.vendor == 'sqlite':
+        scratch_dir = tempfile.mkdtemp(prefix='snapcast_scratch_')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(scratch_dir, 'scratch.sqlite3')
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(original_name, verbosity=0)
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
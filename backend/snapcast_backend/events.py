@@ -0,0 +1,281 @@
+"""
+Progress events pushed to the browser over Server-Sent Events.
+
+Processing stages call ``publish('clip:42', {...})``; the ``events``
+actions on the clip/video viewsets stream them with ``sse_response``.
+
+Two buses, picked by ``settings.PROGRESS_EVENTS_BACKEND``:
+
+    'memory' - in-process fan-out; enough when jobs run in the web process
+               (JOBS_BACKEND 'thread' or 'eager') and there is one web process
+    'redis'  - Redis pub/sub, needed once Celery workers run elsewhere
+
+Streams also re-read the snapshot whenever they have been quiet for
+HEARTBEAT_SECONDS, so a client whose events are published in another
+process still sees the final status. Under ASGI the stream is an async
+generator; under WSGI it occupies a worker, so it is kept short and the
+client reconnects (or falls back to polling).
+"""
+
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import checks
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+# Quiet this long: re-read the snapshot, or send a comment to keep proxies from closing the stream
+HEARTBEAT_SECONDS = 5
+# EventSource reconnects by itself; don't hold a connection forever
+MAX_STREAM_SECONDS = 30 * 60
+# A WSGI stream holds a whole worker, so give it back sooner
+WSGI_MAX_STREAM_SECONDS = 60
+# How often an async stream checks its subscription
+ASYNC_POLL_SECONDS = 0.25
+
+
+class InProcessEventBus:
+    """Fan-out of events to subscriber queues within one process"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(data)
+            except queue.Full:
+                # A stalled client only misses intermediate progress
+                pass
+
+    def subscribe(self, channel):
+        return _InProcessSubscription(self, channel)
+
+    def _add(self, channel, subscriber):
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+
+    def _remove(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+
+class _InProcessSubscription:
+
+    def __init__(self, bus, channel):
+        self.bus = bus
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=100)
+
+    def __enter__(self):
+        self.bus._add(self.channel, self.queue)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.bus._remove(self.channel, self.queue)
+
+    def get(self, timeout):
+        """Return the next event or None after timeout seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class RedisEventBus:
+    """Events over Redis pub/sub, shared by web and worker processes"""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, data):
+        self.client.publish(f"snapcast:{channel}", json.dumps(data))
+
+    def subscribe(self, channel):
+        return _RedisSubscription(self.client, f"snapcast:{channel}")
+
+
+class _RedisSubscription:
+
+    def __init__(self, client, channel):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.channel = channel
+
+    def __enter__(self):
+        self.pubsub.subscribe(self.channel)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.pubsub.close()
+
+    def get(self, timeout):
+        """Return the next event or None after timeout seconds"""
+        message = self.pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_event_bus():
+    """Return the process-wide event bus"""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            if settings.PROGRESS_EVENTS_BACKEND == 'redis':
+                _bus = RedisEventBus(settings.PROGRESS_EVENTS_REDIS_URL)
+            else:
+                _bus = InProcessEventBus()
+        return _bus
+
+
+def publish(channel, data):
+    """Publish an event; progress reporting must never break the job itself"""
+    try:
+        get_event_bus().publish(channel, data)
+    except Exception:
+        print(f"⚠️ Could not publish progress event on {channel}")
+        traceback.print_exc()
+
+
+def format_sse(data, event=None):
+    """Encode one Server-Sent Event"""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def sse_stream(channel, get_snapshot, is_final, max_seconds=MAX_STREAM_SECONDS):
+    """Yield SSE frames: the current state, then live events until is_final(data)
+
+    The snapshot is taken after subscribing, so no event published in
+    between is lost. When no event arrives for HEARTBEAT_SECONDS the
+    snapshot is read again and sent if it changed, else a comment is sent.
+    """
+    with get_event_bus().subscribe(channel) as subscription:
+        last = get_snapshot()
+        # Tell EventSource how long to wait before reconnecting
+        yield 'retry: 3000\n\n'
+        yield format_sse(last)
+        if is_final(last):
+            return
+
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            data = subscription.get(timeout=HEARTBEAT_SECONDS)
+            if data is None:
+                data = get_snapshot()
+                if data == last:
+                    yield ': heartbeat\n\n'
+                    continue
+
+            last = data
+            yield format_sse(data)
+            if is_final(data):
+                return
+
+
+async def async_sse_stream(channel, get_snapshot, is_final, max_seconds=MAX_STREAM_SECONDS):
+    """sse_stream for ASGI: frames reach the client as they are produced
+
+    The subscription is polled without blocking, so an open stream holds no
+    thread while it waits; ``get_snapshot`` runs through sync_to_async.
+    """
+    get_snapshot = sync_to_async(get_snapshot)
+    subscription = get_event_bus().subscribe(channel)
+    await sync_to_async(subscription.__enter__, thread_sensitive=False)()
+    try:
+        last = await get_snapshot()
+        yield 'retry: 3000\n\n'
+        yield format_sse(last)
+        if is_final(last):
+            return
+
+        deadline = time.monotonic() + max_seconds
+        quiet_since = time.monotonic()
+        while time.monotonic() < deadline:
+            data = subscription.get(timeout=0)
+            if data is None:
+                if time.monotonic() - quiet_since < HEARTBEAT_SECONDS:
+                    await asyncio.sleep(ASYNC_POLL_SECONDS)
+                    continue
+                quiet_since = time.monotonic()
+                data = await get_snapshot()
+                if data == last:
+                    yield ': heartbeat\n\n'
+                    continue
+
+            quiet_since = time.monotonic()
+            last = data
+            yield format_sse(data)
+            if is_final(data):
+                return
+    finally:
+        subscription.__exit__(None, None, None)
+
+
+def sse_response(request, channel, get_snapshot, is_final):
+    """StreamingHttpResponse for an SSE channel, async under ASGI"""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        stream = async_sse_stream(channel, get_snapshot, is_final)
+    else:
+        stream = sse_stream(channel, get_snapshot, is_final, max_seconds=WSGI_MAX_STREAM_SECONDS)
+
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@checks.register(checks.Tags.compatibility)
+def check_event_bus(app_configs, **kwargs):
+    """The in-process bus only reaches clients of the process running the job"""
+    if settings.PROGRESS_EVENTS_BACKEND == 'redis':
+        return []
+    if settings.JOBS_BACKEND == 'celery':
+        return [checks.Error(
+            "PROGRESS_EVENTS_BACKEND='memory' can't carry events from Celery workers to the web process.",
+            hint="Set PROGRESS_EVENTS_BACKEND=redis.",
+            id='snapcast.E001',
+        )]
+    if int(os.getenv('WEB_CONCURRENCY', '1')) > 1:
+        return [checks.Warning(
+            "PROGRESS_EVENTS_BACKEND='memory' with several web processes: a client only gets live "
+            f"events from its own process, others every {HEARTBEAT_SECONDS}s.",
+            hint="Set PROGRESS_EVENTS_BACKEND=redis.",
+            id='snapcast.W001',
+        )]
+    return []
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF actions answer ``Accept: text/event-stream``; errors become an SSE event"""
+
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_sse(data, event='error')
@@ -0,0 +1,74 @@
+"""
+Background job dispatch.
+
+Tasks are declared as regular Celery tasks (``@shared_task(queue=...)``).
+Where they run is controlled by ``settings.JOBS_BACKEND``:
+
+    'celery' - published to the broker in CELERY_BROKER_URL (needs Redis)
+    'thread' - run by an in-process worker pool, one pool per queue
+    'eager'  - run inline in the calling thread (tests, debugging)
+"""
+
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_queue_name(task):
+    """Return the queue a task is bound to"""
+    return getattr(task, 'queue', None) or 'default'
+
+
+def get_executor(queue):
+    """Return the process-wide worker pool for a queue, creating it on first use"""
+    with _executors_lock:
+        executor = _executors.get(queue)
+        if executor is None:
+            max_workers = settings.JOBS_QUEUE_CONCURRENCY.get(queue, 1)
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix=f'jobs-{queue}'
+            )
+            _executors[queue] = executor
+        return executor
+
+
+def _run_in_worker(task, args, kwargs):
+    """Run a task body inside a pool thread with its own DB connection"""
+    close_old_connections()
+    try:
+        return task(*args, **kwargs)
+    except Exception:
+        print(f"❌ Job {task.name} failed")
+        traceback.print_exc()
+        raise
+    finally:
+        connections.close_all()
+
+
+def dispatch(task, *args, **kwargs):
+    """Hand a task to the configured backend right away"""
+    backend = settings.JOBS_BACKEND
+
+    if backend == 'celery':
+        return task.apply_async(args=args, kwargs=kwargs)
+
+    if backend == 'eager':
+        return task(*args, **kwargs)
+
+    if backend == 'thread':
+        executor = get_executor(get_queue_name(task))
+        return executor.submit(_run_in_worker, task, args, kwargs)
+
+    raise ValueError(f"Unknown JOBS_BACKEND: {backend}")
+
+
+def enqueue(task, *args, **kwargs):
+    """Schedule a task once the current transaction (if any) commits"""
+    transaction.on_commit(lambda: dispatch(task, *args, **kwargs))
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+
+class StatusTransitionMixin:
+    """Targeted status writes for models that move through processing stages
+
+    ``STAGE_TIMESTAMPS`` maps a status to the DateTimeField recording when the
+    row last entered it. ``transition()`` writes a status change together with
+    whatever else changed at that moment as one UPDATE of just those columns,
+    so the long text columns are never rewritten and concurrent workers hold
+    the write lock for as short as possible.
+    """
+
+    STAGE_TIMESTAMPS = {}
+    # Statuses a run ends in; any other status means a job owns the row
+    FINAL_STATUSES = ()
+    # Status that starts a new run; entering it clears the previous run's timestamps
+    INITIAL_STATUS = 'pending'
+
+    @classmethod
+    def stage_fields(cls, status, now=None):
+        """Column values for a move to ``status``, for QuerySet.update() or transition()"""
+        now = now or timezone.now()
+        fields = {'status': status, 'updated_at': now}
+        if status == cls.INITIAL_STATUS:
+            fields.update({name: None for name in cls.STAGE_TIMESTAMPS.values()})
+        if status in cls.STAGE_TIMESTAMPS:
+            fields[cls.STAGE_TIMESTAMPS[status]] = now
+        return fields
+
+    @classmethod
+    def stale(cls, now=None):
+        """Q for rows whose job is presumed lost, so a new run may claim them
+
+        A claimed row (past INITIAL_STATUS, not final) is stale once updated_at
+        is older than settings.JOB_LEASE_SECONDS; progress writes keep a live
+        job fresh. A row still waiting in the queue is stale only once it was
+        queued more than settings.JOB_QUEUE_LEASE_SECONDS ago, so a backed-up
+        queue doesn't get a second job for the same row.
+        """
+        now = now or timezone.now()
+        queued_field = cls.STAGE_TIMESTAMPS[cls.INITIAL_STATUS]
+        queue_expired = now - timedelta(seconds=settings.JOB_QUEUE_LEASE_SECONDS)
+        claim_expired = now - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        waiting = Q(status=cls.INITIAL_STATUS) & (
+            Q(**{f'{queued_field}__lt': queue_expired})
+            | Q(**{f'{queued_field}__isnull': True}, updated_at__lt=queue_expired)
+        )
+        claimed = ~Q(status__in=cls.FINAL_STATUSES + (cls.INITIAL_STATUS,)) & Q(updated_at__lt=claim_expired)
+        return waiting | claimed
+
+    def is_stale(self, now=None):
+        """Instance check matching stale()"""
+        now = now or timezone.now()
+        if self.status in self.FINAL_STATUSES:
+            return False
+        if self.status == self.INITIAL_STATUS:
+            since = getattr(self, self.STAGE_TIMESTAMPS[self.INITIAL_STATUS]) or self.updated_at
+            lease = settings.JOB_QUEUE_LEASE_SECONDS
+        else:
+            since = self.updated_at
+            lease = settings.JOB_LEASE_SECONDS
+        return since is not None and since < now - timedelta(seconds=lease)
+
+    def claim_filter(self):
+        """Lookup matching this row only while it is still in the stage this instance last saw
+
+        The stage timestamp tells this run apart from a newer one that
+        requeued the row after this run's lease expired.
+        """
+        match = {'pk': self.pk, 'status': self.status}
+        stamp = self.STAGE_TIMESTAMPS.get(self.status)
+        if stamp:
+            match[stamp] = getattr(self, stamp)
+        return match
+
+    def transition_claimed(self, status=None, **changes):
+        """transition(), but only if claim_filter() still matches; returns whether it did
+
+        For workers: a late job whose row was requeued writes nothing.
+        """
+        fields = self.stage_fields(status) if status else {'updated_at': timezone.now()}
+        fields.update(changes)
+        if not type(self)._default_manager.filter(**self.claim_filter()).update(**fields):
+            return False
+        for name, value in fields.items():
+            setattr(self, name, value)
+        return True
+
+    def transition(self, status=None, **changes):
+        """Set ``status`` (optional) and other fields, saving only those columns"""
+        fields = self.stage_fields(status) if status else {'updated_at': timezone.now()}
+        fields.update(changes)
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.save(update_fields=list(fields))
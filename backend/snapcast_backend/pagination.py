@@ -0,0 +1,23 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Newest first; stable under inserts, no COUNT(*) per page"""
+
+    ordering = '-created_at'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class ViralScoreCursorPagination(CreatedAtCursorPagination):
+    """Best scored first, newest first among ties (matches Clip.Meta.ordering)
+
+    The trailing ``-id`` makes the order total, so a page boundary inside a
+    run of equal scores is deterministic. DRF positions the cursor on
+    ``viral_score`` alone and steps through ties by offset: a clip inserted
+    into a tie that spans a page boundary can still shift one row across it
+    while a client is paging.
+    """
+
+    ordering = ('-viral_score', '-created_at', '-id')
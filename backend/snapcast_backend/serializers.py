@@ -0,0 +1,41 @@
+class SparseFieldsetsMixin:
+    """Let API clients shape responses with query parameters
+
+    ``?fields=id,title`` keeps only the listed fields and ``?expand=video``
+    adds (or swaps in) a field from ``expandable_fields``, a mapping of field
+    name to a zero-argument factory returning the field instance. Only the
+    top-level serializer of a response reads the query string.
+    """
+
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        request = self.context.get('request')
+        if request is None or not self._is_response_root():
+            return fields
+
+        for name in self._query_param_set(request, 'expand'):
+            if name in self.expandable_fields:
+                fields[name] = self.expandable_fields[name]()
+
+        only = self._query_param_set(request, 'fields')
+        if only:
+            for name in list(fields):
+                if name not in only:
+                    fields.pop(name)
+
+        return fields
+
+    def _is_response_root(self):
+        parent = self.parent
+        if parent is None:
+            return True
+        # many=True wraps the serializer in a ListSerializer
+        return parent.parent is None and getattr(parent, 'child', None) is self
+
+    @staticmethod
+    def _query_param_set(request, name):
+        values = request.query_params.get(name, '')
+        return {value.strip() for value in values.split(',') if value.strip()}
@@ -86,12 +86,41 @@ WSGI_APPLICATION = 'snapcast_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# 'sqlite' for single-node installs, 'postgres' when several machines run workers
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+# SQLite tuning applied to every connection (see snapcast_backend.db):
+# WAL + synchronous=NORMAL, writers wait up to the busy timeout for the lock
+SQLITE_WAL = os.getenv('SQLITE_WAL', '1') == '1'
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv('SQLITE_BUSY_TIMEOUT_SECONDS', '30'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE_MB', '256')) * 1024 * 1024
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'snapcast'),
+            'USER': os.getenv('POSTGRES_USER', 'snapcast'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            # Reuse connections across requests and jobs for this many seconds,
+            # checking they are still alive before each reuse
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                # sqlite3's own wait for a locked database, before any PRAGMA runs
+                'timeout': SQLITE_BUSY_TIMEOUT_SECONDS,
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -159,17 +188,121 @@ REST_FRAMEWORK = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Let the reverse proxy send clip files instead of a Python worker:
+# '' (serve from Django), 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd).
+# For nginx, map MEDIA_ACCEL_REDIRECT_PREFIX to MEDIA_ROOT in an `internal` location.
+MEDIA_OFFLOAD = os.getenv('MEDIA_OFFLOAD', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+# Source media cache: full videos downloaded once and shared by all their clips.
+# Least recently used files are evicted past this size; 0 disables the cache.
+SOURCE_CACHE_MAX_BYTES = int(float(os.getenv('SOURCE_CACHE_MAX_GB', '20')) * 1024 ** 3)
+SOURCE_CACHE_FORMAT = os.getenv(
+    'SOURCE_CACHE_FORMAT',
+    'bestvideo[ext=mp4][height<=1080]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+)
+
+# Disk budget for MEDIA_ROOT/clips (see clips.storage): orphans are always removed,
+# then originals and unpublished finals are evicted least recently used first
+CLIP_STORAGE_MAX_BYTES = int(float(os.getenv('CLIP_STORAGE_MAX_GB', '50')) * 1024 ** 3)
+CLIP_STORAGE_GC_INTERVAL_SECONDS = int(os.getenv('CLIP_STORAGE_GC_INTERVAL_SECONDS', '3600'))
+
+# Minimum seconds between progress_percentage writes while yt-dlp/ffmpeg run
+PROGRESS_SAVE_INTERVAL_SECONDS = float(os.getenv('PROGRESS_SAVE_INTERVAL_SECONDS', '1'))
+
+# How clip frames reach the encoder (see clips.tasks.process_clip):
+# 'auto' (= 'source' if the source cache is on, else 'window'), 'source', 'window', 'stream'
+CLIP_PIPELINE = os.getenv('CLIP_PIPELINE', 'auto')
+
+# Vertical crop: 'center' is the fixed centre crop; 'smart' follows the speaker
+# (faces, then motion; see clips.reframe). Opt in to 'smart' after checking its
+# sendcmd filter graph and cost on real clips (manage.py benchmark_reframe)
+CLIP_REFRAME = os.getenv('CLIP_REFRAME', 'center')
+# Frames per second sampled by the reframing analysis
+REFRAME_SAMPLE_FPS = float(os.getenv('REFRAME_SAMPLE_FPS', '2'))
+
+# Extra seconds downloaded on each side of a clip so re-trims can reuse the file ('window' pipeline)
+CLIP_WINDOW_PADDING_SECONDS = float(os.getenv('CLIP_WINDOW_PADDING_SECONDS', '15'))
+
 # API Keys (from environment variables)
 YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY', '')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 
+# YouTube Data API metadata (see videos.metadata): lookups arriving within the
+# batch window share videos.list calls of up to 50 IDs; results are cached
+YOUTUBE_METADATA_BATCH_WINDOW_SECONDS = float(os.getenv('YOUTUBE_METADATA_BATCH_WINDOW_SECONDS', '0.05'))
+YOUTUBE_METADATA_CACHE_TTL_SECONDS = int(os.getenv('YOUTUBE_METADATA_CACHE_TTL_SECONDS', '3600'))
+
+# Transcripts (see videos.transcript_cache): languages tried in order, how long a
+# fetched transcript and a "no transcript" answer are reused, prefetch pool size
+TRANSCRIPT_LANGUAGES = os.getenv('TRANSCRIPT_LANGUAGES', 'pt,pt-BR,en').split(',')
+TRANSCRIPT_CACHE_TTL_SECONDS = int(os.getenv('TRANSCRIPT_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+TRANSCRIPT_NEGATIVE_CACHE_TTL_SECONDS = int(os.getenv('TRANSCRIPT_NEGATIVE_CACHE_TTL_SECONDS', '3600'))
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv('TRANSCRIPT_CACHE_MAX_ENTRIES', '20000'))
+TRANSCRIPT_PREFETCH_WORKERS = int(os.getenv('TRANSCRIPT_PREFETCH_WORKERS', '4'))
+
+# Viral moment analysis: transcripts longer than the threshold are split into
+# overlapping windows that are analyzed concurrently and merged
+VIRAL_ANALYSIS_CHUNK_THRESHOLD_SECONDS = int(os.getenv('VIRAL_ANALYSIS_CHUNK_THRESHOLD_SECONDS', '2700'))
+VIRAL_ANALYSIS_WINDOW_SECONDS = int(os.getenv('VIRAL_ANALYSIS_WINDOW_SECONDS', '1200'))
+VIRAL_ANALYSIS_WINDOW_OVERLAP_SECONDS = int(os.getenv('VIRAL_ANALYSIS_WINDOW_OVERLAP_SECONDS', '120'))
+VIRAL_ANALYSIS_MAX_WORKERS = int(os.getenv('VIRAL_ANALYSIS_MAX_WORKERS', '4'))
+
+# Cached Gemini analyses (see videos.analysis_cache)
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv('ANALYSIS_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '5000'))
+
+# Background jobs
+# 'thread' runs jobs in an in-process worker pool (no Redis needed),
+# 'celery' sends them to the broker below, 'eager' runs them inline.
+JOBS_BACKEND = os.getenv('JOBS_BACKEND', 'thread')
+
+# Worker pool size per queue (thread backend only; Celery uses -c)
+JOBS_QUEUE_CONCURRENCY = {
+    'analysis': int(os.getenv('ANALYSIS_CONCURRENCY', '2')),
+    # Each libx264 encode is already multithreaded, so only a couple run at once
+    'render': int(os.getenv('RENDER_CONCURRENCY', '2')),
+}
+
+# A downloading/processing row untouched (updated_at) for this long is
+# treated as abandoned (worker died) and can be queued again. Progress writes
+# keep running jobs fresh; keep it above the longest stretch a job goes
+# without one (source download, Gemini)
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '7200'))
+# Same for a row still 'pending' (thread queue lost on restart), counted from
+# queued_at: a long queue is normal under load, so this one is larger
+JOB_QUEUE_LEASE_SECONDS = int(os.getenv('JOB_QUEUE_LEASE_SECONDS', '86400'))
+
+# Threads per ffmpeg encode (-threads); by default the cores are split between
+# the concurrent renders instead of every encode claiming all of them
+FFMPEG_THREADS = int(os.getenv(
+    'FFMPEG_THREADS',
+    str(max(1, (os.cpu_count() or 1) // JOBS_QUEUE_CONCURRENCY['render']))
+))
+
+# Progress events (Server-Sent Events at /api/clips/:id/events/ and /api/videos/:id/events/).
+# 'memory' only reaches clients of the process running the job; use 'redis' with Celery.
+PROGRESS_EVENTS_BACKEND = os.getenv(
+    'PROGRESS_EVENTS_BACKEND',
+    'redis' if JOBS_BACKEND == 'celery' else 'memory'
+)
+PROGRESS_EVENTS_REDIS_URL = os.getenv('PROGRESS_EVENTS_REDIS_URL', 'redis://localhost:6379/1')
+
 # Celery Settings (for async video processing)
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+CELERY_TASK_ALWAYS_EAGER = JOBS_BACKEND == 'eager'
+# Periodic jobs, run by `celery -A snapcast_backend beat`
+CELERY_BEAT_SCHEDULE = {
+    'collect-clip-storage': {
+        'task': 'clips.tasks.collect_clip_storage',
+        'schedule': CLIP_STORAGE_GC_INTERVAL_SECONDS,
+    },
+}
 
 # YouTube Integration Settings
 YOUTUBE_CLIENT_SECRETS_FILE = os.path.join(BASE_DIR, 'client_secrets.json')
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Video
+from .models import Video, AnalysisCacheEntry, TranscriptCacheEntry
 
 
 @admin.register(Video)
@@ -7,7 +7,10 @@ class VideoAdmin(admin.ModelAdmin):
     list_display = ['title', 'youtube_id', 'status', 'duration', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['title', 'youtube_id', 'youtube_url']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = [
+        'transcript', 'transcript_with_timestamps',
+        'queued_at', 'processing_at', 'completed_at', 'failed_at', 'created_at', 'updated_at'
+    ]
     fieldsets = (
         ('Video Info', {
             'fields': ('youtube_url', 'youtube_id', 'title', 'duration', 'thumbnail_url')
@@ -20,7 +23,23 @@ class VideoAdmin(admin.ModelAdmin):
             'fields': ('viral_moments', 'status', 'error_message')
         }),
         ('Timestamps', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('queued_at', 'processing_at', 'completed_at', 'failed_at', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(AnalysisCacheEntry)
+class AnalysisCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['key', 'model_name', 'hit_count', 'created_at', 'last_used_at']
+    search_fields = ['key', 'model_name']
+    readonly_fields = ['created_at', 'last_used_at']
+
+
+@admin.register(TranscriptCacheEntry)
+class TranscriptCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['youtube_id', 'language', 'segment_count', 'is_generated', 'hit_count', 'expires_at']
+    list_filter = ['language', 'is_generated']
+    search_fields = ['youtube_id']
+    exclude = ['data']
+    readonly_fields = ['created_at', 'last_used_at']
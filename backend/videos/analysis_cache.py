@@ -0,0 +1,98 @@
+import hashlib
+import json
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AnalysisCacheEntry
+
+
+class AnalysisCache:
+    """Content-addressed store for viral moment analyses
+
+    Entries live in the AnalysisCacheEntry table and expire after
+    ANALYSIS_CACHE_TTL_SECONDS; past ANALYSIS_CACHE_MAX_ENTRIES the least
+    recently used rows are dropped. Hit/miss counters are per process.
+    """
+
+    _stats = {'hits': 0, 'misses': 0}
+    _stats_lock = threading.Lock()
+
+    @staticmethod
+    def normalize_segments(segments):
+        """Reduce segments to what the prompt actually sees"""
+        return [
+            [round(seg['start'], 2), round(seg['duration'], 2), ' '.join(seg['text'].split())]
+            for seg in segments
+        ]
+
+    @classmethod
+    def make_key(cls, segments, prompt_version, model_name, generation_config):
+        """sha256 of (normalized transcript, prompt version, model, generation config)"""
+        payload = json.dumps(
+            {
+                'transcript': cls.normalize_segments(segments),
+                'prompt_version': prompt_version,
+                'model': model_name,
+                'config': generation_config,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(',', ':'),
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return cached moments or None"""
+        cutoff = timezone.now() - timedelta(seconds=settings.ANALYSIS_CACHE_TTL_SECONDS)
+        entry = AnalysisCacheEntry.objects.filter(key=key, created_at__gte=cutoff).first()
+
+        if entry is None:
+            self._count('misses')
+            return None
+
+        AnalysisCacheEntry.objects.filter(pk=entry.pk).update(
+            hit_count=F('hit_count') + 1,
+            last_used_at=timezone.now()
+        )
+        self._count('hits')
+        return entry.viral_moments
+
+    def set(self, key, moments, model_name=''):
+        """Store moments under key and enforce TTL/size limits"""
+        AnalysisCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                'viral_moments': moments,
+                'model_name': model_name,
+                'created_at': timezone.now(),
+                'last_used_at': timezone.now(),
+            }
+        )
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones over the limit"""
+        cutoff = timezone.now() - timedelta(seconds=settings.ANALYSIS_CACHE_TTL_SECONDS)
+        AnalysisCacheEntry.objects.filter(created_at__lt=cutoff).delete()
+
+        stale_ids = AnalysisCacheEntry.objects.order_by('-last_used_at').values_list(
+            'id', flat=True
+        )[settings.ANALYSIS_CACHE_MAX_ENTRIES:]
+        stale_ids = list(stale_ids)
+        if stale_ids:
+            AnalysisCacheEntry.objects.filter(id__in=stale_ids).delete()
+
+    @classmethod
+    def stats(cls):
+        """Return this process' hit/miss counters"""
+        with cls._stats_lock:
+            return dict(cls._stats)
+
+    @classmethod
+    def _count(cls, name):
+        with cls._stats_lock:
+            cls._stats[name] += 1
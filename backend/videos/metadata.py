@@ -0,0 +1,198 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+_youtube_client = None
+_youtube_client_lock = threading.Lock()
+_http = threading.local()
+
+# Thumbnail sizes tried in order by details_from_item
+THUMBNAIL_SIZES = ('high', 'medium', 'default')
+
+
+def get_youtube_client():
+    """Process-wide YouTube Data API client (build() parses the whole discovery document)"""
+    global _youtube_client
+    with _youtube_client_lock:
+        if _youtube_client is None:
+            from googleapiclient.discovery import build
+            _youtube_client = build('youtube', 'v3', developerKey=settings.YOUTUBE_API_KEY, cache_discovery=False)
+        return _youtube_client
+
+
+def thread_http():
+    """httplib2 connections are not thread-safe, so each thread executes requests on its own"""
+    if not hasattr(_http, 'client'):
+        import httplib2
+        _http.client = httplib2.Http(timeout=30)
+    return _http.client
+
+
+def parse_duration(duration_str):
+    """Parse ISO 8601 duration to seconds"""
+    pattern = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?')
+    match = pattern.match(duration_str)
+    if not match:
+        return 0
+
+    hours = int(match.group(1) or 0)
+    minutes = int(match.group(2) or 0)
+    seconds = int(match.group(3) or 0)
+
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def details_from_item(item):
+    """Our video details dict from a videos.list item
+
+    Not every video has every thumbnail size, so the largest one present is used.
+    """
+    snippet = item['snippet']
+    thumbnails = snippet.get('thumbnails') or {}
+    thumbnail = next((thumbnails[size] for size in THUMBNAIL_SIZES if size in thumbnails), {})
+    return {
+        'title': snippet.get('title', ''),
+        'description': snippet.get('description', ''),
+        'thumbnail_url': thumbnail.get('url', ''),
+        'duration': parse_duration(item.get('contentDetails', {}).get('duration', '')),
+    }
+
+
+class _Lookup:
+    """One video ID waiting for the batch that fetches it"""
+
+    def __init__(self, video_id):
+        self.video_id = video_id
+        self.details = None
+        self.done = threading.Event()
+
+
+class VideoMetadataFetcher:
+    """Batched, cached videos.list lookups
+
+    IDs requested within YOUTUBE_METADATA_BATCH_WINDOW_SECONDS of each other,
+    by one bulk call or by concurrent callers, are fetched together, 50 per
+    API call (the videos.list maximum). A video already being fetched is
+    waited for rather than requested twice. Results, including "no such
+    video", are kept for YOUTUBE_METADATA_CACHE_TTL_SECONDS; API errors and
+    items that could not be parsed are not cached.
+    """
+
+    BATCH_SIZE = 50
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # video_id -> (expires_at, details or None)
+        self._in_flight = {}  # video_id -> _Lookup
+        self._open_batch = None  # lookups collected during the current batch window
+        self._lock = threading.Lock()
+
+    def get(self, video_id):
+        """Details dict for one video, or None"""
+        return self.get_many([video_id])[video_id]
+
+    def get_many(self, video_ids):
+        """{video_id: details dict or None} for every requested ID"""
+        results = {}
+        waiting = []
+        mine = []
+        leader = False
+        now = time.monotonic()
+
+        with self._lock:
+            for video_id in dict.fromkeys(video_ids):
+                cached = self._cache.get(video_id)
+                if cached and cached[0] > now:
+                    self._cache.move_to_end(video_id)
+                    results[video_id] = cached[1]
+                    continue
+
+                lookup = self._in_flight.get(video_id)
+                if lookup is None:
+                    lookup = _Lookup(video_id)
+                    self._in_flight[video_id] = lookup
+                    mine.append(lookup)
+                waiting.append(lookup)
+
+            if mine:
+                if self._open_batch is None:
+                    self._open_batch = []
+                    leader = True
+                self._open_batch.extend(mine)
+
+        if leader:
+            # Let concurrent callers join this batch, then fetch it
+            try:
+                window = settings.YOUTUBE_METADATA_BATCH_WINDOW_SECONDS
+                if window > 0:
+                    time.sleep(window)
+            finally:
+                with self._lock:
+                    batch, self._open_batch = self._open_batch, None
+                self._fetch(batch)
+
+        for lookup in waiting:
+            lookup.done.wait()
+            results[lookup.video_id] = lookup.details
+        return results
+
+    def _fetch(self, batch):
+        """Run videos.list for the batch, 50 IDs per call, and wake its waiters"""
+        try:
+            for i in range(0, len(batch), self.BATCH_SIZE):
+                self._fetch_chunk(batch[i:i + self.BATCH_SIZE])
+        finally:
+            # Even if a chunk blew up, nobody may be left waiting on this batch
+            with self._lock:
+                for lookup in batch:
+                    if self._in_flight.get(lookup.video_id) is lookup:
+                        del self._in_flight[lookup.video_id]
+            for lookup in batch:
+                lookup.done.set()
+
+    def _fetch_chunk(self, chunk):
+        found = {}
+        uncacheable = {lookup.video_id for lookup in chunk}
+        try:
+            response = get_youtube_client().videos().list(
+                part='snippet,contentDetails',
+                id=','.join(lookup.video_id for lookup in chunk),
+                maxResults=self.BATCH_SIZE
+            ).execute(http=thread_http())
+            uncacheable = set()
+        except Exception as e:
+            print(f"YouTube API error: {e}")
+            response = {}
+
+        # One malformed item only costs its own video
+        for item in response.get('items', []):
+            try:
+                found[item['id']] = details_from_item(item)
+            except Exception as e:
+                print(f"YouTube API returned an unreadable item: {e}")
+                if isinstance(item, dict) and 'id' in item:
+                    uncacheable.add(item['id'])
+
+        expires_at = time.monotonic() + settings.YOUTUBE_METADATA_CACHE_TTL_SECONDS
+        with self._lock:
+            for lookup in chunk:
+                lookup.details = found.get(lookup.video_id)
+                if lookup.video_id not in uncacheable:
+                    self._cache[lookup.video_id] = (expires_at, lookup.details)
+                    self._cache.move_to_end(lookup.video_id)
+                self._in_flight.pop(lookup.video_id, None)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        for lookup in chunk:
+            lookup.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+video_metadata = VideoMetadataFetcher()
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+STATUS_RANK = {'completed': 0, 'processing': 1, 'pending': 2, 'failed': 3}
+
+
+def merge_duplicate_videos(apps, schema_editor):
+    """Keep one row per youtube_id (the most complete one) and move clips onto it"""
+    Video = apps.get_model('videos', 'Video')
+    Clip = apps.get_model('clips', 'Clip')
+
+    duplicated = (
+        Video.objects.values('youtube_id')
+        .annotate(rows=models.Count('id'))
+        .filter(rows__gt=1)
+        .values_list('youtube_id', flat=True)
+    )
+    for youtube_id in list(duplicated):
+        videos = sorted(
+            Video.objects.filter(youtube_id=youtube_id),
+            key=lambda video: (STATUS_RANK.get(video.status, 4), video.created_at)
+        )
+        keep, duplicates = videos[0], videos[1:]
+        duplicate_ids = [video.id for video in duplicates]
+        Clip.objects.filter(video_id__in=duplicate_ids).update(video_id=keep.id)
+        Video.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0002_analysiscacheentry'),
+        ('clips', '0011_clip_storage_tracking'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_videos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='video',
+            name='youtube_id',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
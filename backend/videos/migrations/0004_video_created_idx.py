@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0003_video_unique_youtube_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['-created_at'], name='video_created_idx'),
+        ),
+    ]
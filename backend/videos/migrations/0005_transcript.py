@@ -0,0 +1,144 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:05
+
+import struct
+import sys
+import zlib
+from array import array
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of the SCT1 format from videos.transcript_store, so this
+# migration keeps writing (and reading) exactly this version whatever the
+# live module changes to later.
+MAGIC = b'SCT1'
+HEADER = struct.Struct('<4sI')
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def pack_segments(segments):
+    """SCT1 payload for a list of segment dicts: (segment count, text length, bytes)"""
+    starts = array('d')
+    durations = array('d')
+    offsets = array('I', [0])
+    texts = []
+    position = 0
+    for seg in segments:
+        encoded = str(seg.get('text', '')).encode('utf-8')
+        starts.append(float(seg.get('start', 0)))
+        durations.append(float(seg.get('duration', 0)))
+        texts.append(encoded)
+        position += len(encoded) + 1
+        offsets.append(position)
+    blob = b' '.join(texts) + b' ' if texts else b''
+
+    parts = [HEADER.pack(MAGIC, len(starts))]
+    for column in (starts, durations, offsets):
+        parts.append(_little_endian(column).tobytes())
+    parts.append(blob)
+    return len(starts), len(blob[:-1].decode('utf-8')), zlib.compress(b''.join(parts), 6)
+
+
+def unpack_segments(data):
+    """Inverse of pack_segments(): (full text, list of segment dicts)"""
+    if not data:
+        return '', []
+
+    raw = zlib.decompress(bytes(data))
+    magic, count = HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError(f"Not a packed transcript (magic {magic!r})")
+
+    position = HEADER.size
+    columns = []
+    for typecode, length in (('d', count), ('d', count), ('I', count + 1)):
+        values = array(typecode)
+        size = values.itemsize * length
+        values.frombytes(raw[position:position + size])
+        columns.append(_little_endian(values))
+        position += size
+    starts, durations, offsets = columns
+    blob = raw[position:]
+
+    segments = [
+        {
+            'text': blob[offsets[i]:offsets[i + 1] - 1].decode('utf-8'),
+            'start': starts[i],
+            'duration': durations[i],
+        }
+        for i in range(count)
+    ]
+    return blob[:-1].decode('utf-8'), segments
+
+
+def pack_transcripts(apps, schema_editor):
+    """Move Video.transcript/transcript_with_timestamps into packed Transcript rows"""
+    Video = apps.get_model('videos', 'Video')
+    Transcript = apps.get_model('videos', 'Transcript')
+
+    batch = []
+    rows = Video.objects.values_list('id', 'duration', 'transcript', 'transcript_with_timestamps')
+    for video_id, duration, text, segments in rows.iterator(chunk_size=200):
+        if not isinstance(segments, list) or not segments:
+            if not text:
+                continue
+            # Text without timings: keep it as one segment spanning the video
+            segments = [{'text': text, 'start': 0, 'duration': duration or 0}]
+
+        segment_count, text_length, data = pack_segments(segments)
+        batch.append(Transcript(
+            video_id=video_id,
+            segment_count=segment_count,
+            text_length=text_length,
+            data=data
+        ))
+        if len(batch) >= 200:
+            Transcript.objects.bulk_create(batch)
+            batch = []
+    Transcript.objects.bulk_create(batch)
+
+
+def unpack_transcripts(apps, schema_editor):
+    Video = apps.get_model('videos', 'Video')
+    Transcript = apps.get_model('videos', 'Transcript')
+
+    for record in Transcript.objects.iterator(chunk_size=200):
+        text, segments = unpack_segments(record.data)
+        Video.objects.filter(id=record.video_id).update(
+            transcript=text,
+            transcript_with_timestamps=segments
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0004_video_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transcript',
+            fields=[
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='transcript_record', serialize=False, to='videos.video')),
+                ('segment_count', models.IntegerField(default=0)),
+                ('text_length', models.IntegerField(default=0)),
+                ('data', models.BinaryField(default=bytes)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(pack_transcripts, unpack_transcripts),
+        migrations.RemoveField(
+            model_name='video',
+            name='transcript',
+        ),
+        migrations.RemoveField(
+            model_name='video',
+            name='transcript_with_timestamps',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0005_transcript'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='processing_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
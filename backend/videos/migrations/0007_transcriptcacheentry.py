@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0006_video_stage_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('youtube_id', models.CharField(max_length=100)),
+                ('language', models.CharField(blank=True, max_length=20)),
+                ('languages', models.CharField(max_length=200)),
+                ('is_generated', models.BooleanField(default=False)),
+                ('segment_count', models.IntegerField(default=0)),
+                ('data', models.BinaryField(default=bytes)),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-last_used_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='transcriptcacheentry',
+            constraint=models.UniqueConstraint(fields=('youtube_id', 'language'), name='transcript_cache_video_language'),
+        ),
+    ]
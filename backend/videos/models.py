@@ -1,8 +1,12 @@
 from django.db import models
+from django.utils.functional import cached_property
 import json
+from .transcript_index import transcript_index_cache
+from .transcript_store import PackedTranscript
+from snapcast_backend.models import StatusTransitionMixin
 
 
-class Video(models.Model):
+class Video(StatusTransitionMixin, models.Model):
     """Model to store YouTube video information and analysis results"""
 
     STATUS_CHOICES = [
@@ -13,14 +17,12 @@ class Video(models.Model):
     ]
 
     youtube_url = models.URLField(max_length=500)
-    youtube_id = models.CharField(max_length=100)
+    youtube_id = models.CharField(max_length=100, unique=True)
     title = models.CharField(max_length=500, blank=True)
     duration = models.IntegerField(null=True, blank=True)  # in seconds
     thumbnail_url = models.URLField(max_length=500, blank=True)
 
-    # Transcript data
-    transcript = models.TextField(blank=True)
-    transcript_with_timestamps = models.JSONField(default=dict, blank=True)
+    # Transcript data lives in Transcript (see transcript, set_transcript)
 
     # Analysis results
     viral_moments = models.JSONField(default=list, blank=True)
@@ -29,17 +31,174 @@ class Video(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     error_message = models.TextField(blank=True)
 
+    # When the current analysis entered each stage (see STAGE_TIMESTAMPS)
+    queued_at = models.DateTimeField(null=True, blank=True)
+    processing_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Default ordering / cursor pagination of the video list
+            models.Index(fields=['-created_at'], name='video_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title or self.youtube_id} - {self.status}"
 
+    FINAL_STATUSES = ('completed', 'failed')
+
+    STAGE_TIMESTAMPS = {
+        'pending': 'queued_at',
+        'processing': 'processing_at',
+        'completed': 'completed_at',
+        'failed': 'failed_at',
+    }
+
+    @property
+    def progress_channel(self):
+        """Event channel for this video's analysis progress (see snapcast_backend.events)"""
+        return f"video:{self.pk}"
+
+    def progress_snapshot(self, stage=None):
+        """Compact progress payload pushed to clients"""
+        return {
+            'id': self.pk,
+            'status': self.status,
+            'stage': stage or self.status,
+            'error_message': self.error_message,
+        }
+
     def get_viral_moments_sorted(self):
         """Return viral moments sorted by score descending"""
         moments = self.viral_moments if isinstance(self.viral_moments, list) else []
         return sorted(moments, key=lambda x: x.get('viral_score', 0), reverse=True)
+
+    def get_transcript_record(self):
+        """The Transcript row or None, fetched on first use
+
+        ``select_related('transcript_record')`` loads it with the video.
+        """
+        if self.pk is None:
+            return None
+        try:
+            return self.transcript_record
+        except Transcript.DoesNotExist:
+            return None
+
+    def get_transcript(self):
+        """PackedTranscript of this video (empty when there is none)"""
+        record = self.get_transcript_record()
+        return record.packed if record else PackedTranscript()
+
+    @property
+    def transcript(self):
+        """Full transcript text"""
+        return self.get_transcript().text
+
+    @property
+    def transcript_with_timestamps(self):
+        """Transcript segments as ``{'text', 'start', 'duration'}`` dicts"""
+        return self.get_transcript().segments()
+
+    def has_transcript(self):
+        """Whether a non-empty transcript is stored, without unpacking it"""
+        record = self.get_transcript_record()
+        return bool(record and record.text_length)
+
+    def set_transcript(self, segments):
+        """Pack and store ``{'text', 'start', 'duration'}`` segments"""
+        packed = PackedTranscript.from_segments(segments)
+        record, _ = Transcript.objects.update_or_create(
+            video=self,
+            defaults={
+                'data': packed.to_bytes(),
+                'segment_count': len(packed),
+                'text_length': len(packed.text),
+            }
+        )
+        record.packed = packed
+        self.transcript_record = record
+
+    def get_transcript_index(self):
+        """Return the cached TranscriptIndex for the transcript segments"""
+        # The Transcript row's updated_at moves on every store, so a changed transcript gets a fresh index
+        record = self.get_transcript_record()
+        key = (self.pk, record.updated_at if record else None)
+        return transcript_index_cache.get(key, lambda: self.transcript_with_timestamps)
+
+
+class Transcript(models.Model):
+    """Transcript of a video, packed (see transcript_store) and kept out of the Video row"""
+
+    video = models.OneToOneField(
+        Video,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='transcript_record'
+    )
+    segment_count = models.IntegerField(default=0)
+    text_length = models.IntegerField(default=0)  # in characters
+    data = models.BinaryField(default=bytes)  # PackedTranscript.to_bytes()
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Transcript of video {self.video_id} - {self.segment_count} segments"
+
+    @cached_property
+    def packed(self):
+        return PackedTranscript.from_bytes(self.data)
+
+
+class AnalysisCacheEntry(models.Model):
+    """Cached viral moment analysis, keyed by a hash of everything that shapes the result"""
+
+    key = models.CharField(max_length=64, unique=True)  # sha256 hex
+    model_name = models.CharField(max_length=100, blank=True)
+    viral_moments = models.JSONField(default=list)
+    hit_count = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-last_used_at']
+
+    def __str__(self):
+        return f"{self.key[:12]} ({self.model_name}) - {self.hit_count} hits"
+
+
+class TranscriptCacheEntry(models.Model):
+    """Fetched YouTube transcript, or the lack of one, keyed by video and language"""
+
+    youtube_id = models.CharField(max_length=100)
+    # Language the transcript came in; '' records that none of `languages` had one
+    language = models.CharField(max_length=20, blank=True)
+    languages = models.CharField(max_length=200)  # preference list that was tried, comma separated
+    is_generated = models.BooleanField(default=False)
+    segment_count = models.IntegerField(default=0)
+    data = models.BinaryField(default=bytes)  # PackedTranscript.to_bytes()
+    hit_count = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-last_used_at']
+        constraints = [
+            models.UniqueConstraint(fields=['youtube_id', 'language'], name='transcript_cache_video_language'),
+        ]
+
+    def __str__(self):
+        return f"{self.youtube_id} [{self.language or 'none'}] - {self.segment_count} segments"
+
+    @cached_property
+    def packed(self):
+        return PackedTranscript.from_bytes(self.data)
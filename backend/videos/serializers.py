@@ -1,12 +1,75 @@
 from rest_framework import serializers
 from .models import Video
+from clips.models import Clip
+from snapcast_backend.serializers import SparseFieldsetsMixin
 
 
-class VideoSerializer(serializers.ModelSerializer):
-    """Serializer for Video model"""
+class VideoSummarySerializer(serializers.ModelSerializer):
+    """Minimal Video representation for embedding in other resources"""
+
+    class Meta:
+        model = Video
+        fields = [
+            'id',
+            'youtube_url',
+            'youtube_id',
+            'title',
+            'duration',
+            'thumbnail_url',
+            'status',
+        ]
+        read_only_fields = fields
+
+
+class VideoListSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    """Serializer for Video lists: no transcript, moments only as a count"""
+
+    viral_moments_count = serializers.SerializerMethodField()
+
+    expandable_fields = {
+        'viral_moments_sorted': lambda: serializers.SerializerMethodField(),
+    }
+
+    class Meta:
+        model = Video
+        fields = [
+            'id',
+            'youtube_url',
+            'youtube_id',
+            'title',
+            'duration',
+            'thumbnail_url',
+            'viral_moments_count',
+            'status',
+            'error_message',
+            'created_at',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+    def get_viral_moments_count(self, obj):
+        return len(obj.viral_moments) if isinstance(obj.viral_moments, list) else 0
+
+    def get_viral_moments_sorted(self, obj):
+        return obj.get_viral_moments_sorted()
+
+
+class VideoSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    """Serializer for Video model
+
+    The transcript is served by the /transcript/ action; ``?expand=transcript``
+    or ``?expand=transcript_with_timestamps`` inlines it. Moments are sent once,
+    sorted; ``?expand=viral_moments`` adds them in the order the model returned.
+    """
 
     viral_moments_sorted = serializers.SerializerMethodField()
 
+    expandable_fields = {
+        'transcript': lambda: serializers.CharField(read_only=True),
+        'transcript_with_timestamps': lambda: serializers.JSONField(read_only=True),
+        'viral_moments': lambda: serializers.JSONField(read_only=True),
+    }
+
     class Meta:
         model = Video
         fields = [
@@ -16,9 +79,6 @@ class VideoSerializer(serializers.ModelSerializer):
             'title',
             'duration',
             'thumbnail_url',
-            'transcript',
-            'transcript_with_timestamps',
-            'viral_moments',
             'viral_moments_sorted',
             'status',
             'error_message',
@@ -32,6 +92,19 @@ class VideoSerializer(serializers.ModelSerializer):
         return obj.get_viral_moments_sorted()
 
 
+class VideoTranscriptSerializer(serializers.ModelSerializer):
+    """Serializer for the transcript of a video"""
+
+    class Meta:
+        model = Video
+        fields = [
+            'id',
+            'transcript',
+            'transcript_with_timestamps',
+        ]
+        read_only_fields = fields
+
+
 class VideoCreateSerializer(serializers.Serializer):
     """Serializer for creating a new video analysis"""
     youtube_url = serializers.URLField(required=True)
@@ -41,3 +114,25 @@ class VideoCreateSerializer(serializers.Serializer):
         if 'youtube.com' not in value and 'youtu.be' not in value:
             raise serializers.ValidationError("Please provide a valid YouTube URL")
         return value
+
+
+class VideoReanalyzeSerializer(serializers.Serializer):
+    """Serializer for re-analysis options"""
+    fresh = serializers.BooleanField(default=False)  # skip the analysis cache
+
+
+class VideoRenderClipsSerializer(serializers.Serializer):
+    """Serializer for rendering several viral moments at once"""
+    moment_indices = serializers.ListField(
+        child=serializers.IntegerField(min_value=0),
+        required=False,
+        allow_empty=False
+    )
+    top_n = serializers.IntegerField(min_value=1, required=False)
+    profile = serializers.ChoiceField(choices=Clip.ENCODING_PROFILE_CHOICES, required=False)
+
+    def validate(self, data):
+        """Validate that exactly one of moment_indices / top_n is given"""
+        if ('moment_indices' in data) == ('top_n' in data):
+            raise serializers.ValidationError("Provide either moment_indices or top_n")
+        return data
@@ -1,10 +1,35 @@
+import hashlib
+import json
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import google.generativeai as genai
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 from django.conf import settings
-from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api import (
+    AgeRestricted,
+    InvalidVideoId,
+    NoTranscriptFound,
+    TranscriptsDisabled,
+    VideoUnavailable,
+    VideoUnplayable,
+    YouTubeTranscriptApi,
+)
 from .models import Video
+from .transcript_index import TranscriptIndex
+from .analysis_cache import AnalysisCache
+from .metadata import get_youtube_client, parse_duration, video_metadata
+from .transcript_cache import TranscriptCache
+
+# Errors that mean the video has no transcript we can use (as opposed to
+# YouTube blocking or failing the request), cached as "no transcript"
+NO_TRANSCRIPT_ERRORS = (
+    NoTranscriptFound,
+    TranscriptsDisabled,
+    VideoUnavailable,
+    VideoUnplayable,
+    AgeRestricted,
+    InvalidVideoId,
+)
 
 
 class YouTubeService:
@@ -12,7 +37,11 @@ class YouTubeService:
 
     def __init__(self):
         self.api_key = settings.YOUTUBE_API_KEY
-        self.youtube = build('youtube', 'v3', developerKey=self.api_key)
+
+    @property
+    def youtube(self):
+        """Shared Data API client (see videos.metadata)"""
+        return get_youtube_client()
 
     @staticmethod
     def extract_video_id(url):
@@ -30,132 +59,166 @@ class YouTubeService:
         return None
 
     def get_video_details(self, video_id):
-        """Get video details from YouTube API"""
-        try:
-            response = self.youtube.videos().list(
-                part='snippet,contentDetails,statistics',
-                id=video_id
-            ).execute()
-
-            if not response['items']:
-                return None
-
-            item = response['items'][0]
-            snippet = item['snippet']
-            content_details = item['contentDetails']
-
-            # Parse duration (PT format)
-            duration_str = content_details['duration']
-            duration = self._parse_duration(duration_str)
-
-            return {
-                'title': snippet['title'],
-                'description': snippet['description'],
-                'thumbnail_url': snippet['thumbnails']['high']['url'],
-                'duration': duration,
-            }
-        except HttpError as e:
-            print(f"YouTube API error: {e}")
-            return None
+        """Get video details from YouTube API (batched with concurrent lookups, cached)"""
+        return video_metadata.get(video_id)
+
+    def get_videos_details(self, video_ids):
+        """{video_id: details or None} for many videos, 50 per API call"""
+        return video_metadata.get_many(video_ids)
 
     @staticmethod
     def _parse_duration(duration_str):
         """Parse ISO 8601 duration to seconds"""
-        import re
-        pattern = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?')
-        match = pattern.match(duration_str)
-        if not match:
-            return 0
+        return parse_duration(duration_str)
 
-        hours = int(match.group(1) or 0)
-        minutes = int(match.group(2) or 0)
-        seconds = int(match.group(3) or 0)
+    @staticmethod
+    def get_transcript(video_id, languages=None, use_cache=True):
+        """Get video transcript with timestamps using youtube-transcript-api v1.2.3+
+
+        Languages are tried in order (TRANSCRIPT_LANGUAGES by default); the
+        result's ``language`` is the one found, '' when there was none.
+        Transcripts and "no transcript" answers come from TranscriptCache
+        when it has them.
+        """
+        languages = list(languages or settings.TRANSCRIPT_LANGUAGES)
+        cache = TranscriptCache()
+
+        if use_cache:
+            entry = cache.get(video_id, languages)
+            if entry is not None:
+                print(f"✓ Transcript cache hit for {video_id} ({entry.language or 'no transcript'})")
+                return YouTubeService._transcript_result(entry.packed.segments(), entry.language)
+
+        try:
+            segments, language, is_generated = YouTubeService._fetch_transcript(video_id, languages)
+        except Exception as e:
+            YouTubeService._transcript_failed(cache, video_id, languages, e)
+            return YouTubeService._transcript_result([], '')
+
+        cache.set(video_id, languages, language, segments, is_generated=is_generated)
+        return YouTubeService._transcript_result(segments, language)
+
+    @classmethod
+    def prefetch_transcripts(cls, video_ids, languages=None, max_workers=None):
+        """Warm the transcript cache for many videos at once; returns {video_id: found}
+
+        At most TRANSCRIPT_PREFETCH_WORKERS (or ``max_workers``) YouTube
+        requests run at a time, so a large batch doesn't get the server's IP
+        blocked. The cache is read and written from the calling thread only.
+        """
+        languages = list(languages or settings.TRANSCRIPT_LANGUAGES)
+        max_workers = max_workers or settings.TRANSCRIPT_PREFETCH_WORKERS
+        video_ids = list(dict.fromkeys(video_ids))
+        cache = TranscriptCache()
+        found = {}
+
+        for video_id in video_ids:
+            entry = cache.get(video_id, languages)
+            if entry is not None:
+                found[video_id] = bool(entry.language)
+
+        missing = [video_id for video_id in video_ids if video_id not in found]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+                futures = {
+                    pool.submit(cls._fetch_transcript, video_id, languages): video_id
+                    for video_id in missing
+                }
+                for future in as_completed(futures):
+                    video_id = futures[future]
+                    try:
+                        segments, language, is_generated = future.result()
+                    except Exception as e:
+                        cls._transcript_failed(cache, video_id, languages, e)
+                        found[video_id] = False
+                    else:
+                        cache.set(video_id, languages, language, segments, is_generated=is_generated)
+                        found[video_id] = True
 
-        return hours * 3600 + minutes * 60 + seconds
+        return {video_id: found[video_id] for video_id in video_ids}
 
     @staticmethod
-    def get_transcript(video_id):
-        """Get video transcript with timestamps using youtube-transcript-api v1.2.3+"""
-        try:
-            print(f"Trying to get transcript for video: {video_id}")
-
-            # Initialize API instance (v1.2.3+ uses instance-based approach)
-            ytt_api = YouTubeTranscriptApi()
-
-            # Fetch transcript with language preference
-            # Tries languages in order: PT, PT-BR, EN
-            transcript_data = ytt_api.fetch(
-                video_id,
-                languages=['pt', 'pt-BR', 'en']
-            )
-
-            print(f"✓ Got transcript with {len(transcript_data)} entries")
-
-            # Format transcript with timestamps
-            # Note: In v1.2.3, entries are FetchedTranscriptSnippet objects
-            formatted_transcript = []
-            full_text = []
-
-            for entry in transcript_data:
-                # Access attributes directly (not dict keys)
-                text = entry.text if hasattr(entry, 'text') else str(entry)
-                start = entry.start if hasattr(entry, 'start') else 0
-                duration = entry.duration if hasattr(entry, 'duration') else 0
-
-                formatted_transcript.append({
-                    'text': text,
-                    'start': start,
-                    'duration': duration
-                })
-                full_text.append(text)
-
-            result = {
-                'transcript': ' '.join(full_text),
-                'transcript_with_timestamps': formatted_transcript
-            }
-
-            print(f"✓ Successfully formatted transcript: {len(full_text)} segments, {len(' '.join(full_text))} chars")
-            return result
+    def _fetch_transcript(video_id, languages):
+        """Ask YouTube for the transcript; returns (segments, language, is_generated)"""
+        print(f"Trying to get transcript for video: {video_id}")
 
-        except Exception as e:
-            print(f"❌ Transcript error: {e}")
-            import traceback
-            traceback.print_exc()
-            return {
-                'transcript': '',
-                'transcript_with_timestamps': []
-            }
+        # Initialize API instance (v1.2.3+ uses instance-based approach)
+        ytt_api = YouTubeTranscriptApi()
 
+        # Fetch transcript with language preference
+        transcript_data = ytt_api.fetch(video_id, languages=languages)
 
-class GeminiService:
-    """Service for analyzing video content with Gemini API"""
+        print(f"✓ Got transcript with {len(transcript_data)} entries")
 
-    def __init__(self):
+        # Format transcript with timestamps
+        # Note: In v1.2.3, entries are FetchedTranscriptSnippet objects
+        formatted_transcript = []
+
+        for entry in transcript_data:
+            # Access attributes directly (not dict keys)
+            text = entry.text if hasattr(entry, 'text') else str(entry)
+            start = entry.start if hasattr(entry, 'start') else 0
+            duration = entry.duration if hasattr(entry, 'duration') else 0
+
+            formatted_transcript.append({
+                'text': text,
+                'start': start,
+                'duration': duration
+            })
+
+        language = getattr(transcript_data, 'language_code', languages[0])
+        print(f"✓ Successfully formatted transcript ({language}): {len(formatted_transcript)} segments")
+        return formatted_transcript, language, getattr(transcript_data, 'is_generated', False)
+
+    @staticmethod
+    def _transcript_failed(cache, video_id, languages, error):
+        """Log a failed fetch; remember it when YouTube says there is no transcript"""
+        if isinstance(error, NO_TRANSCRIPT_ERRORS):
+            # A definite answer, unlike blocked or failed requests, so it is cached (briefly)
+            print(f"❌ No transcript for {video_id} in {languages}: {type(error).__name__}")
+            cache.set_missing(video_id, languages)
+            return
+
+        print(f"❌ Transcript error: {error}")
+        import traceback
+        traceback.print_exception(error)
+
+    @staticmethod
+    def _transcript_result(segments, language):
+        return {
+            'transcript': ' '.join(segment['text'] for segment in segments),
+            'transcript_with_timestamps': segments,
+            'language': language,
+        }
+
+
+class GeminiClient:
+    """Default LLM client for GeminiService, backed by google-generativeai
+
+    Any object with a ``generate(prompt) -> str`` method can be passed to
+    GeminiService instead, e.g. a local fake for offline runs.
+    """
+
+    def __init__(self, model_name='gemini-2.5-pro', generation_config=None):
         genai.configure(api_key=settings.GEMINI_API_KEY)
+        self.model_name = model_name
+        self.generation_config = generation_config or {
+            'temperature': 0.7,
+            'max_output_tokens': 8192,
+        }
         self.model = genai.GenerativeModel(
-            'gemini-2.5-pro',
-            generation_config={
-                'temperature': 0.7,
-                'max_output_tokens': 8192,
-            }
+            model_name,
+            generation_config=self.generation_config
         )
 
-    def analyze_viral_moments(self, transcript, transcript_with_timestamps):
-        """Analyze transcript and identify viral moments"""
-
-        print(f"📊 Analyzing {len(transcript)} chars, {len(transcript_with_timestamps)} segments")
-
-        # Build structured transcript with timestamps for better analysis
-        structured_transcript = []
-        for seg in transcript_with_timestamps:
-            time_formatted = f"[{int(seg['start']//60):02d}:{int(seg['start']%60):02d}]"
-            structured_transcript.append(f"{time_formatted} {seg['text']}")
+    def generate(self, prompt):
+        """Return the text response for a prompt"""
+        return self.model.generate_content(prompt).text
 
-        full_transcript = "\n".join(structured_transcript)
 
-        prompt = f"""Você é especialista em identificar momentos virais em podcasts/vídeos para Reels/Shorts/TikTok.
+PROMPT_TEMPLATE = """Você é especialista em identificar momentos virais em podcasts/vídeos para Reels/Shorts/TikTok.
 
-Analise TODA esta transcrição e identifique os 5-10 momentos com maior potencial viral.
+{scope}
 
 Critérios: histórias impactantes, humor, conselhos práticos, polêmicas, revelações.
 
@@ -175,54 +238,240 @@ CRÍTICO:
 - Ordene por viral_score (maior primeiro)
 
 Transcrição com timestamps:
-{full_transcript}
+{transcript}
 """
 
-        try:
-            print(f"🤖 Calling Gemini 2.5 Pro to analyze transcript...")
-
-            # Add retry logic
-            import time
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = self.model.generate_content(prompt)
-                    break
-                except Exception as retry_error:
-                    if attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 3
-                        print(f"⚠️ Attempt {attempt + 1} failed, retrying in {wait_time}s...")
-                        time.sleep(wait_time)
-                    else:
-                        raise retry_error
-
-            result_text = response.text.strip()
+FULL_SCOPE = "Analise TODA esta transcrição e identifique os 5-10 momentos com maior potencial viral."
+WINDOW_SCOPE = (
+    "Esta é a parte {part} de {total} de um episódio longo. "
+    "Identifique os 3-5 momentos com maior potencial viral NESTE trecho."
+)
 
-            # Clean up the response to extract JSON
-            if '```json' in result_text:
-                result_text = result_text.split('```json')[1].split('```')[0]
-            elif '```' in result_text:
-                result_text = result_text.split('```')[1].split('```')[0]
+# Changes whenever the prompt wording changes, invalidating cached analyses
+PROMPT_VERSION = hashlib.sha256(
+    (PROMPT_TEMPLATE + FULL_SCOPE + WINDOW_SCOPE).encode('utf-8')
+).hexdigest()[:12]
 
-            # Parse JSON
-            import json
-            moments = json.loads(result_text.strip())
 
-            print(f"✓ Gemini returned {len(moments)} viral moments")
+class GeminiService:
+    """Service for analyzing video content with Gemini API"""
 
-            # Validate and filter moments
-            validated_moments = []
-            for moment in moments:
-                duration = moment.get('end_time', 0) - moment.get('start_time', 0)
-                if 15 <= duration <= 90 and moment.get('viral_score', 0) > 0:
-                    moment['duration'] = duration
-                    validated_moments.append(moment)
+    TOP_N = 10
+    # Two candidates overlapping by more than this share of the shorter one are duplicates
+    DUPLICATE_OVERLAP = 0.5
+
+    def __init__(self, client=None):
+        self.client = client or GeminiClient()
+
+    def analyze_viral_moments(self, transcript, transcript_with_timestamps, chunked=None, use_cache=True):
+        """Analyze transcript and identify viral moments
+
+        Long transcripts (over VIRAL_ANALYSIS_CHUNK_THRESHOLD_SECONDS) are
+        split into overlapping windows that are analyzed concurrently and
+        merged; pass ``chunked`` to force either mode. Results are served
+        from AnalysisCache unless ``use_cache`` is False.
+        """
+        segments = transcript_with_timestamps if isinstance(transcript_with_timestamps, list) else []
+
+        print(f"📊 Analyzing {len(transcript)} chars, {len(segments)} segments")
+
+        if chunked is None:
+            chunked = self._transcript_span(segments) > settings.VIRAL_ANALYSIS_CHUNK_THRESHOLD_SECONDS
+
+        cache = AnalysisCache()
+        cache_key = self._cache_key(segments, chunked)
+        if use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                print(f"✓ Analysis cache hit ({len(cached)} moments)")
+                return cached
+
+        if chunked:
+            moments = self._analyze_chunked(segments)
+        else:
+            moments = self._analyze_full(segments)
+
+        # An empty result usually means the call failed; don't pin it in the cache
+        if moments:
+            cache.set(cache_key, moments, model_name=self._model_name())
+        return moments
+
+    def _model_name(self):
+        return getattr(self.client, 'model_name', type(self.client).__name__)
+
+    def _cache_key(self, segments, chunked):
+        """Content address of an analysis: transcript, prompt, model and settings"""
+        generation_config = {
+            'client': getattr(self.client, 'generation_config', None),
+            'chunked': chunked,
+            'top_n': self.TOP_N,
+        }
+        if chunked:
+            generation_config['window'] = settings.VIRAL_ANALYSIS_WINDOW_SECONDS
+            generation_config['overlap'] = settings.VIRAL_ANALYSIS_WINDOW_OVERLAP_SECONDS
+
+        return AnalysisCache.make_key(segments, PROMPT_VERSION, self._model_name(), generation_config)
+
+    def _analyze_full(self, segments):
+        """Analyze the whole transcript in a single prompt"""
+        try:
+            print(f"🤖 Calling Gemini to analyze transcript...")
+            prompt = self._build_prompt(segments, FULL_SCOPE)
+            moments = self._validate(self._parse_moments(self._generate(prompt)))
+            moments.sort(key=lambda m: m.get('viral_score', 0), reverse=True)
 
-            print(f"✓ {len(validated_moments)} moments validated")
-            return validated_moments[:10]  # Return top 10
+            print(f"✓ {len(moments)} moments validated")
+            return moments[:self.TOP_N]  # Return top 10
 
         except Exception as e:
             print(f"❌ Gemini analysis error: {e}")
             import traceback
             traceback.print_exc()
             return []
+
+    def _analyze_chunked(self, segments):
+        """Map: analyze each time window concurrently. Reduce: dedupe and re-rank."""
+        windows = self.split_windows(
+            segments,
+            settings.VIRAL_ANALYSIS_WINDOW_SECONDS,
+            settings.VIRAL_ANALYSIS_WINDOW_OVERLAP_SECONDS
+        )
+        print(f"🤖 Chunked analysis: {len(windows)} windows")
+
+        def analyze_window(numbered_window):
+            part, window = numbered_window
+            scope = WINDOW_SCOPE.format(part=part, total=len(windows))
+            try:
+                return self._validate(self._parse_moments(self._generate(self._build_prompt(window, scope))))
+            except Exception as e:
+                print(f"❌ Window {part}/{len(windows)} failed: {e}")
+                return []
+
+        max_workers = max(1, min(settings.VIRAL_ANALYSIS_MAX_WORKERS, len(windows)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(analyze_window, enumerate(windows, start=1))
+            candidates = [moment for moments in results for moment in moments]
+
+        merged = self.merge_moments(candidates, self.TOP_N)
+        print(f"✓ {len(candidates)} candidates merged into {len(merged)} moments")
+        return merged
+
+    @staticmethod
+    def _transcript_span(segments):
+        """Seconds between the first segment start and the last segment end"""
+        if not segments:
+            return 0
+        return max(seg['start'] + seg['duration'] for seg in segments) - min(seg['start'] for seg in segments)
+
+    @staticmethod
+    def split_windows(segments, window_seconds, overlap_seconds):
+        """Split segments into time windows that overlap by overlap_seconds"""
+        index = TranscriptIndex(segments)
+        if not len(index):
+            return []
+
+        step = max(window_seconds - overlap_seconds, 1)
+        first_start = index.starts[0]
+        last_end = index.max_ends[-1]
+
+        windows = []
+        window_start = first_start
+        while window_start < last_end:
+            window = index.overlapping(window_start, window_start + window_seconds)
+            if window:
+                windows.append(window)
+            window_start += step
+        return windows
+
+    @classmethod
+    def merge_moments(cls, candidates, top_n):
+        """Keep the best-scored moment among overlapping duplicates and return the top N"""
+        ranked = sorted(candidates, key=lambda m: m.get('viral_score', 0), reverse=True)
+
+        kept = []
+        for moment in ranked:
+            if not any(cls._is_duplicate(moment, other) for other in kept):
+                kept.append(moment)
+            if len(kept) == top_n:
+                break
+        return kept
+
+    @classmethod
+    def _is_duplicate(cls, a, b):
+        overlap = min(a['end_time'], b['end_time']) - max(a['start_time'], b['start_time'])
+        shorter = min(a['duration'], b['duration'])
+        return overlap > 0 and overlap >= cls.DUPLICATE_OVERLAP * shorter
+
+    @staticmethod
+    def _build_prompt(segments, scope):
+        """Render the prompt for a list of transcript segments"""
+        # Build structured transcript with timestamps for better analysis
+        structured_transcript = []
+        for seg in segments:
+            time_formatted = f"[{int(seg['start']//60):02d}:{int(seg['start']%60):02d}]"
+            structured_transcript.append(f"{time_formatted} {seg['text']}")
+
+        return PROMPT_TEMPLATE.format(scope=scope, transcript="\n".join(structured_transcript))
+
+    def _generate(self, prompt):
+        """Call the LLM client with retries"""
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                return self.client.generate(prompt)
+            except Exception as retry_error:
+                if attempt < max_retries - 1:
+                    wait_time = (attempt + 1) * 3
+                    print(f"⚠️ Attempt {attempt + 1} failed, retrying in {wait_time}s...")
+                    time.sleep(wait_time)
+                else:
+                    raise retry_error
+
+    @staticmethod
+    def _parse_moments(result_text):
+        """Extract the JSON array from a model response"""
+        result_text = result_text.strip()
+
+        # Clean up the response to extract JSON
+        if '```json' in result_text:
+            result_text = result_text.split('```json')[1].split('```')[0]
+        elif '```' in result_text:
+            result_text = result_text.split('```')[1].split('```')[0]
+
+        return json.loads(result_text.strip())
+
+    @staticmethod
+    def _validate(moments):
+        """Keep 15-90s moments with a positive score, adding their duration
+
+        Items without numeric start_time/end_time are dropped: the model does
+        not always follow the format, and merging needs both.
+        """
+        if not isinstance(moments, list):
+            return []
+
+        validated_moments = []
+        for moment in moments:
+            try:
+                start_time = GeminiService._number(moment['start_time'])
+                end_time = GeminiService._number(moment['end_time'])
+                viral_score = GeminiService._number(moment.get('viral_score', 0))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                print(f"⚠️ Skipping malformed moment: {str(moment)[:100]}")
+                continue
+
+            duration = end_time - start_time
+            if 15 <= duration <= 90 and viral_score > 0:
+                moment.update(start_time=start_time, end_time=end_time, viral_score=viral_score)
+                moment['duration'] = duration
+                validated_moments.append(moment)
+        return validated_moments
+
+    @staticmethod
+    def _number(value):
+        """int/float as is, numeric strings converted; anything else raises"""
+        if isinstance(value, bool):
+            raise TypeError(f"not a number: {value!r}")
+        if isinstance(value, (int, float)):
+            return value
+        return float(value)
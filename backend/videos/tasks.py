@@ -0,0 +1,106 @@
+from celery import shared_task
+from .models import Video
+from .services import YouTubeService, GeminiService
+from snapcast_backend.events import publish
+
+
+def report_progress(video, stage=None):
+    """Push the video's current analysis stage to subscribed clients"""
+    publish(video.progress_channel, video.progress_snapshot(stage))
+
+
+def fetch_video_details(video, youtube_service):
+    """Stage 1: fill in title, duration and thumbnail from the YouTube API"""
+    report_progress(video, 'metadata')
+    video_details = youtube_service.get_video_details(video.youtube_id)
+    if video_details:
+        video.transition_claimed(
+            title=video_details['title'],
+            duration=video_details['duration'],
+            thumbnail_url=video_details['thumbnail_url']
+        )
+
+
+def fetch_transcript(video, youtube_service):
+    """Stage 2: download the transcript with timestamps"""
+    report_progress(video, 'transcript')
+    transcript_data = youtube_service.get_transcript(video.youtube_id)
+    # The full text is the segment texts joined by spaces, so only the segments are stored
+    video.set_transcript(transcript_data['transcript_with_timestamps'])
+
+
+def find_viral_moments(video, gemini_service, use_cache=True):
+    """Stage 3: ask Gemini for the viral moments in the transcript"""
+    report_progress(video, 'analysis')
+    print(f"Calling Gemini to analyze {len(video.transcript)} chars of transcript...")
+    viral_moments = gemini_service.analyze_viral_moments(
+        video.transcript,
+        video.transcript_with_timestamps,
+        use_cache=use_cache
+    )
+    print(f"Gemini returned {len(viral_moments)} viral moments")
+
+    # Only while this job still owns the video (see StatusTransitionMixin.claim_filter)
+    if video.transition_claimed('completed', viral_moments=viral_moments):
+        report_progress(video)
+    else:
+        print(f"Video {video.id} was queued again, dropping this job's moments")
+
+
+def mark_failed(video, error_message):
+    """Record a failed analysis on the video, unless a newer job owns it"""
+    if video.transition_claimed('failed', error_message=error_message):
+        report_progress(video)
+
+
+def claim_video(video_id):
+    """Single-flight: move a pending video to processing and return it
+
+    Returns None when another job already took it (or it was deleted), so
+    duplicate jobs for the same video never fetch or call Gemini twice.
+    """
+    claimed = Video.objects.filter(id=video_id, status='pending').update(
+        **Video.stage_fields('processing')
+    )
+    if not claimed:
+        print(f"Video {video_id} is already being analyzed, skipping duplicate job")
+        return None
+    return Video.objects.get(id=video_id)
+
+
+@shared_task(queue='analysis')
+def analyze_video(video_id):
+    """Run the full analysis pipeline for a newly submitted video"""
+    video = claim_video(video_id)
+    if video is None:
+        return
+
+    try:
+        youtube_service = YouTubeService()
+        fetch_video_details(video, youtube_service)
+        fetch_transcript(video, youtube_service)
+
+        if not video.has_transcript():
+            mark_failed(video, 'No transcript available for this video')
+            return
+
+        find_viral_moments(video, GeminiService())
+
+    except Exception as e:
+        mark_failed(video, str(e))
+
+
+@shared_task(queue='analysis')
+def reanalyze_video(video_id, fresh=False):
+    """Run only the Gemini stage again on the stored transcript
+
+    ``fresh`` skips the analysis cache and always calls the model.
+    """
+    video = claim_video(video_id)
+    if video is None:
+        return
+
+    try:
+        find_viral_moments(video, GeminiService(), use_cache=not fresh)
+    except Exception as e:
+        mark_failed(video, str(e))
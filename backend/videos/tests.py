@@ -1,3 +1,828 @@
-from django.test import TestCase
+import importlib
+import json
+import re
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from youtube_transcript_api import FetchedTranscript, FetchedTranscriptSnippet, RequestBlocked, TranscriptsDisabled
+
+from clips.models import Clip
+from snapcast_backend import jobs
+from .analysis_cache import AnalysisCache
+from .metadata import VideoMetadataFetcher
+from .models import TranscriptCacheEntry, Video
+from .services import GeminiService, YouTubeService
+from . import tasks as analyze_tasks
+from .tasks import analyze_video
+from .transcript_cache import TranscriptCache
+from .transcript_index import TranscriptIndex
+from .transcript_store import PackedTranscript
+
+
+class FakeLLMClient:
+    """Offline stand-in for GeminiClient: one moment per window, plus a duplicate"""
+
+    def __init__(self):
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def generate(self, prompt):
+        with self.lock:
+            self.prompts.append(prompt)
+
+        minutes, seconds = re.search(r'\[(\d+):(\d+)\]', prompt).groups()
+        window_start = int(minutes) * 60 + int(seconds)
+        moments = [
+            {'start_time': window_start + 30, 'end_time': window_start + 60, 'viral_score': window_start % 97},
+            # Every window also "finds" the same moment at 600s
+            {'start_time': 600, 'end_time': 640, 'viral_score': 99},
+        ]
+        return f"```json\n{json.dumps(moments)}\n```"
+
+
+def make_segments(total_seconds, step=10):
+    return [
+        {'text': f'segment {start}', 'start': start, 'duration': step}
+        for start in range(0, total_seconds, step)
+    ]
+
+
+@override_settings(
+    VIRAL_ANALYSIS_WINDOW_SECONDS=1200,
+    VIRAL_ANALYSIS_WINDOW_OVERLAP_SECONDS=120,
+    VIRAL_ANALYSIS_MAX_WORKERS=3,
+)
+class ChunkedViralAnalysisTests(TestCase):
+
+    def test_split_windows_overlap_and_cover_transcript(self):
+        segments = make_segments(3 * 3600)
+        windows = GeminiService.split_windows(segments, 1200, 120)
+
+        self.assertEqual(windows[0][0]['start'], 0)
+        self.assertEqual(windows[-1][-1]['start'], segments[-1]['start'])
+        for previous, current in zip(windows, windows[1:]):
+            self.assertLess(current[0]['start'], previous[-1]['start'] + previous[-1]['duration'])
+
+    def test_chunked_analysis_merges_and_dedupes(self):
+        client = FakeLLMClient()
+        segments = make_segments(3 * 3600)
+
+        moments = GeminiService(client=client).analyze_viral_moments('text', segments, chunked=True)
+
+        self.assertEqual(len(client.prompts), len(GeminiService.split_windows(segments, 1200, 120)))
+        self.assertEqual([m['start_time'] for m in moments].count(600), 1)
+        self.assertLessEqual(len(moments), GeminiService.TOP_N)
+        scores = [m['viral_score'] for m in moments]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_malformed_moments_are_dropped_before_merging(self):
+        class MalformedClient(FakeLLMClient):
+            def generate(self, prompt):
+                moments = json.loads(super().generate(prompt).strip('`json\n'))
+                moments += [
+                    {'end_time': 30, 'viral_score': 80},  # no start_time, 30s long
+                    {'start_time': 100, 'viral_score': 80},  # no end_time
+                    {'start_time': None, 'end_time': 30, 'viral_score': 80},
+                    'not a moment',
+                    {'start_time': '900', 'end_time': '930', 'viral_score': '50'},
+                ]
+                return json.dumps(moments)
+
+        segments = make_segments(3 * 3600)
+        moments = GeminiService(client=MalformedClient()).analyze_viral_moments(
+            'text', segments, chunked=True, use_cache=False
+        )
+
+        self.assertTrue(moments)
+        self.assertTrue(all(isinstance(m['start_time'], (int, float)) for m in moments))
+        self.assertIn((900.0, 930.0), [(m['start_time'], m['end_time']) for m in moments])
+
+    @override_settings(VIRAL_ANALYSIS_CHUNK_THRESHOLD_SECONDS=2700)
+    def test_short_transcript_uses_single_prompt(self):
+        client = FakeLLMClient()
+
+        GeminiService(client=client).analyze_viral_moments('text', make_segments(1800))
+
+        self.assertEqual(len(client.prompts), 1)
+
+
+class AnalysisCacheTests(TestCase):
+
+    def test_repeat_analysis_is_served_from_cache(self):
+        client = FakeLLMClient()
+        service = GeminiService(client=client)
+        segments = make_segments(1800)
+        hits_before = AnalysisCache.stats()['hits']
+
+        first = service.analyze_viral_moments('text', segments, chunked=False)
+        second = service.analyze_viral_moments('text', segments, chunked=False)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(client.prompts), 1)
+        self.assertEqual(AnalysisCache.stats()['hits'], hits_before + 1)
+
+    def test_bypass_calls_the_model_again(self):
+        client = FakeLLMClient()
+        service = GeminiService(client=client)
+        segments = make_segments(1800)
+
+        service.analyze_viral_moments('text', segments, chunked=False)
+        service.analyze_viral_moments('text', segments, chunked=False, use_cache=False)
+
+        self.assertEqual(len(client.prompts), 2)
+
+    def test_key_ignores_whitespace_but_not_text(self):
+        segments = make_segments(60)
+        spaced = [dict(seg, text=f"  {seg['text']}  ") for seg in segments]
+        changed = [dict(seg, text=seg['text'] + '!') for seg in segments]
+
+        key = AnalysisCache.make_key(segments, 'v1', 'model', {})
+        self.assertEqual(key, AnalysisCache.make_key(spaced, 'v1', 'model', {}))
+        self.assertNotEqual(key, AnalysisCache.make_key(changed, 'v1', 'model', {}))
+        self.assertNotEqual(key, AnalysisCache.make_key(segments, 'v2', 'model', {}))
+
+
+class JobDispatchTests(TestCase):
+
+    def setUp(self):
+        self.task = mock.Mock(queue='analysis', return_value='done')
+        self.task.name = 'fake_task'
+
+    @override_settings(JOBS_BACKEND='eager')
+    def test_eager_runs_inline(self):
+        self.assertEqual(jobs.dispatch(self.task, 1, flag=True), 'done')
+        self.task.assert_called_once_with(1, flag=True)
+
+    @override_settings(JOBS_BACKEND='celery')
+    def test_celery_publishes_to_the_broker(self):
+        jobs.dispatch(self.task, 1, flag=True)
+        self.task.apply_async.assert_called_once_with(args=(1,), kwargs={'flag': True})
+        self.task.assert_not_called()
+
+    @override_settings(JOBS_BACKEND='thread')
+    def test_thread_runs_in_the_queue_pool(self):
+        ran_in = []
+        self.task.side_effect = lambda: ran_in.append(threading.current_thread().name)
+
+        jobs.dispatch(self.task).result(timeout=5)
+
+        self.assertTrue(ran_in[0].startswith('jobs-analysis'))
+        self.assertIs(jobs.get_executor('analysis'), jobs.get_executor('analysis'))
+
+    @override_settings(JOBS_BACKEND='thread')
+    def test_thread_job_errors_surface_on_the_future(self):
+        self.task.side_effect = ValueError('boom')
+        with self.assertRaises(ValueError):
+            jobs.dispatch(self.task).result(timeout=5)
+
+    @override_settings(JOBS_BACKEND='nope')
+    def test_unknown_backend_is_an_error(self):
+        with self.assertRaises(ValueError):
+            jobs.dispatch(self.task)
+
+    @override_settings(JOBS_BACKEND='eager')
+    def test_enqueue_waits_for_the_transaction_to_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            jobs.enqueue(self.task, 7)
+            self.task.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        self.task.assert_called_once_with(7)
+
+
+class DatabaseSetupTests(TestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_sqlite_connections_are_tuned(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), int(settings.SQLITE_BUSY_TIMEOUT_SECONDS * 1000))
+
+
+class TranscriptStoreTests(TestCase):
+
+    def test_round_trip(self):
+        segments = [
+            {'text': 'olá, tudo bem?', 'start': 0.5, 'duration': 2.25},
+            {'text': '', 'start': 2.75, 'duration': 1.0},
+            {'text': 'emoji 🎙️ ok', 'start': 3.75, 'duration': 4.0},
+        ]
+        packed = PackedTranscript.from_bytes(PackedTranscript.from_segments(segments).to_bytes())
+
+        self.assertEqual(packed.segments(), segments)
+        self.assertEqual(packed.text, 'olá, tudo bem?  emoji 🎙️ ok')
+        self.assertEqual(packed.segment_text(2), 'emoji 🎙️ ok')
+
+    def test_empty(self):
+        for packed in (PackedTranscript(), PackedTranscript.from_bytes(PackedTranscript.from_segments({}).to_bytes())):
+            self.assertEqual(len(packed), 0)
+            self.assertEqual(packed.text, '')
+            self.assertEqual(packed.segments(), [])
+
+    def test_migration_format_matches_sct1(self):
+        # 0005_transcript carries its own frozen copy of the SCT1 format
+        migration = importlib.import_module('videos.migrations.0005_transcript')
+        segments = [
+            {'text': 'olá', 'start': 0.5, 'duration': 2.25},
+            {'text': 'emoji 🎙️ ok', 'start': 3.75, 'duration': 4.0},
+        ]
+        count, text_length, data = migration.pack_segments(segments)
+
+        packed = PackedTranscript.from_bytes(data)
+        self.assertEqual((count, text_length), (len(packed), len(packed.text)))
+        self.assertEqual(packed.segments(), segments)
+        self.assertEqual(migration.unpack_segments(packed.to_bytes()), (packed.text, segments))
+
+    def test_smaller_than_json(self):
+        segments = make_segments(3600, step=3)
+        self.assertLess(len(PackedTranscript.from_segments(segments).to_bytes()), len(json.dumps(segments)) / 4)
+
+    def test_loaded_only_when_used(self):
+        video = Video.objects.create(youtube_url='https://youtube.com/watch?v=t', youtube_id='t')
+        self.assertEqual(video.transcript, '')
+        self.assertFalse(video.has_transcript())
+
+        video.set_transcript(make_segments(60))
+        with self.assertNumQueries(1):
+            video = Video.objects.get(pk=video.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(video.transcript_with_timestamps), 6)
+            self.assertEqual(video.transcript.split()[:3], ['segment', '0', 'segment'])
+            self.assertEqual(video.get_transcript_index().text_between(10, 20), 'segment 10')
+
+
+# Queries allowed per request, independent of the number of rows returned
+QUERY_BUDGET = {
+    'video-list': 1,
+    'video-detail': 1,
+    'video-transcript': 1,
+    'video-stats': 2,
+}
+
+
+class TranscriptIndexTests(TestCase):
+
+    @staticmethod
+    def linear_overlapping(segments, start_time, end_time):
+        """Reference: the plain scan get_clip_subtitle_text used to do"""
+        return [
+            seg for seg in sorted(segments, key=lambda seg: seg['start'])
+            if seg['start'] < end_time and seg['start'] + seg['duration'] > start_time
+        ]
+
+    @staticmethod
+    def linear_segment_at(segments, time):
+        playing = [
+            seg for seg in sorted(segments, key=lambda seg: seg['start'])
+            if seg['start'] <= time < seg['start'] + seg['duration']
+        ]
+        return playing[-1] if playing else None
+
+    def assertMatchesLinearScan(self, segments, queries):
+        index = TranscriptIndex(segments)
+        for start_time, end_time in queries:
+            self.assertEqual(
+                index.overlapping(start_time, end_time),
+                self.linear_overlapping(segments, start_time, end_time),
+                (start_time, end_time)
+            )
+            self.assertEqual(index.segment_at(start_time), self.linear_segment_at(segments, start_time), start_time)
+
+    def test_edge_cases(self):
+        segments = [
+            {'text': 'long', 'start': 0, 'duration': 30},  # overlaps everything up to 30s
+            {'text': 'a', 'start': 5, 'duration': 2},
+            {'text': 'zero', 'start': 10, 'duration': 0},
+            {'text': 'b', 'start': 10, 'duration': 5},
+            {'text': 'late', 'start': 40, 'duration': 5},
+            {'text': 'early', 'start': 2, 'duration': 1},  # out of start order
+        ]
+        index = TranscriptIndex(segments)
+
+        # A segment ending exactly where the range starts, or starting where it ends, is out
+        self.assertEqual(index.text_between(15, 40), 'long')
+        self.assertEqual(index.text_between(7, 10), 'long')
+        self.assertEqual(index.text_between(3, 5.5), 'long a')
+        # Zero-length segments never overlap a range
+        self.assertEqual(index.text_between(10, 10.5), 'long b')
+        self.assertEqual(index.text_between(31, 39), '')
+        self.assertEqual(index.segment_at(2)['text'], 'early')
+        self.assertEqual(index.segment_at(35), None)
+        self.assertEqual(TranscriptIndex(None).text_between(0, 10), '')
+
+        boundaries = sorted({t for seg in segments for t in (seg['start'], seg['start'] + seg['duration'])})
+        self.assertMatchesLinearScan(segments, [(a, b) for a in boundaries for b in boundaries if a <= b])
+
+    def test_random_transcripts_match_linear_scan(self):
+        import random
+
+        rng = random.Random(1234)
+        for _ in range(50):
+            segments = [
+                {'text': str(i), 'start': rng.randint(0, 100), 'duration': rng.choice([0, 1, 3, 10, 40])}
+                for i in range(rng.randint(0, 30))
+            ]
+            queries = [sorted((rng.randint(-5, 150), rng.randint(-5, 150))) for _ in range(30)]
+            self.assertMatchesLinearScan(segments, queries)
+
+
+class VideoQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(10):
+            video = Video.objects.create(
+                youtube_url=f'https://youtube.com/watch?v=v{i}',
+                youtube_id=f'v{i}',
+                status='completed',
+                viral_moments=[{'start_time': 0, 'end_time': 30, 'viral_score': 50}],
+            )
+            video.set_transcript(make_segments(600))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_budget(self):
+        with self.assertNumQueries(QUERY_BUDGET['video-list']):
+            response = self.client.get('/api/videos/')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(response.data['results'][0]['viral_moments_count'], 1)
+        self.assertNotIn('transcript', response.data['results'][0])
+
+    def test_stats_budget(self):
+        Clip.objects.create(video=Video.objects.first(), title='C', start_time=10, end_time=40, duration=30)
+        with self.assertNumQueries(QUERY_BUDGET['video-stats']):
+            response = self.client.get('/api/videos/stats/')
+        self.assertEqual(response.data, {'videos': 10, 'clips': 1, 'average_clip_duration': 30})
+
+    def test_detail_budget(self):
+        video = Video.objects.first()
+        with self.assertNumQueries(QUERY_BUDGET['video-detail']):
+            response = self.client.get(f'/api/videos/{video.id}/')
+        self.assertNotIn('transcript_with_timestamps', response.data)
+        # Moments go out once, sorted; the raw list is opt-in
+        self.assertNotIn('viral_moments', response.data)
+        self.assertEqual(len(response.data['viral_moments_sorted']), 1)
+
+        response = self.client.get(f'/api/videos/{video.id}/?expand=viral_moments')
+        self.assertEqual(response.data['viral_moments'], video.viral_moments)
+
+    def test_transcript_budget(self):
+        video = Video.objects.first()
+        with self.assertNumQueries(QUERY_BUDGET['video-transcript']):
+            response = self.client.get(f'/api/videos/{video.id}/transcript/')
+        self.assertEqual(len(response.data['transcript_with_timestamps']), 60)
+
+    def test_expanded_detail_budget(self):
+        video = Video.objects.first()
+        with self.assertNumQueries(QUERY_BUDGET['video-detail']):
+            response = self.client.get(f'/api/videos/{video.id}/?expand=transcript')
+        self.assertTrue(response.data['transcript'].startswith('segment 0 segment 10'))
+
+
+class RenderClipsTests(TestCase):
+
+    def setUp(self):
+        self.video = Video.objects.create(
+            youtube_url='https://youtube.com/watch?v=b',
+            youtube_id='b',
+            status='completed',
+            viral_moments=[
+                {'start_time': i * 60, 'end_time': i * 60 + 30, 'viral_score': 10 - i, 'title': f'M{i}'}
+                for i in range(5)
+            ],
+        )
+        # Second best moment already has a clip
+        Clip.from_moment(self.video, 1, self.video.get_viral_moments_sorted()[1]).save()
+        self.client = APIClient()
+        self.url = f'/api/videos/{self.video.id}/render_clips/'
+
+    def test_top_n_creates_missing_clips_and_queues_one_batch(self):
+        with mock.patch('videos.views.enqueue') as enqueue, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'top_n': 3, 'profile': 'preview'}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual([c['moment_index'] for c in response.data['created']], [0, 2])
+        self.assertEqual([c['moment_index'] for c in response.data['existing']], [1])
+        self.assertEqual(Clip.objects.filter(video=self.video, encoding_profile='preview').count(), 2)
+
+        enqueue.assert_called_once()
+        _, video_id, clip_ids = enqueue.call_args.args
+        self.assertEqual(video_id, self.video.id)
+        self.assertEqual(sorted(clip_ids), sorted(c['id'] for c in response.data['created']))
+
+    def test_nothing_to_create(self):
+        with mock.patch('videos.views.enqueue') as enqueue:
+            response = self.client.post(self.url, {'moment_indices': [1]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], [])
+        enqueue.assert_not_called()
+
+    def test_failed_evicted_and_other_profile_clips_are_requeued(self):
+        clip = Clip.objects.get(video=self.video, moment_index=1)
+        clip.transition('failed', error_message='boom')
+        other = Clip.from_moment(self.video, 0, self.video.get_viral_moments_sorted()[0])
+        other.status = 'evicted'
+        other.save()
+
+        with mock.patch('videos.views.enqueue') as enqueue:
+            response = self.client.post(self.url, {'moment_indices': [0, 1]}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['created'], [])
+        self.assertEqual(sorted(c['id'] for c in response.data['requeued']), sorted([clip.id, other.id]))
+        _, _, clip_ids = enqueue.call_args.args
+        self.assertEqual(sorted(clip_ids), sorted([clip.id, other.id]))
+        clip.refresh_from_db()
+        self.assertEqual((clip.status, clip.error_message), ('pending', ''))
+
+        # Queued already: a repeated request doesn't render them twice
+        with mock.patch('videos.views.enqueue') as enqueue:
+            response = self.client.post(self.url, {'moment_indices': [0, 1], 'profile': 'preview'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        enqueue.assert_not_called()
+
+        clip.transition('completed')
+        with mock.patch('videos.views.enqueue') as enqueue:
+            response = self.client.post(self.url, {'moment_indices': [1], 'profile': 'preview'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        clip.refresh_from_db()
+        self.assertEqual((clip.status, clip.encoding_profile), ('pending', 'preview'))
+
+    def test_validation(self):
+        response = self.client.post(self.url, {'moment_indices': [9]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(self.url, {'top_n': 2, 'moment_indices': [0]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SingleFlightAnalysisTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+    def test_same_video_is_analyzed_once(self):
+        with mock.patch('videos.views.enqueue') as enqueue:
+            first = self.client.post('/api/videos/', {'youtube_url': self.url}, format='json')
+            second = self.client.post('/api/videos/', {'youtube_url': self.url + '&t=42'}, format='json')
+
+        self.assertEqual((first.status_code, second.status_code), (202, 200))
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(Video.objects.count(), 1)
+        enqueue.assert_called_once()
+
+    def test_failed_video_is_retried_on_resubmit(self):
+        video = Video.objects.create(youtube_url=self.url, youtube_id='dQw4w9WgXcQ')
+        video.transition('failed', error_message='x')
+
+        with mock.patch('videos.views.enqueue') as enqueue:
+            response = self.client.post('/api/videos/', {'youtube_url': self.url}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+        enqueue.assert_called_once()
+
+        video.refresh_from_db()
+        self.assertIsNone(video.failed_at)
+        self.assertIsNotNone(video.queued_at)
+
+    @override_settings(JOB_LEASE_SECONDS=600, JOB_QUEUE_LEASE_SECONDS=86400)
+    def test_stuck_analysis_is_requeued_after_the_lease(self):
+        video = Video.objects.create(youtube_url=self.url, youtube_id='dQw4w9WgXcQ', status='processing')
+        video.set_transcript([{'text': 'hi', 'start': 0, 'duration': 1}])
+
+        with mock.patch('videos.views.enqueue') as enqueue:
+            response = self.client.post('/api/videos/', {'youtube_url': self.url}, format='json')
+            self.client.post(f'/api/videos/{video.id}/reanalyze/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        enqueue.assert_not_called()
+
+        # The worker died (or the thread queue was lost on restart): its claim expires
+        Video.objects.filter(pk=video.pk).update(updated_at=timezone.now() - timedelta(minutes=11))
+        with mock.patch('videos.views.enqueue') as enqueue:
+            response = self.client.post('/api/videos/', {'youtube_url': self.url}, format='json')
+        self.assertEqual(response.status_code, 202)
+        enqueue.assert_called_once()
+        self.assertEqual(Video.objects.get(pk=video.pk).status, 'pending')
+
+        # Waiting in a backed-up queue is not a lost job: pending leases on queued_at, for longer
+        Video.objects.filter(pk=video.pk).update(updated_at=timezone.now() - timedelta(minutes=11))
+        with mock.patch('videos.views.enqueue') as enqueue:
+            response = self.client.post(f'/api/videos/{video.id}/reanalyze/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        enqueue.assert_not_called()
+
+        Video.objects.filter(pk=video.pk).update(queued_at=timezone.now() - timedelta(hours=25))
+        with mock.patch('videos.views.enqueue') as enqueue:
+            response = self.client.post(f'/api/videos/{video.id}/reanalyze/', {}, format='json')
+        self.assertEqual(response.status_code, 202)
+        enqueue.assert_called_once()
+
+    def test_late_job_does_not_overwrite_a_requeued_analysis(self):
+        video = Video.objects.create(youtube_url=self.url, youtube_id='dQw4w9WgXcQ', status='pending')
+        claimed = analyze_tasks.claim_video(video.id)
+
+        # Its lease expired and another run took over
+        Video.objects.filter(pk=video.pk).update(**Video.stage_fields('pending'))
+        gemini = mock.Mock()
+        gemini.analyze_viral_moments.return_value = [{'start_time': 0, 'end_time': 30}]
+        analyze_tasks.find_viral_moments(claimed, gemini)
+        analyze_tasks.mark_failed(claimed, 'late')
+
+        video.refresh_from_db()
+        self.assertEqual((video.status, video.viral_moments, video.error_message), ('pending', [], ''))
+
+    def test_reanalyze_parses_fresh_flag(self):
+        video = Video.objects.create(youtube_url=self.url, youtube_id='dQw4w9WgXcQ', status='completed')
+        video.set_transcript([{'text': 'hi', 'start': 0, 'duration': 1}])
+        url = f'/api/videos/{video.id}/reanalyze/'
+
+        for data, fresh in [
+            ({}, False),
+            ({'fresh': True}, True),
+            ({'fresh': 'false'}, False),
+            ({'fresh': '0'}, False),
+            ({'fresh': '1'}, True),
+        ]:
+            Video.objects.filter(pk=video.pk).update(status='completed')
+            with mock.patch('videos.views.enqueue') as enqueue:
+                response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, 202, data)
+            self.assertEqual(enqueue.call_args.kwargs, {'fresh': fresh}, data)
+
+        response = self.client.post(url, {'fresh': 'maybe'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_duplicate_job_does_nothing(self):
+        video = Video.objects.create(youtube_url=self.url, youtube_id='dQw4w9WgXcQ', status='processing')
+
+        with mock.patch('videos.tasks.YouTubeService') as youtube_service:
+            analyze_video(video.id)
+
+        youtube_service.assert_not_called()
+
+
+class FakeYouTubeClient:
+    """videos().list(...).execute() answering every ID except 'missing*' ones"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def videos(self):
+        return self
+
+    def list(self, part, id, maxResults):
+        ids = id.split(',')
+        with self.lock:
+            self.calls.append(ids)
+        items = [
+            {
+                'id': video_id,
+                'snippet': {'title': f'Title {video_id}', 'description': '', 'thumbnails': {'high': {'url': 'u'}}},
+                'contentDetails': {'duration': 'PT1H2M3S'},
+            }
+            for video_id in ids if not video_id.startswith('missing')
+        ]
+        return mock.Mock(execute=mock.Mock(return_value={'items': items}))
+
+
+@override_settings(YOUTUBE_METADATA_BATCH_WINDOW_SECONDS=0.05, YOUTUBE_METADATA_CACHE_TTL_SECONDS=3600)
+class VideoMetadataTests(TestCase):
+
+    def setUp(self):
+        self.api = FakeYouTubeClient()
+        self.fetcher = VideoMetadataFetcher()
+        for target, value in (('get_youtube_client', self.api), ('thread_http', None)):
+            patcher = mock.patch(f'videos.metadata.{target}', return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_bulk_lookup_uses_50_id_calls_and_cache(self):
+        ids = [f'v{i}' for i in range(120)] + ['missing1']
+
+        details = self.fetcher.get_many(ids)
+
+        self.assertEqual([len(call) for call in self.api.calls], [50, 50, 21])
+        self.assertEqual(details['v7']['duration'], 3723)
+        self.assertIsNone(details['missing1'])
+
+        self.assertEqual(self.fetcher.get_many(ids), details)
+        self.assertEqual(len(self.api.calls), 3)
+
+    @override_settings(YOUTUBE_METADATA_BATCH_WINDOW_SECONDS=0.2)
+    def test_concurrent_lookups_share_a_call(self):
+        results = {}
+        threads = [
+            threading.Thread(target=lambda i=i: results.update({i: self.fetcher.get(f'v{i % 5}')}))
+            for i in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.api.calls), 1)
+        self.assertEqual(sorted(self.api.calls[0]), ['v0', 'v1', 'v2', 'v3', 'v4'])
+        self.assertEqual(results[7]['title'], 'Title v2')
+
+    def test_malformed_items_fail_alone(self):
+        response = {'items': [
+            {'id': 'small', 'snippet': {'title': 'Small', 'thumbnails': {'default': {'url': 'd'}}}},
+            {'id': 'broken', 'contentDetails': {'duration': 'PT1S'}},
+            {'id': 'ok', 'snippet': {'title': 'Ok', 'description': '', 'thumbnails': {'high': {'url': 'h'}}},
+             'contentDetails': {'duration': 'PT5S'}},
+        ]}
+        list_call = mock.Mock(return_value=mock.Mock(execute=mock.Mock(return_value=response)))
+        with mock.patch.object(self.api, 'list', list_call):
+            details = self.fetcher.get_many(['small', 'broken', 'ok'])
+
+        self.assertEqual(details['small'], {'title': 'Small', 'description': '', 'thumbnail_url': 'd', 'duration': 0})
+        self.assertEqual((details['ok']['thumbnail_url'], details['ok']['duration']), ('h', 5))
+        self.assertIsNone(details['broken'])
+
+        # The unreadable item is asked for again, the others come from the cache
+        self.fetcher.get_many(['small', 'broken', 'ok'])
+        self.assertEqual(self.api.calls, [['broken']])
+
+    @override_settings(YOUTUBE_METADATA_BATCH_WINDOW_SECONDS=0.2)
+    def test_waiters_are_released_when_the_leader_dies(self):
+        class Interrupted(BaseException):
+            pass
+
+        errors = []
+        results = {}
+
+        def leader():
+            try:
+                self.fetcher.get('v1')
+            except Interrupted as e:
+                errors.append(e)
+
+        with mock.patch('videos.metadata.get_youtube_client', side_effect=Interrupted):
+            first = threading.Thread(target=leader)
+            first.start()
+            time.sleep(0.05)
+            waiter = threading.Thread(target=lambda: results.update(v1=self.fetcher.get('v1')))
+            waiter.start()
+            first.join(timeout=5)
+            waiter.join(timeout=5)
+
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(len(errors), 1)
+        self.assertIsNone(results['v1'])
+
+        # Nothing was cached or left in flight: the next lookup asks again
+        self.assertEqual(self.fetcher.get('v1')['title'], 'Title v1')
+
+    def test_entries_expire(self):
+        with override_settings(YOUTUBE_METADATA_CACHE_TTL_SECONDS=0, YOUTUBE_METADATA_BATCH_WINDOW_SECONDS=0):
+            self.fetcher.get('v1')
+            self.fetcher.get('v1')
+        self.assertEqual(len(self.api.calls), 2)
+
+
+class FakeTranscriptApi:
+    """Offline stand-in for YouTubeTranscriptApi: {video_id: {language: [texts]}}"""
+
+    def __init__(self, available):
+        self.available = available
+        self.fetches = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self
+
+    def fetch(self, video_id, languages):
+        with self.lock:
+            self.fetches.append((video_id, tuple(languages)))
+        found = self.available.get(video_id)
+        if isinstance(found, Exception):
+            raise found
+        for language in languages:
+            if language in (found or {}):
+                snippets = [
+                    FetchedTranscriptSnippet(text=text, start=i * 5.0, duration=5.0)
+                    for i, text in enumerate(found[language])
+                ]
+                return FetchedTranscript(snippets, video_id, language, language, is_generated=True)
+        raise TranscriptsDisabled(video_id)
+
+
+class TranscriptCacheTests(TestCase):
+    def setUp(self):
+        self.api = FakeTranscriptApi({
+            'pt-video': {'pt': ['olá', 'mundo']},
+            'en-video': {'en': ['hello', 'world']},
+            'blocked': RequestBlocked('blocked'),
+        })
+        patcher = mock.patch('videos.services.YouTubeTranscriptApi', self.api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_second_fetch_is_served_from_cache(self):
+        first = YouTubeService.get_transcript('pt-video')
+        second = YouTubeService.get_transcript('pt-video')
+
+        self.assertEqual(len(self.api.fetches), 1)
+        self.assertEqual(second, first)
+        self.assertEqual(second['language'], 'pt')
+        self.assertEqual(second['transcript'], 'olá mundo')
+        self.assertEqual(second['transcript_with_timestamps'][1], {'text': 'mundo', 'start': 5.0, 'duration': 5.0})
+        entry = TranscriptCacheEntry.objects.get(youtube_id='pt-video')
+        self.assertEqual((entry.language, entry.hit_count, entry.is_generated), ('pt', 1, True))
+
+    def test_fallback_language_only_answers_requests_that_tried_the_same_languages(self):
+        self.assertEqual(YouTubeService.get_transcript('en-video', ['pt', 'en'])['language'], 'en')
+        YouTubeService.get_transcript('en-video', ['pt', 'en'])
+        YouTubeService.get_transcript('en-video', ['en'])
+        self.assertEqual(len(self.api.fetches), 1)
+
+        # 'es' was never tried, so the cached English transcript can't answer this
+        YouTubeService.get_transcript('en-video', ['es', 'en'])
+        self.assertEqual(len(self.api.fetches), 2)
+
+    def test_missing_transcript_is_cached_briefly(self):
+        empty = YouTubeService.get_transcript('no-captions')
+        self.assertEqual(empty, {'transcript': '', 'transcript_with_timestamps': [], 'language': ''})
+        YouTubeService.get_transcript('no-captions', ['en', 'pt'])
+        self.assertEqual(len(self.api.fetches), 1)
+
+        entry = TranscriptCacheEntry.objects.get(youtube_id='no-captions')
+        self.assertEqual(entry.language, '')
+        self.assertAlmostEqual(
+            (entry.expires_at - entry.created_at).total_seconds(),
+            settings.TRANSCRIPT_NEGATIVE_CACHE_TTL_SECONDS,
+            delta=5
+        )
+
+        # Expired, so YouTube is asked again; captions were added meanwhile
+        TranscriptCacheEntry.objects.update(expires_at=entry.created_at)
+        self.api.available['no-captions'] = {'pt': ['agora sim']}
+        self.assertEqual(YouTubeService.get_transcript('no-captions')['transcript'], 'agora sim')
+        self.assertEqual(len(self.api.fetches), 2)
+        self.assertFalse(TranscriptCacheEntry.objects.filter(youtube_id='no-captions', language='').exists())
+
+    def test_blocked_requests_are_not_cached(self):
+        YouTubeService.get_transcript('blocked')
+        YouTubeService.get_transcript('blocked')
+        self.assertEqual(len(self.api.fetches), 2)
+        self.assertFalse(TranscriptCacheEntry.objects.exists())
+
+    def test_answers_checks_the_tried_languages(self):
+        entry = TranscriptCacheEntry(language='en', languages='pt,pt-BR,en')
+        self.assertTrue(TranscriptCache.answers(entry, ['pt', 'en']))
+        self.assertTrue(TranscriptCache.answers(entry, ['en', 'pt']))
+        self.assertFalse(TranscriptCache.answers(entry, ['es', 'en']))
+        self.assertFalse(TranscriptCache.answers(entry, ['pt']))
+
+        missing = TranscriptCacheEntry(language='', languages='pt,en')
+        self.assertTrue(TranscriptCache.answers(missing, ['en']))
+        self.assertFalse(TranscriptCache.answers(missing, ['en', 'es']))
+
+
+class TranscriptPrefetchTests(TestCase):
+    def test_prefetch_warms_the_cache_with_a_bounded_pool(self):
+        api = FakeTranscriptApi({f'video-{i}': {'pt': [f'texto {i}']} for i in range(6)})
+        running = []
+        peak = []
+        lock = threading.Lock()
+        fetch = api.fetch
+
+        def counting_fetch(video_id, languages):
+            with lock:
+                running.append(video_id)
+                peak.append(len(running))
+            try:
+                return fetch(video_id, languages)
+            finally:
+                with lock:
+                    running.remove(video_id)
+
+        api.fetch = counting_fetch
+        ids = [f'video-{i}' for i in range(6)] + ['video-0', 'missing']
+        with mock.patch('videos.services.YouTubeTranscriptApi', api):
+            found = YouTubeService.prefetch_transcripts(ids, max_workers=2)
+            self.assertEqual(len(api.fetches), 7)
+            self.assertLessEqual(max(peak), 2)
+
+            YouTubeService.get_transcript('video-3')
+            self.assertEqual(len(api.fetches), 7)
+
+        self.assertEqual(found, {**{f'video-{i}': True for i in range(6)}, 'missing': False})
+        self.assertEqual(TranscriptCacheEntry.objects.count(), 7)
@@ -0,0 +1,114 @@
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TranscriptCacheEntry
+from .transcript_store import PackedTranscript
+
+
+class TranscriptCache:
+    """Fetched transcripts per (video, language), plus "no transcript" answers
+
+    An entry remembers the preference list it was fetched with, so it only
+    answers requests it would have answered the same way: a transcript in
+    language L serves a request if every language the request prefers over L
+    was tried (and missing) before L; a "no transcript" entry serves a request
+    whose languages were all tried. Transcripts live for
+    TRANSCRIPT_CACHE_TTL_SECONDS, "no transcript" answers only for
+    TRANSCRIPT_NEGATIVE_CACHE_TTL_SECONDS (captions get added later); past
+    TRANSCRIPT_CACHE_MAX_ENTRIES the least recently used rows are dropped.
+    Hit/miss counters are per process.
+    """
+
+    _stats = {'hits': 0, 'misses': 0}
+    _stats_lock = threading.Lock()
+
+    @staticmethod
+    def answers(entry, languages):
+        """Whether ``entry`` is what fetching with ``languages`` would return"""
+        tried = entry.languages.split(',')
+        if not entry.language:
+            return set(languages) <= set(tried)
+        if entry.language not in languages or entry.language not in tried:
+            return False
+        preferred = languages[:languages.index(entry.language)]
+        return set(preferred) <= set(tried[:tried.index(entry.language)])
+
+    def get(self, youtube_id, languages):
+        """Return the matching entry (language '' for "no transcript") or None"""
+        entries = TranscriptCacheEntry.objects.filter(
+            youtube_id=youtube_id,
+            language__in=[*languages, ''],
+            expires_at__gt=timezone.now()
+        ).order_by('-created_at')
+        entry = next((entry for entry in entries if self.answers(entry, languages)), None)
+
+        if entry is None:
+            self._count('misses')
+            return None
+
+        TranscriptCacheEntry.objects.filter(pk=entry.pk).update(
+            hit_count=F('hit_count') + 1,
+            last_used_at=timezone.now()
+        )
+        self._count('hits')
+        return entry
+
+    def set(self, youtube_id, languages, language, segments, is_generated=False):
+        """Store the transcript fetched in ``language`` and enforce TTL/size limits"""
+        # The video has a transcript now, so earlier "no transcript" answers are wrong
+        TranscriptCacheEntry.objects.filter(youtube_id=youtube_id, language='').delete()
+        self._store(
+            youtube_id, languages, language,
+            ttl=settings.TRANSCRIPT_CACHE_TTL_SECONDS,
+            data=PackedTranscript.from_segments(segments).to_bytes(),
+            segment_count=len(segments),
+            is_generated=is_generated,
+        )
+
+    def set_missing(self, youtube_id, languages):
+        """Remember, briefly, that none of ``languages`` has a transcript"""
+        self._store(youtube_id, languages, '', ttl=settings.TRANSCRIPT_NEGATIVE_CACHE_TTL_SECONDS)
+
+    def _store(self, youtube_id, languages, language, ttl, **fields):
+        now = timezone.now()
+        TranscriptCacheEntry.objects.update_or_create(
+            youtube_id=youtube_id,
+            language=language,
+            defaults={
+                'data': b'',
+                'segment_count': 0,
+                'is_generated': False,
+                **fields,
+                'languages': ','.join(languages),
+                'created_at': now,
+                'last_used_at': now,
+                'expires_at': now + timedelta(seconds=ttl),
+            }
+        )
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones over the limit"""
+        TranscriptCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+        stale_ids = TranscriptCacheEntry.objects.order_by('-last_used_at').values_list(
+            'id', flat=True
+        )[settings.TRANSCRIPT_CACHE_MAX_ENTRIES:]
+        stale_ids = list(stale_ids)
+        if stale_ids:
+            TranscriptCacheEntry.objects.filter(id__in=stale_ids).delete()
+
+    @classmethod
+    def stats(cls):
+        """Return this process' hit/miss counters"""
+        with cls._stats_lock:
+            return dict(cls._stats)
+
+    @classmethod
+    def _count(cls, name):
+        with cls._stats_lock:
+            cls._stats[name] += 1
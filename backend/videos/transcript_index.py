@@ -0,0 +1,86 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+
+class TranscriptIndex:
+    """Sorted start-time index over transcript segments
+
+    Segments are ``{'text', 'start', 'duration'}`` dicts as returned by
+    ``Video.transcript_with_timestamps``. Overlap queries run in O(log n + k):
+    one bisect on the start times bounds the right edge, and one bisect on the
+    running maximum of the end times bounds the left edge.
+    """
+
+    def __init__(self, segments):
+        if not isinstance(segments, list):
+            segments = []
+        self.segments = sorted(segments, key=lambda seg: seg['start'])
+        self.starts = [seg['start'] for seg in self.segments]
+
+        # max_ends[i] = latest end among segments[0..i]; non-decreasing, so bisectable
+        self.max_ends = []
+        latest = float('-inf')
+        for seg in self.segments:
+            latest = max(latest, seg['start'] + seg['duration'])
+            self.max_ends.append(latest)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def overlapping(self, start_time, end_time):
+        """Return segments that overlap [start_time, end_time), in start order"""
+        lo = bisect_right(self.max_ends, start_time)
+        hi = bisect_left(self.starts, end_time)
+        return [
+            seg for seg in self.segments[lo:hi]
+            if seg['start'] + seg['duration'] > start_time
+        ]
+
+    def text_between(self, start_time, end_time):
+        """Join the text of every segment overlapping the range"""
+        return ' '.join(seg['text'] for seg in self.overlapping(start_time, end_time))
+
+    def segment_index_at(self, time):
+        """Return the index of the segment playing at ``time``, or None"""
+        i = bisect_right(self.starts, time) - 1
+        while i >= 0 and self.max_ends[i] > time:
+            seg = self.segments[i]
+            if seg['start'] + seg['duration'] > time:
+                return i
+            i -= 1
+        return None
+
+    def segment_at(self, time):
+        """Return the segment playing at ``time``, or None"""
+        i = self.segment_index_at(time)
+        return self.segments[i] if i is not None else None
+
+
+class TranscriptIndexCache:
+    """Small process-wide LRU of TranscriptIndex objects keyed by video"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, load_segments):
+        """Return the index for key, building it from load_segments() on a miss"""
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                return index
+
+        index = TranscriptIndex(load_segments())
+
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+transcript_index_cache = TranscriptIndexCache()
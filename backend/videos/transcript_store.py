@@ -0,0 +1,109 @@
+import struct
+import sys
+import zlib
+from array import array
+
+# Payload layout (little-endian), zlib-compressed as a whole:
+#   header    magic, segment count n
+#   starts    n float64
+#   durations n float64
+#   offsets   n + 1 uint32 byte offsets into the text blob
+#   text      UTF-8 segment texts, each followed by one space
+# Segment i is text[offsets[i]:offsets[i + 1] - 1], so the blob minus its
+# trailing space is the full transcript and never has to be joined.
+# Migration 0005_transcript keeps its own copy of SCT1: a layout change needs
+# a new MAGIC (and a data migration), not an edit of this version.
+MAGIC = b'SCT1'
+HEADER = struct.Struct('<4sI')
+COMPRESSION_LEVEL = 6
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class PackedTranscript:
+    """Transcript segments in columnar form: start/duration arrays plus one text blob
+
+    Replaces lists of ``{'text', 'start', 'duration'}`` dicts, which repeat
+    the same three keys for every segment. ``segments()`` still produces that
+    list for the code that wants it.
+    """
+
+    def __init__(self, starts=None, durations=None, offsets=None, text=b''):
+        self.starts = starts if starts is not None else array('d')
+        self.durations = durations if durations is not None else array('d')
+        self.offsets = offsets if offsets is not None else array('I', [0])
+        self.blob = text
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Pack a list of segment dicts (anything else packs as empty)"""
+        if not isinstance(segments, list):
+            segments = []
+
+        starts = array('d')
+        durations = array('d')
+        offsets = array('I', [0])
+        texts = []
+        position = 0
+        for seg in segments:
+            encoded = str(seg.get('text', '')).encode('utf-8')
+            starts.append(float(seg.get('start', 0)))
+            durations.append(float(seg.get('duration', 0)))
+            texts.append(encoded)
+            position += len(encoded) + 1
+            offsets.append(position)
+
+        text = b' '.join(texts) + b' ' if texts else b''
+        return cls(starts, durations, offsets, text)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Inverse of to_bytes()"""
+        if not data:
+            return cls()
+
+        raw = zlib.decompress(bytes(data))
+        magic, count = HEADER.unpack_from(raw)
+        if magic != MAGIC:
+            raise ValueError(f"Not a packed transcript (magic {magic!r})")
+
+        position = HEADER.size
+        columns = []
+        for typecode, length in (('d', count), ('d', count), ('I', count + 1)):
+            values = array(typecode)
+            size = values.itemsize * length
+            values.frombytes(raw[position:position + size])
+            columns.append(_little_endian(values))
+            position += size
+
+        return cls(*columns, text=raw[position:])
+
+    def to_bytes(self):
+        """Compressed payload for Transcript.data"""
+        parts = [HEADER.pack(MAGIC, len(self))]
+        for column in (self.starts, self.durations, self.offsets):
+            parts.append(_little_endian(array(column.typecode, column)).tobytes())
+        parts.append(self.blob)
+        return zlib.compress(b''.join(parts), COMPRESSION_LEVEL)
+
+    @property
+    def text(self):
+        """Full transcript: the segment texts joined by spaces"""
+        return self.blob[:-1].decode('utf-8')
+
+    def segment_text(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1] - 1].decode('utf-8')
+
+    def segments(self):
+        """The segments as ``{'text', 'start', 'duration'}`` dicts"""
+        return [
+            {'text': self.segment_text(i), 'start': self.starts[i], 'duration': self.durations[i]}
+            for i in range(len(self))
+        ]
@@ -1,9 +1,28 @@
+from django.db import transaction
+from django.db import IntegrityError
+from django.db.models import Avg, Count, F, Q
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from .models import Video
-from .serializers import VideoSerializer, VideoCreateSerializer
-from .services import YouTubeService, GeminiService
+from .serializers import (
+    VideoSerializer,
+    VideoListSerializer,
+    VideoTranscriptSerializer,
+    VideoCreateSerializer,
+    VideoReanalyzeSerializer,
+    VideoRenderClipsSerializer,
+)
+from .services import YouTubeService
+from .tasks import analyze_video, reanalyze_video
+from clips.models import Clip
+from clips.serializers import ClipListSerializer
+from clips.tasks import render_clip_batch
+from snapcast_backend.jobs import enqueue
+from snapcast_backend.events import EventStreamRenderer, sse_response
+from snapcast_backend.pagination import CreatedAtCursorPagination
 
 
 class VideoViewSet(viewsets.ModelViewSet):
@@ -11,140 +30,228 @@ class VideoViewSet(viewsets.ModelViewSet):
 
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
+    pagination_class = CreatedAtCursorPagination
+
+    # Fields served from the Transcript table, only for the transcript action (or ?expand=)
+    TRANSCRIPT_FIELDS = ('transcript', 'transcript_with_timestamps')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        expand = self.request.query_params.get('expand', '').split(',')
+        if self.action == 'transcript' or any(name in expand for name in self.TRANSCRIPT_FIELDS):
+            return queryset.select_related('transcript_record')
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'create':
             return VideoCreateSerializer
+        if self.action == 'list':
+            return VideoListSerializer
+        if self.action == 'transcript':
+            return VideoTranscriptSerializer
         return VideoSerializer
 
     def create(self, request):
-        """Create a new video analysis from YouTube URL"""
+        """Queue a new video analysis from YouTube URL"""
         serializer = VideoCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         youtube_url = serializer.validated_data['youtube_url']
 
-        # Initialize services
-        youtube_service = YouTubeService()
-        gemini_service = GeminiService()
-
         # Extract video ID
-        video_id = youtube_service.extract_video_id(youtube_url)
+        video_id = YouTubeService.extract_video_id(youtube_url)
         if not video_id:
             return Response(
                 {'error': 'Invalid YouTube URL'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Check if video already exists
-        existing_video = Video.objects.filter(youtube_id=video_id).first()
-        if existing_video:
-            return Response(
-                VideoSerializer(existing_video).data,
-                status=status.HTTP_200_OK
-            )
-
-        # Create video record
-        video = Video.objects.create(
-            youtube_url=youtube_url,
+        # youtube_id is unique: concurrent submissions of the same video all get
+        # this one row, and only the request that created it queues the analysis
+        video, created = Video.objects.get_or_create(
             youtube_id=video_id,
-            status='processing'
+            defaults={'youtube_url': youtube_url, 'status': 'pending', 'queued_at': timezone.now()}
         )
 
-        try:
-            # Get video details
-            video_details = youtube_service.get_video_details(video_id)
-            if video_details:
-                video.title = video_details['title']
-                video.duration = video_details['duration']
-                video.thumbnail_url = video_details['thumbnail_url']
-                video.save()
-
-            # Get transcript
-            transcript_data = youtube_service.get_transcript(video_id)
-            video.transcript = transcript_data['transcript']
-            video.transcript_with_timestamps = transcript_data['transcript_with_timestamps']
-            video.save()
-
-            if not video.transcript:
-                video.status = 'failed'
-                video.error_message = 'No transcript available for this video'
-                video.save()
+        if not created:
+            # Resubmitting a failed video retries it, once; so does one whose job was lost
+            retried = Video.objects.filter(Q(status='failed') | Video.stale(), pk=video.pk).update(
+                error_message='',
+                **Video.stage_fields('pending')
+            )
+            if not retried:
                 return Response(
                     VideoSerializer(video).data,
                     status=status.HTTP_200_OK
                 )
+            video.refresh_from_db()
 
-            # Analyze viral moments with Gemini
-            print(f"Calling Gemini to analyze {len(video.transcript)} chars of transcript...")
-            viral_moments = gemini_service.analyze_viral_moments(
-                video.transcript,
-                video.transcript_with_timestamps
-            )
-            print(f"Gemini returned {len(viral_moments)} viral moments")
-
-            # Debug: Print first viral moment details
-            if viral_moments:
-                first = viral_moments[0]
-                print(f"\n=== DEBUG: Top viral moment ===")
-                print(f"Title: {first.get('title')}")
-                print(f"Description: {first.get('description')}")
-                print(f"Start: {first.get('start_time')}s")
-                print(f"End: {first.get('end_time')}s")
-                print(f"Duration: {first.get('duration')}s")
-                print(f"Score: {first.get('viral_score')}")
-                print(f"==================================\n")
-
-            video.viral_moments = viral_moments
-            video.status = 'completed'
-            video.save()
+        enqueue(analyze_video, video.id)
 
-            return Response(
-                VideoSerializer(video).data,
-                status=status.HTTP_201_CREATED
-            )
+        return Response(
+            VideoSerializer(video).data,
+            status=status.HTTP_202_ACCEPTED
+        )
 
-        except Exception as e:
-            video.status = 'failed'
-            video.error_message = str(e)
-            video.save()
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Dashboard totals, so clients don't page through every video and clip to count them"""
+        clips = Clip.objects.aggregate(
+            count=Count('id'),
+            average_duration=Avg(F('end_time') - F('start_time'))
+        )
+        return Response({
+            'videos': Video.objects.count(),
+            'clips': clips['count'],
+            'average_clip_duration': clips['average_duration'] or 0,
+        })
+
+    @action(detail=True, methods=['get'])
+    def transcript(self, request, pk=None):
+        """Return the full transcript of the video"""
+        video = self.get_object()
+        return Response(VideoTranscriptSerializer(video).data)
+
+    @action(detail=True, methods=['get'], renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def events(self, request, pk=None):
+        """Server-Sent Events stream of analysis stages, closed once the video completes or fails"""
+        video = self.get_object()
+
+        def snapshot():
+            video.refresh_from_db(fields=['status', 'error_message'])
+            return video.progress_snapshot()
+
+        return sse_response(
+            request,
+            video.progress_channel,
+            snapshot,
+            lambda data: data['status'] in Video.FINAL_STATUSES
+        )
 
     @action(detail=True, methods=['post'])
     def reanalyze(self, request, pk=None):
-        """Re-analyze video for viral moments"""
+        """Queue a re-analysis of the video for viral moments
+
+        Identical transcripts are answered from the analysis cache; send
+        ``{"fresh": true}`` to force a new Gemini call.
+        """
         video = self.get_object()
 
-        if not video.transcript:
+        serializer = VideoReanalyzeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if not video.has_transcript():
             return Response(
                 {'error': 'No transcript available'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            video.status = 'processing'
-            video.save()
-
-            gemini_service = GeminiService()
-            viral_moments = gemini_service.analyze_viral_moments(
-                video.transcript,
-                video.transcript_with_timestamps
+        # Only one analysis per video at a time; a running one is simply reported
+        # back, unless its claim has expired (see StatusTransitionMixin.stale)
+        queued = Video.objects.filter(Q(status__in=Video.FINAL_STATUSES) | Video.stale(), pk=video.pk).update(
+            **Video.stage_fields('pending')
+        )
+        if not queued:
+            return Response(
+                VideoSerializer(video).data,
+                status=status.HTTP_200_OK
             )
 
-            video.viral_moments = viral_moments
-            video.status = 'completed'
-            video.save()
+        video.refresh_from_db()
+        enqueue(reanalyze_video, video.id, fresh=serializer.validated_data['fresh'])
+
+        return Response(
+            VideoSerializer(video).data,
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    @action(detail=True, methods=['post'])
+    def render_clips(self, request, pk=None):
+        """Create and queue clips for several viral moments in one request
+
+        Body: ``{"moment_indices": [0, 2, 5]}`` or ``{"top_n": 5}``, plus an
+        optional ``profile``. Moments that already have a clip are skipped, unless
+        that clip failed, was evicted or has another profile: it is queued again.
+        """
+        video = self.get_object()
 
-            return Response(VideoSerializer(video).data)
+        serializer = VideoRenderClipsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        except Exception as e:
-            video.status = 'failed'
-            video.error_message = str(e)
-            video.save()
+        if video.status != 'completed':
             return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Video analysis not completed yet'},
+                status=status.HTTP_400_BAD_REQUEST
             )
+
+        profile = serializer.validated_data.get('profile')
+        viral_moments = video.get_viral_moments_sorted()
+        if 'top_n' in serializer.validated_data:
+            indices = list(range(min(serializer.validated_data['top_n'], len(viral_moments))))
+        else:
+            indices = list(dict.fromkeys(serializer.validated_data['moment_indices']))
+            if any(index >= len(viral_moments) for index in indices):
+                return Response(
+                    {'error': 'Invalid moment index'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        # One query for every clip matching a requested moment by index or by times
+        matches = Q(moment_index__in=indices)
+        for index in indices:
+            matches |= Q(start_time=viral_moments[index]['start_time'], end_time=viral_moments[index]['end_time'])
+        existing_clips = list(Clip.objects.filter(video=video).filter(matches))
+        existing_indices = {clip.moment_index for clip in existing_clips}
+        existing_times = {(clip.start_time, clip.end_time) for clip in existing_clips}
+
+        new_clips = []
+        for index in indices:
+            moment = viral_moments[index]
+            if index in existing_indices or (moment['start_time'], moment['end_time']) in existing_times:
+                continue
+            new_clips.append(Clip.from_moment(video, index, moment, profile))
+            # Two moments with the same times would otherwise both be created
+            existing_times.add((moment['start_time'], moment['end_time']))
+
+        try:
+            with transaction.atomic():
+                created = Clip.objects.bulk_create(new_clips)
+        except IntegrityError:
+            # A concurrent request created some of them first; keep theirs
+            created = []
+            for clip in new_clips:
+                clip.pk = None
+                try:
+                    with transaction.atomic():
+                        clip.save()
+                    created.append(clip)
+                except IntegrityError:
+                    existing_clips.append(Clip.objects.get(**clip.render_key()))
+
+        # Failed or evicted clips, or another profile: re-render in place, as ClipViewSet.create does
+        requeued = []
+        for clip in existing_clips:
+            if not clip.needs_render(profile):
+                continue
+            try:
+                if clip.requeue(encoding_profile=profile or clip.encoding_profile):
+                    requeued.append(clip)
+            except IntegrityError:
+                # Another clip already renders this range with this profile
+                pass
+        existing_clips = [clip for clip in existing_clips if clip not in requeued]
+
+        queued = created + requeued
+        if queued:
+            # One job fetches the source, then the renders fan out in parallel
+            enqueue(render_clip_batch, video.id, [clip.id for clip in queued])
+
+        return Response(
+            {
+                'created': ClipListSerializer(created, many=True).data,
+                'requeued': ClipListSerializer(requeued, many=True).data,
+                'existing': ClipListSerializer(existing_clips, many=True).data,
+            },
+            status=status.HTTP_202_ACCEPTED if queued else status.HTTP_200_OK
+        )
@@ -60,7 +60,7 @@ const ClipGeneration = () => {
     setEditedDescription(initialClip.description || "");
 
     // Se já estiver completo ou falhou, não faz polling
-    if (initialClip.status === 'completed' || initialClip.status === 'failed') {
+    if (initialClip.status === 'completed' || initialClip.status === 'failed' || initialClip.status === 'evicted') {
       if (initialClip.status === 'completed') {
         toast.success("Clip gerado com sucesso!");
       } else if (initialClip.status === 'failed') {
@@ -197,6 +197,8 @@ const ClipGeneration = () => {
         return <span className="px-3 py-1 bg-blue-500/10 text-blue-500 text-sm rounded-full font-medium">Baixando</span>;
       case 'failed':
         return <span className="px-3 py-1 bg-red-500/10 text-red-500 text-sm rounded-full font-medium">Falhou</span>;
+      case 'evicted':
+        return <span className="px-3 py-1 bg-muted text-muted-foreground text-sm rounded-full font-medium">Arquivo removido</span>;
       default:
         return <span className="px-3 py-1 bg-yellow-500/10 text-yellow-500 text-sm rounded-full font-medium">Pendente</span>;
     }
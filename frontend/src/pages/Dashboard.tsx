@@ -1,5 +1,5 @@
 import { useNavigate } from "react-router-dom";
-import { useQuery } from "@tanstack/react-query";
+import { useInfiniteQuery, useQuery } from "@tanstack/react-query";
 import { Button } from "@/components/ui/button";
 import { Card } from "@/components/ui/card";
 import { Skeleton } from "@/components/ui/skeleton";
@@ -13,31 +13,35 @@ const Dashboard = () => {
   const navigate = useNavigate();
   const queryClient = useQueryClient();
 
-  const { data: videos, isLoading: videosLoading } = useQuery({
+  // One page of episodes at a time; "Carregar mais" fetches the next one
+  const {
+    data: videoPages,
+    isLoading: videosLoading,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
     queryKey: ["videos"],
-    queryFn: async () => {
-      const data = await api.getVideos();
-      console.log('Videos from API:', data);
-      return data;
-    },
+    queryFn: ({ pageParam }) => api.getVideosPage(pageParam),
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage) => lastPage.next,
   });
+  const videos = videoPages?.pages.flatMap((page) => page.results);
 
-  const { data: allClips } = useQuery({
-    queryKey: ["clips"],
-    queryFn: () => api.getClips(),
+  const { data: stats } = useQuery({
+    queryKey: ["stats"],
+    queryFn: () => api.getStats(),
   });
 
-  const totalEpisodes = videos?.length || 0;
-  const totalClips = allClips?.length || 0;
-
-  const averageClipDuration = allClips && allClips.length > 0
-    ? Math.floor(allClips.reduce((acc, clip) => acc + (clip.end_time - clip.start_time), 0) / allClips.length)
-    : 0;
+  const totalEpisodes = stats?.videos || 0;
+  const totalClips = stats?.clips || 0;
+  const averageClipDuration = Math.floor(stats?.average_clip_duration || 0);
 
   const deleteMutation = useMutation({
     mutationFn: (id: number) => api.deleteVideo(id),
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ["videos"] });
+      queryClient.invalidateQueries({ queryKey: ["stats"] });
       queryClient.invalidateQueries({ queryKey: ["clips"] });
       toast.success("Episódio deletado com sucesso");
     },
@@ -190,7 +194,7 @@ const Dashboard = () => {
                 <div className="flex items-center justify-between text-xs text-muted-foreground mb-3">
                   <div className="flex items-center gap-1">
                     <Scissors className="w-3 h-3" />
-                    <span>{video.viral_moments_sorted?.length || 0} clips</span>
+                    <span>{video.viral_moments_count || 0} clips</span>
                   </div>
                   <span>{formatDate(video.created_at)}</span>
                 </div>
@@ -238,6 +242,14 @@ const Dashboard = () => {
           </Card>
         </div>
 
+        {hasNextPage && (
+          <div className="flex justify-center mt-8">
+            <Button variant="outline" onClick={() => fetchNextPage()} disabled={isFetchingNextPage}>
+              {isFetchingNextPage ? "Carregando..." : "Carregar mais"}
+            </Button>
+          </div>
+        )}
+
         {/* Empty State */}
         {(!videos || videos.length === 0) && (
           <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6">
@@ -8,7 +8,9 @@ export interface Video {
   duration: number;
   status: 'pending' | 'processing' | 'completed' | 'failed';
   error_message: string | null;
-  viral_moments_sorted: ViralMoment[];
+  viral_moments_sorted?: ViralMoment[]; // Only on detail (GET /videos/:id/)
+  viral_moments?: ViralMoment[]; // Unsorted; only with ?expand=viral_moments
+  viral_moments_count?: number; // Only on list (GET /videos/)
   created_at: string;
   updated_at: string;
 }
@@ -28,9 +30,13 @@ export interface ViralMoment {
   category?: string; // Categoria do momento (historia/humor/conselho/polemica/revelacao)
 }
 
+// preview: 540x960 fast encode for the editor; final: publishing quality;
+// stream-copy: no re-encode when the source is already vertical
+export type EncodingProfile = 'preview' | 'final' | 'stream-copy';
+
 export interface Clip {
   id: number;
-  video: Video;
+  video?: Pick<Video, 'id' | 'youtube_url' | 'title' | 'duration' | 'thumbnail_url' | 'status'>;
   video_id: number;
   moment_index: number;  // Index in video.viral_moments_sorted
   start_time: number;
@@ -39,8 +45,9 @@ export interface Clip {
   title: string;
   description: string;
   subtitle_text: string | null;
-  status: 'pending' | 'downloading' | 'processing' | 'completed' | 'failed';
+  status: 'pending' | 'downloading' | 'processing' | 'completed' | 'failed' | 'evicted';  // evicted: file removed to free disk space
   progress_percentage: number;
+  encoding_profile: EncodingProfile;
   output_file_path: string | null;
   youtube_url?: string;
   youtube_video_id?: string;
@@ -49,12 +56,44 @@ export interface Clip {
   updated_at: string;
 }
 
+export type RenditionName = 'vertical' | 'square' | 'preview';
+
+export interface ClipRendition {
+  id: number;
+  name: RenditionName;
+  width: number;
+  height: number;
+  file_size: number | null;
+  status: 'pending' | 'processing' | 'completed' | 'failed';
+  error_message: string;
+  progress_percentage: number;
+  created_at: string;
+  updated_at: string;
+}
+
+// Cursor-paginated list response (GET /videos/, GET /clips/)
+export interface Page<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+// GET /videos/stats/
+export interface Stats {
+  videos: number;
+  clips: number;
+  average_clip_duration: number;
+}
+
+const VIDEOS_PAGE_SIZE = 24;
+
 class ApiService {
   private async request<T>(
     endpoint: string,
     options: RequestInit = {}
   ): Promise<T> {
-    const url = `${API_BASE_URL}${endpoint}`;
+    // Pagination links come back as absolute URLs
+    const url = endpoint.startsWith('http') ? endpoint : `${API_BASE_URL}${endpoint}`;
 
     const headers = {
       'Content-Type': 'application/json',
@@ -87,8 +126,14 @@ class ApiService {
   }
 
   // Videos/Episodes
-  async getVideos(): Promise<Video[]> {
-    return this.request<Video[]>('/videos/');
+  // One page at a time; pass the previous page's `next` link to load more
+  async getVideosPage(cursor?: string | null): Promise<Page<Video>> {
+    return this.request<Page<Video>>(cursor || `/videos/?page_size=${VIDEOS_PAGE_SIZE}`);
+  }
+
+  // Totals for the dashboard, without paging through every video and clip
+  async getStats(): Promise<Stats> {
+    return this.request<Stats>('/videos/stats/');
   }
 
   async getVideo(id: number): Promise<Video> {
@@ -102,6 +147,18 @@ class ApiService {
     });
   }
 
+  // Create and queue clips for several moments at once; moments that already have a clip are skipped
+  async renderClips(
+    videoId: number,
+    moments: { top_n: number } | { moment_indices: number[] },
+    profile?: EncodingProfile
+  ): Promise<{ created: Clip[]; requeued: Clip[]; existing: Clip[] }> {
+    return this.request<{ created: Clip[]; requeued: Clip[]; existing: Clip[] }>(`/videos/${videoId}/render_clips/`, {
+      method: 'POST',
+      body: JSON.stringify({ ...moments, profile }),
+    });
+  }
+
   async deleteVideo(id: number): Promise<void> {
     return this.request<void>(`/videos/${id}/`, {
       method: 'DELETE',
@@ -109,9 +166,10 @@ class ApiService {
   }
 
   // Clips
-  async getClips(videoId?: number): Promise<Clip[]> {
-    const endpoint = videoId ? `/clips/?video=${videoId}` : '/clips/';
-    return this.request<Clip[]>(endpoint);
+  // A video's clips: a handful per viral moment, so the first (largest) page holds them
+  async getClips(videoId: number): Promise<Clip[]> {
+    const page = await this.request<Page<Clip>>(`/clips/?video=${videoId}&page_size=200`);
+    return page.results;
   }
 
   async getClip(id: number): Promise<Clip> {
@@ -120,13 +178,15 @@ class ApiService {
 
   async createClip(
     videoId: number,
-    momentIndex: number
+    momentIndex: number,
+    profile?: EncodingProfile
   ): Promise<Clip> {
     return this.request<Clip>('/clips/', {
       method: 'POST',
       body: JSON.stringify({
         video_id: videoId,
         moment_index: momentIndex,
+        profile,
       }),
     });
   }
@@ -140,13 +200,15 @@ class ApiService {
   async updateClipTimes(
     id: number,
     startTime: number,
-    endTime: number
+    endTime: number,
+    profile?: EncodingProfile
   ): Promise<Clip> {
     return this.request<Clip>(`/clips/${id}/update_times/`, {
       method: 'POST',
       body: JSON.stringify({
         start_time: startTime,
         end_time: endTime,
+        profile,
       }),
     });
   }
@@ -159,8 +221,70 @@ class ApiService {
     return `${API_BASE_URL}/clips/${id}/stream/`;
   }
 
-  // Polling for status updates
+  async getClipRenditions(id: number): Promise<ClipRendition[]> {
+    return this.request<ClipRendition[]>(`/clips/${id}/renditions/`);
+  }
+
+  async createClipRenditions(id: number, renditions: RenditionName[]): Promise<ClipRendition[]> {
+    return this.request<ClipRendition[]>(`/clips/${id}/renditions/`, {
+      method: 'POST',
+      body: JSON.stringify({ renditions }),
+    });
+  }
+
+  getClipRenditionUrl(id: number, name: RenditionName, download = false): string {
+    return `${API_BASE_URL}/clips/${id}/renditions/${name}/${download ? '?download=1' : ''}`;
+  }
+
+  // Follows the server-sent progress events of a video/clip until it completes or fails.
+  // Falls back to polling when EventSource is unavailable or the stream breaks.
+  private followProgress<T extends { status: string }>(
+    eventsEndpoint: string,
+    fetchLatest: () => Promise<T>,
+    onUpdate: (item: T) => void,
+    poll: () => Promise<T>
+  ): Promise<T> {
+    if (typeof EventSource === 'undefined') {
+      return poll();
+    }
+
+    return fetchLatest().then((initial) => new Promise<T>((resolve, reject) => {
+      let current = initial;
+      const source = new EventSource(`${API_BASE_URL}${eventsEndpoint}`);
+
+      source.onmessage = async (event) => {
+        current = { ...current, ...JSON.parse(event.data) };
+        onUpdate(current);
+
+        if (current.status === 'completed' || current.status === 'failed' || current.status === 'evicted') {
+          source.close();
+          try {
+            const final = await fetchLatest();
+            onUpdate(final);
+            resolve(final);
+          } catch (error) {
+            reject(error);
+          }
+        }
+      };
+
+      source.onerror = () => {
+        source.close();
+        poll().then(resolve, reject);
+      };
+    }));
+  }
+
   async pollVideoStatus(id: number, onUpdate: (video: Video) => void): Promise<Video> {
+    return this.followProgress(
+      `/videos/${id}/events/`,
+      () => this.getVideo(id),
+      onUpdate,
+      () => this.pollVideoStatusByInterval(id, onUpdate)
+    );
+  }
+
+  private async pollVideoStatusByInterval(id: number, onUpdate: (video: Video) => void): Promise<Video> {
     const maxAttempts = 60; // 5 minutes max (60 * 5 seconds)
     let attempts = 0;
 
@@ -189,6 +313,15 @@ class ApiService {
   }
 
   async pollClipStatus(id: number, onUpdate: (clip: Clip) => void): Promise<Clip> {
+    return this.followProgress(
+      `/clips/${id}/events/`,
+      () => this.getClip(id),
+      onUpdate,
+      () => this.pollClipStatusByInterval(id, onUpdate)
+    );
+  }
+
+  private async pollClipStatusByInterval(id: number, onUpdate: (clip: Clip) => void): Promise<Clip> {
     const maxAttempts = 120; // 10 minutes max
     let attempts = 0;
 
@@ -198,7 +331,7 @@ class ApiService {
           const clip = await this.getClip(id);
           onUpdate(clip);
 
-          if (clip.status === 'completed' || clip.status === 'failed') {
+          if (clip.status === 'completed' || clip.status === 'failed' || clip.status === 'evicted') {
             clearInterval(interval);
             resolve(clip);
           }